@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do Simulador de Sugestões de Destinos
+Gera arquivos sintéticos no layout SIVIS e mede o tempo, a vazão e o pico de
+memória de cada etapa do processamento
+
+Etapas medidas:
+- carga          -> carregar_entradas (leitura do CSV, filtro, ordenação e tipos)
+- carga_cache    -> carregar_entradas a partir do cache colunar
+- simulacao      -> sugestões de todas as simulações + colunas de conferência
+- referencia     -> obterSugestaoDestino linha a linha em uma amostra (opcional)
+- estatisticas   -> calcular_estatisticas_simulacoes
+- analise        -> montar_analise_sugestoes
+- sequencias     -> montar_sequencias_destinos
+- planilha       -> gravação do Excel (ignorada acima do limite de linhas do Excel)
+
+Mede também a partida a frio (processo novo) da importação de cada módulo e
+da linha de comando, acompanhada entre execuções como as demais etapas.
+
+Os resultados são gravados em JSON (benchmarks/resultado_<data_hora>.json) e
+podem ser comparados com uma execução anterior (--comparar).
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import SimuladorSugestoesDestinos as simulador
+
+# Pasta dos arquivos sintéticos e dos resultados
+benchmark_dir = "benchmarks"
+
+# Limite de linhas de uma aba do Excel (incluindo o cabeçalho)
+limite_linhas_excel = 1048576
+
+# Picos de movimento do dia: (hora central, desvio em minutos, peso)
+picos_movimento = [
+    (8.0, 45, 0.35),   # Chegada da manhã
+    (12.5, 35, 0.25),  # Almoço
+    (14.0, 40, 0.15),  # Retorno do almoço
+]
+peso_movimento_base = 0.25  # Restante distribuído entre 6h e 20h
+
+
+def gerar_entradas_sinteticas(arquivo_csv, registros, portarias=8, destinos=300, expoente_zipf=1.1,
+                              fracao_sem_destino=0.65, data='2025-10-28', semente=0):
+    """
+    Gera um CSV de entradas no layout exato do SIVIS
+
+    Args:
+        arquivo_csv: Caminho do arquivo gerado
+        registros: Quantidade de linhas
+        portarias: Quantidade de portarias (com movimento desigual entre elas)
+        destinos: Quantidade de destinos, com popularidade tipo Zipf
+        expoente_zipf: Expoente da popularidade (1 / posição ** expoente)
+        fracao_sem_destino: Fração de entradas sem ide_destino (visitantes sem destino informado)
+        data: Dia das entradas (AAAA-MM-DD)
+        semente: Semente do gerador aleatório
+    """
+    rng = np.random.default_rng(semente)
+
+    # Horários: picos da manhã/almoço sobre um movimento de fundo entre 6h e 20h
+    componentes = rng.choice(len(picos_movimento) + 1, size=registros,
+                             p=[peso for _, _, peso in picos_movimento] + [peso_movimento_base])
+    segundos = rng.uniform(6 * 3600, 20 * 3600, size=registros)
+    for k, (hora, desvio, _) in enumerate(picos_movimento):
+        mascara = componentes == k
+        segundos[mascara] = rng.normal(hora * 3600, desvio * 60, size=mascara.sum())
+    segundos = np.clip(segundos, 0, 86399.999)
+    milissegundos = np.sort(np.round(segundos * 1000).astype(np.int64))
+    tempos = pd.Timestamp(data) + pd.to_timedelta(milissegundos, unit='ms')
+
+    # Portarias com movimento desigual
+    peso_portarias = 1.0 / np.arange(1, portarias + 1) ** 0.7
+    ide_portaria = rng.choice(np.arange(1, portarias + 1), size=registros, p=peso_portarias / peso_portarias.sum())
+    nomes_portarias = np.array([f"Portaria {p}" for p in range(1, portarias + 1)], dtype=object)
+
+    # Destinos com popularidade Zipf; cada portaria tem sua própria ordem de preferência
+    popularidade = 1.0 / np.arange(1, destinos + 1) ** expoente_zipf
+    popularidade /= popularidade.sum()
+    posicao = rng.choice(destinos, size=registros, p=popularidade)
+    preferencias = np.array([rng.permutation(destinos) for _ in range(portarias)])
+    ide_destino = preferencias[ide_portaria - 1, posicao] + 1
+    nomes_destinos = np.array([f"Destino Sintetico {d}" for d in range(1, destinos + 1)], dtype=object)
+    sem_destino = rng.random(registros) < fracao_sem_destino
+
+    df = pd.DataFrame({
+        'ide_entrada': np.arange(1, registros + 1) + 2000000,
+        'ide_portaria': ide_portaria,
+        'des_portaria': nomes_portarias[ide_portaria - 1],
+        'tim_entrada': tempos.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3],
+        'data_entrada': tempos.strftime('%d/%m/%Y'),
+        'hora_minuto_entrada': '"' + tempos.strftime('%H:%M') + '"',  # entre aspas, como no SIVIS
+        'ide_destino': np.where(sem_destino, '', ide_destino.astype(str)),
+        'desdestinoGenerico': np.where(sem_destino, '', nomes_destinos[ide_destino - 1]),
+    })
+
+    os.makedirs(os.path.dirname(arquivo_csv) or '.', exist_ok=True)
+    with open(arquivo_csv, 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(f'"{coluna}"' for coluna in df.columns) + '\n')
+        df.to_csv(f, index=False, header=False, quoting=3, chunksize=500000)  # 3 = csv.QUOTE_NONE
+    return arquivo_csv
+
+
+# Comandos da partida a frio: nome -> argumentos do python (pandas serve de referência)
+comandos_partida = {
+    'nucleo': ['-c', 'import NucleoSugestoes'],
+    'simulador': ['-c', 'import SimuladorSugestoesDestinos'],
+    'servico': ['-c', 'import ServicoSugestoesDestinos'],
+    'cli_script': ['SimuladorSugestoesDestinos.py', 'inexistente.csv'],
+    'cli_modulo': ['-m', 'SimuladorSugestoesDestinos', 'inexistente.csv'],
+    'pandas': ['-c', 'import pandas'],
+}
+
+
+def medir_partida_a_frio(repeticoes=5):
+    """
+    Mede o tempo de partida de um processo novo para cada comando de
+    comandos_partida (mediana de `repeticoes` execuções)
+
+    Returns:
+        dict: nome -> {'segundos': mediana}
+    """
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    print(f"\n🚀 Partida a frio (mediana de {repeticoes} execuções)")
+    resultados = {}
+    for nome, argumentos in comandos_partida.items():
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            subprocess.run([sys.executable, *argumentos], cwd=pasta, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            tempos.append(time.perf_counter() - inicio)
+        segundos = statistics.median(tempos)
+        resultados[nome] = {'segundos': round(segundos, 4)}
+        print(f"   {nome:<14} {segundos * 1000:>9.1f} ms")
+    return resultados
+
+
+def _memoria_processo_mb():
+    """Pico de memória residente do processo (MB)"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == 'darwin' else pico / 1024
+
+
+def _pico_residente_kb():
+    """Pico de memória residente desde o último reinício (VmHWM do Linux) ou None"""
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reiniciar_pico_residente():
+    """Zera o VmHWM do processo (Linux); retorna False quando não é possível"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def medir_etapa(resultados, etapa, registros, funcao, *args, usar_tracemalloc=False, **kwargs):
+    """
+    Executa uma etapa medindo tempo, vazão e pico de memória
+
+    O pico é o da memória residente do processo durante a etapa (Linux) ou,
+    com usar_tracemalloc (ou fora do Linux), o das alocações rastreadas pelo
+    tracemalloc, que deixa a etapa mais lenta. A saída impressa pelo
+    simulador durante a etapa é descartada.
+    """
+    usar_tracemalloc = usar_tracemalloc or not _reiniciar_pico_residente()
+    if usar_tracemalloc:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        retorno = funcao(*args, **kwargs)
+    segundos = time.perf_counter() - inicio
+    if usar_tracemalloc:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        pico_mb = pico / 2**20
+    else:
+        pico_mb = _pico_residente_kb() / 1024
+    resultados[etapa] = {
+        'segundos': round(segundos, 4),
+        'registros': int(registros),
+        'registros_por_segundo': round(registros / segundos, 1) if segundos > 0 else None,
+        'pico_memoria_mb': round(pico_mb, 2),
+        'medida_memoria': 'tracemalloc' if usar_tracemalloc else 'residente',
+    }
+    print(f"   {etapa:<14} {segundos:>9.3f}s  {registros / max(segundos, 1e-9):>14,.0f} registros/s  "
+          f"{pico_mb:>9.1f} MB")
+    return retorno
+
+
+def _simular(df):
+    df_simulacoes = simulador.adicionar_colunas_derivadas(df.reset_index(drop=True))
+    sugestoes = simulador.calcular_sugestoes_multiplas(df, simulador.simulacoes, ordem=df.index)
+    simulador.adicionar_colunas_simulacao(df_simulacoes, sugestoes)
+    return df_simulacoes
+
+
+def _referencia(arquivo_csv, df, amostra, semente=0):
+    """obterSugestaoDestino linha a linha (consultas pontuais ao IndiceSugestoes) em uma amostra de linhas"""
+    simulador.carregar_dados_planilha(arquivo_csv)
+    linhas = df.iloc[np.random.default_rng(semente).choice(len(df), size=min(amostra, len(df)), replace=False)]
+    for ide_portaria, tim_entrada, ide_destino in zip(linhas['ide_portaria'], linhas['tim_entrada'],
+                                                      linhas['ide_destino']):
+        for simulacao in simulador.simulacoes:
+            simulador.obterSugestaoDestino(ide_portaria, tim_entrada, simulacao['intervalo_minutos'],
+                                           simulacao['quantidade_minima_entradas'], ide_destino)
+
+
+def executar_benchmark(registros, portarias=8, destinos=300, amostra_referencia=0, escrita_rapida=False,
+                       semente=0, usar_tracemalloc=False):
+    """
+    Gera (ou reaproveita) um arquivo sintético e mede cada etapa do processamento
+
+    Returns:
+        dict: medidas por etapa
+    """
+    arquivo_csv = os.path.join(benchmark_dir, "dados",
+                               f"Entradas-sinteticas-{registros}-p{portarias}-d{destinos}-s{semente}.csv")
+    if not os.path.exists(arquivo_csv):
+        print(f"🧪 Gerando {registros:,} entradas sintéticas...")
+        gerar_entradas_sinteticas(arquivo_csv, registros, portarias=portarias, destinos=destinos, semente=semente)
+
+    print(f"\n⏱️ {registros:,} registros ({portarias} portarias, {destinos} destinos)")
+    resultados = {}
+
+    def medir(etapa, registros_etapa, funcao, *args, **kwargs):
+        return medir_etapa(resultados, etapa, registros_etapa, funcao, *args,
+                           usar_tracemalloc=usar_tracemalloc, **kwargs)
+
+    # Cache do arquivo sintético refeito a cada execução
+    chave = simulador._chave_arquivo(arquivo_csv)
+    shutil.rmtree(simulador._pasta_cache_entradas(chave), ignore_errors=True)
+    df, _ = medir('carga', registros, simulador.carregar_entradas, arquivo_csv)
+    df, _ = medir('carga_cache', registros, simulador.carregar_entradas, arquivo_csv)
+    filtrados = len(df)
+
+    df_simulacoes = medir('simulacao', filtrados, _simular, df)
+    if amostra_referencia:
+        medir('referencia', min(amostra_referencia, filtrados), _referencia,
+              arquivo_csv, df, amostra_referencia, semente)
+    df_stats_gerais, df_stats_portaria = medir('estatisticas', filtrados,
+                                               simulador.calcular_estatisticas_simulacoes, df_simulacoes)
+    df_analise, _ = medir('analise', filtrados, simulador.montar_analise_sugestoes,
+                          df_stats_gerais, df, ordem=df.index, usar_cache=False)
+    df_sequencias = medir('sequencias', filtrados, simulador.montar_sequencias_destinos,
+                          df_simulacoes)
+
+    if filtrados < limite_linhas_excel:
+        gravar_planilha = (simulador.gravar_planilha_simulacoes_rapida if escrita_rapida
+                           else simulador.gravar_planilha_simulacoes)
+        nome_excel = os.path.join(benchmark_dir, "dados", os.path.basename(arquivo_csv).replace('.csv', '.xlsx'))
+        medir('planilha', filtrados, gravar_planilha, nome_excel, df_simulacoes,
+              df_stats_gerais, df_stats_portaria, df_analise, df_sequencias)
+        os.remove(nome_excel)
+    else:
+        print(f"   {'planilha':<14} ignorada ({filtrados:,} linhas excedem o limite do Excel)")
+
+    return {
+        'registros': registros,
+        'registros_filtrados': filtrados,
+        'portarias': portarias,
+        'destinos': destinos,
+        'etapas': resultados,
+        'pico_memoria_processo_mb': round(_memoria_processo_mb(), 1),
+    }
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar_resultados(atual, anterior, tolerancia=0.2):
+    """
+    Compara o tempo de cada etapa com uma execução anterior
+
+    Returns:
+        list: regressões (etapas mais lentas que a tolerância)
+    """
+    regressoes = []
+    anteriores = {item['registros']: item for item in anterior['resultados']}
+    print(f"\n📊 Comparação com {anterior.get('commit') or 'execução anterior'} ({anterior.get('data_hora')}):")
+    for item in atual['resultados']:
+        base = anteriores.get(item['registros'])
+        if base is None:
+            continue
+        for etapa, medida in item['etapas'].items():
+            medida_base = base['etapas'].get(etapa)
+            if not medida_base or not medida_base['segundos']:
+                continue
+            razao = medida['segundos'] / medida_base['segundos']
+            marca = "⚠️" if razao > 1 + tolerancia else "✅"
+            print(f"   {marca} {item['registros']:>10,} {etapa:<14} {medida_base['segundos']:>9.3f}s -> "
+                  f"{medida['segundos']:>9.3f}s ({razao:.2f}x)")
+            if razao > 1 + tolerancia:
+                regressoes.append({'registros': item['registros'], 'etapa': etapa, 'razao': round(razao, 2)})
+    for nome, medida in atual.get('partida_a_frio', {}).items():
+        medida_base = anterior.get('partida_a_frio', {}).get(nome)
+        if not medida_base or not medida_base['segundos']:
+            continue
+        razao = medida['segundos'] / medida_base['segundos']
+        marca = "⚠️" if razao > 1 + tolerancia else "✅"
+        print(f"   {marca} {'partida':>10} {nome:<14} {medida_base['segundos']:>9.3f}s -> "
+              f"{medida['segundos']:>9.3f}s ({razao:.2f}x)")
+        if razao > 1 + tolerancia:
+            regressoes.append({'partida_a_frio': nome, 'razao': round(razao, 2)})
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do simulador com dados sintéticos no layout SIVIS")
+    parser.add_argument("--tamanhos", default="10000,100000",
+                        help="Quantidades de registros separadas por vírgula (padrão: 10000,100000; até 10000000)")
+    parser.add_argument("--portarias", type=int, default=8, help="Quantidade de portarias (padrão: 8)")
+    parser.add_argument("--destinos", type=int, default=300, help="Quantidade de destinos (padrão: 300)")
+    parser.add_argument("--semente", type=int, default=0, help="Semente do gerador aleatório (padrão: 0)")
+    parser.add_argument("--amostra-referencia", type=int, default=0,
+                        help="Mede também obterSugestaoDestino linha a linha em N registros")
+    parser.add_argument("--escrita-rapida", action="store_true", help="Mede a gravação em modo de escrita contínua")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Mede o pico de memória pelas alocações (tracemalloc) em vez da memória residente")
+    parser.add_argument("--repeticoes-partida", type=int, default=5,
+                        help="Execuções medidas na partida a frio de cada comando (padrão: 5; 0 desliga)")
+    parser.add_argument("--saida", help="Arquivo JSON de resultado (padrão: benchmarks/resultado_<data_hora>.json)")
+    parser.add_argument("--comparar", metavar="JSON", help="Compara com o resultado de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Aumento de tempo tolerado na comparação (padrão: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    tamanhos = [int(t.replace('_', '')) for t in args.tamanhos.split(',') if t.strip()]
+    resultado = {
+        'data_hora': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_atual(),
+        'ambiente': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parametros': {'portarias': args.portarias, 'destinos': args.destinos, 'semente': args.semente,
+                       'amostra_referencia': args.amostra_referencia, 'escrita_rapida': args.escrita_rapida,
+                       'tracemalloc': args.tracemalloc},
+        'resultados': [],
+    }
+    for registros in tamanhos:
+        resultado['resultados'].append(executar_benchmark(
+            registros, portarias=args.portarias, destinos=args.destinos,
+            amostra_referencia=args.amostra_referencia, escrita_rapida=args.escrita_rapida, semente=args.semente,
+            usar_tracemalloc=args.tracemalloc
+        ))
+
+    if args.repeticoes_partida:
+        resultado['partida_a_frio'] = medir_partida_a_frio(args.repeticoes_partida)
+
+    saida = args.saida or os.path.join(benchmark_dir, f"resultado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n📁 Resultado: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regressoes = comparar_resultados(resultado, json.load(f), args.tolerancia)
+        if regressoes:
+            print(f"\n⚠️ {len(regressoes)} etapa(s) mais lenta(s) que a tolerância de {args.tolerancia:.0%}")
+            sys.exit(1)
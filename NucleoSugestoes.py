@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Núcleo das Sugestões de Destinos
+Estruturas do motor de sugestões que dependem apenas da biblioteca padrão,
+para consultas com partida em milissegundos (sem pandas nem NumPy)
+
+- JanelaDestinos      -> janela deslizante com o destino mais frequente
+- PontuacaoDecaimento -> pontuação com decaimento exponencial
+- JanelaAproximada    -> janela aproximada com memória fixa (fatias de tempo com Space-Saving)
+- sugerir_destino     -> sugestão de uma entrada a partir das entradas anteriores da portaria
+
+Usado pelo SimuladorSugestoesDestinos (processamento em lote) e pelo
+ServicoSugestoesDestinos (tempo real).
+"""
+
+import heapq
+from collections import deque
+
+class JanelaDestinos:
+    """
+    Janela deslizante de entradas de uma portaria com contagem por destino
+
+    Mantém as entradas em ordem de horário, a contagem de cada destino e um heap
+    com o destino mais frequente. O desempate segue o mesmo critério do
+    value_counts usado em obterSugestaoDestino: vence o destino que aparece
+    primeiro no arquivo (menor ordem) entre as entradas da janela.
+    """
+
+    def __init__(self):
+        self.entradas = deque()  # (tim_entrada_ns, ide_destino, ordem)
+        self.contagens = {}  # ide_destino -> quantidade de entradas na janela
+        self.minimos = {}  # ide_destino -> fila monotônica com as ordens na janela
+        self.heap = []  # (-contagem, menor_ordem, ide_destino), com remoção preguiçosa
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def _registrar(self, destino):
+        contagem = self.contagens.get(destino, 0)
+        if contagem > 0:
+            heapq.heappush(self.heap, (-contagem, self.minimos[destino][0], destino))
+        # Reconstrói o heap quando as entradas obsoletas dominam
+        if len(self.heap) > 2 * len(self.contagens) + 64:
+            self.heap = [(-c, self.minimos[d][0], d) for d, c in self.contagens.items()]
+            heapq.heapify(self.heap)
+
+    def incluir(self, destino, ordem):
+        """Contabiliza uma entrada sem guardá-la no buffer da janela"""
+        self.contagens[destino] = self.contagens.get(destino, 0) + 1
+        fila = self.minimos.get(destino)
+        if fila is None:
+            fila = self.minimos[destino] = deque()
+        while fila and fila[-1] > ordem:
+            fila.pop()
+        fila.append(ordem)
+        self._registrar(destino)
+
+    def retirar(self, destino, ordem):
+        """Desconta uma entrada incluída anteriormente (na mesma ordem de inclusão)"""
+        contagem = self.contagens[destino] - 1
+        fila = self.minimos[destino]
+        if fila[0] == ordem:
+            fila.popleft()
+        if contagem:
+            self.contagens[destino] = contagem
+        else:
+            del self.contagens[destino]
+            del self.minimos[destino]
+        self._registrar(destino)
+
+    def adicionar(self, tim_entrada_ns, destino, ordem):
+        """Inclui uma entrada na janela (as entradas devem chegar em ordem de horário)"""
+        self.entradas.append((tim_entrada_ns, destino, ordem))
+        self.incluir(destino, ordem)
+
+    def expirar(self, limite_ns):
+        """Remove as entradas com horário anterior a limite_ns"""
+        while self.entradas and self.entradas[0][0] < limite_ns:
+            _, destino, ordem = self.entradas.popleft()
+            self.retirar(destino, ordem)
+
+    def topo(self):
+        """Retorna (destino mais frequente, contagem) ou (None, 0) se a janela estiver vazia"""
+        heap = self.heap
+        while heap:
+            contagem_neg, ordem, destino = heap[0]
+            fila = self.minimos.get(destino)
+            if fila and self.contagens[destino] == -contagem_neg and fila[0] == ordem:
+                return destino, -contagem_neg
+            heapq.heappop(heap)
+        return None, 0
+
+    def mais_frequentes(self, quantidade):
+        """
+        Retorna os `quantidade` destinos mais frequentes como lista de (destino, contagem)
+
+        A ordem é a mesma do value_counts (maior contagem e, no empate, menor
+        ordem). Os itens válidos são retirados do heap e devolvidos em seguida;
+        os obsoletos encontrados no caminho são descartados.
+        """
+        heap = self.heap
+        resultado = []
+        retirados = []
+        while heap and len(resultado) < quantidade:
+            item = heapq.heappop(heap)
+            contagem_neg, ordem, destino = item
+            fila = self.minimos.get(destino)
+            if fila and self.contagens[destino] == -contagem_neg and fila[0] == ordem:
+                retirados.append(item)
+                # Um destino pode ter duas entradas válidas iguais no heap
+                if not resultado or all(destino != d for d, _ in resultado):
+                    resultado.append((destino, -contagem_neg))
+        for item in retirados:
+            heapq.heappush(heap, item)
+        return resultado
+
+class PontuacaoDecaimento:
+    """
+    Pontuação por destino com decaimento exponencial (modo 'decaimento')
+
+    Cada entrada vale 1 no momento em que ocorre e metade a cada
+    meia_vida_minutos. As pontuações ficam escaladas para um horário de
+    referência comum (decaimento preguiçoso): incluir uma entrada soma
+    2 ** ((horário - referência) / meia-vida) à pontuação do destino, e a
+    pontuação real em um horário t é a escalada vezes 2 ** -((t - referência) / meia-vida).
+    Como o fator é o mesmo para todos os destinos e as pontuações escaladas
+    só crescem, o destino de maior pontuação é mantido em O(1) por entrada,
+    sem buffer de entradas. Quando o expoente fica grande as pontuações são
+    trazidas para uma nova referência. No empate permanece o destino que
+    atingiu a maior pontuação primeiro.
+    """
+
+    expoente_maximo = 64  # renormaliza antes de as pontuações escaladas crescerem demais
+
+    def __init__(self, meia_vida_minutos):
+        self.meia_vida_ns = float(meia_vida_minutos) * 60 * 10**9
+        self.referencia_ns = None
+        self.pontuacoes = {}  # ide_destino -> pontuação escalada para referencia_ns
+        self.melhor = None  # destino de maior pontuação
+
+    def __len__(self):
+        return len(self.pontuacoes)
+
+    def _fator(self, tim_entrada_ns):
+        return 2.0 ** ((tim_entrada_ns - self.referencia_ns) / self.meia_vida_ns)
+
+    def _renormalizar(self, tim_entrada_ns):
+        fator = 1.0 / self._fator(tim_entrada_ns)
+        self.pontuacoes = {destino: pontuacao * fator for destino, pontuacao in self.pontuacoes.items()}
+        self.referencia_ns = tim_entrada_ns
+
+    def incluir(self, destino, tim_entrada_ns):
+        """Contabiliza uma entrada (as entradas devem chegar em ordem de horário)"""
+        if self.referencia_ns is None:
+            self.referencia_ns = tim_entrada_ns
+        elif (tim_entrada_ns - self.referencia_ns) / self.meia_vida_ns > self.expoente_maximo:
+            self._renormalizar(tim_entrada_ns)
+        pontuacao = self.pontuacoes.get(destino, 0.0) + self._fator(tim_entrada_ns)
+        self.pontuacoes[destino] = pontuacao
+        if self.melhor is None or pontuacao > self.pontuacoes[self.melhor]:
+            self.melhor = destino
+
+    def topo(self, tim_entrada_ns):
+        """Retorna (destino de maior pontuação, pontuação no horário informado) ou (None, 0.0)"""
+        if self.melhor is None:
+            return None, 0.0
+        return self.melhor, self.pontuacoes[self.melhor] / self._fator(tim_entrada_ns)
+
+    def mais_frequentes(self, quantidade, tim_entrada_ns):
+        """Os `quantidade` destinos de maior pontuação no horário informado: lista de (destino, pontuação)"""
+        if self.melhor is None:
+            return []
+        fator = self._fator(tim_entrada_ns)
+        maiores = heapq.nlargest(quantidade, self.pontuacoes.items(), key=lambda item: item[1])
+        destinos = [self.melhor] + [destino for destino, _ in maiores if destino != self.melhor]
+        return [(destino, self.pontuacoes[destino] / fator) for destino in destinos[:quantidade]]
+
+class JanelaAproximada:
+    """
+    Janela deslizante aproximada com memória fixa (modo 'aproximado')
+
+    A janela é dividida em `fatias` fatias de tempo de intervalo/fatias minutos,
+    alinhadas ao horário absoluto. Cada fatia guarda um resumo Space-Saving
+    com no máximo `contadores` destinos: um destino novo com o resumo cheio
+    ocupa o contador de menor contagem, herdando essa contagem como erro.
+    Ficam guardadas só as fatias que tocam a janela (até fatias + 1), então a
+    memória por portaria é de no máximo (fatias + 1) x contadores contadores,
+    qualquer que seja o intervalo ou o movimento da portaria.
+
+    A contagem de um destino é a soma das suas contagens nas fatias guardadas
+    e pode exceder a contagem exata da janela em no máximo a soma dos erros
+    herdados (limitada a entradas cobertas / contadores) mais as entradas da
+    fatia mais antiga anteriores ao início da janela. No empate vence o
+    destino que apareceu primeiro (menor ordem) nas fatias guardadas.
+    """
+
+    def __init__(self, intervalo_minutos, contadores, fatias):
+        self.contadores = max(1, int(contadores))
+        self.duracao_fatia_ns = max(1, int(intervalo_minutos * 60 * 10**9) // max(1, int(fatias)))
+        self.fatias = deque()  # (indice_fatia, {ide_destino: [contagem, erro, primeira_ordem]}, entradas)
+        self.totais = {}  # ide_destino -> soma das contagens nas fatias guardadas
+        self.entradas = 0  # entradas cobertas pelas fatias guardadas
+
+    def __len__(self):
+        return self.entradas
+
+    def _somar(self, destino, quantidade):
+        total = self.totais.get(destino, 0) + quantidade
+        if total:
+            self.totais[destino] = total
+        else:
+            del self.totais[destino]
+
+    def adicionar(self, tim_entrada_ns, destino, ordem):
+        """Inclui uma entrada (as entradas devem chegar em ordem de horário)"""
+        indice = tim_entrada_ns // self.duracao_fatia_ns
+        if not self.fatias or self.fatias[-1][0] != indice:
+            self.fatias.append((indice, {}, [0]))
+        _, resumo, entradas = self.fatias[-1]
+        entradas[0] += 1
+        self.entradas += 1
+        contador = resumo.get(destino)
+        if contador is not None:
+            contador[0] += 1
+        elif len(resumo) < self.contadores:
+            resumo[destino] = [1, 0, ordem]
+        else:
+            # Space-Saving: o destino novo assume o contador de menor contagem
+            substituido = min(resumo, key=lambda d: resumo[d][0])
+            minimo = resumo.pop(substituido)[0]
+            self._somar(substituido, -minimo)
+            resumo[destino] = [minimo + 1, minimo, ordem]
+            self._somar(destino, minimo + 1)
+            return
+        self._somar(destino, 1)
+
+    def expirar(self, limite_ns):
+        """Descarta as fatias que terminam até limite_ns (início da janela)"""
+        while self.fatias and (self.fatias[0][0] + 1) * self.duracao_fatia_ns <= limite_ns:
+            _, resumo, entradas = self.fatias.popleft()
+            self.entradas -= entradas[0]
+            for destino, (contagem, _, _) in resumo.items():
+                self._somar(destino, -contagem)
+
+    def _primeira_ordem(self, destino):
+        return min(resumo[destino][2] for _, resumo, _ in self.fatias if destino in resumo)
+
+    def mais_frequentes(self, quantidade):
+        """Os `quantidade` destinos de maior contagem estimada: lista de (destino, contagem)"""
+        if not self.totais:
+            return []
+        maiores = heapq.nlargest(quantidade, self.totais.values())
+        candidatos = [destino for destino, contagem in self.totais.items() if contagem >= maiores[-1]]
+        candidatos.sort(key=lambda d: (-self.totais[d], self._primeira_ordem(d)))
+        return [(destino, self.totais[destino]) for destino in candidatos[:quantidade]]
+
+    def topo(self):
+        """Retorna (destino de maior contagem estimada, contagem) ou (None, 0)"""
+        if not self.totais:
+            return None, 0
+        maior = max(self.totais.values())
+        empatados = [destino for destino, contagem in self.totais.items() if contagem == maior]
+        if len(empatados) > 1:
+            return min(empatados, key=self._primeira_ordem), maior
+        return empatados[0], maior
+
+    def limite_erro(self, destino):
+        """Soma dos erros herdados pelo destino nas fatias guardadas (excesso máximo do Space-Saving)"""
+        return sum(resumo[destino][1] for _, resumo, _ in self.fatias if destino in resumo)
+
+def modo_simulacao(configuracao):
+    """Modo de uma configuração de simulação: 'janela' (padrão), 'decaimento' ou 'aproximado'"""
+    modo = configuracao.get('modo', 'janela')
+    if modo not in ('janela', 'decaimento', 'aproximado'):
+        raise ValueError(f"modo de simulação desconhecido: {modo} (disponíveis: janela, decaimento, aproximado)")
+    return modo
+
+def historico_simulacao(configuracao):
+    """Uso do índice histórico por uma configuração: None, 'reserva' ou 'mistura'"""
+    historico = configuracao.get('historico')
+    if historico not in (None, 'reserva', 'mistura'):
+        raise ValueError(f"uso do histórico desconhecido: {historico} (disponíveis: reserva, mistura)")
+    if historico == 'mistura' and modo_simulacao(configuracao) != 'janela':
+        raise ValueError("o histórico em mistura só se aplica ao modo janela")
+    return historico
+
+def descrever_parametros(configuracao):
+    """Texto curto com os parâmetros de uma simulação, ex.: '35min, mín 5 entradas'"""
+    modo = modo_simulacao(configuracao)
+    if modo == 'decaimento':
+        texto = (f"meia-vida {configuracao['meia_vida_minutos']}min, "
+                 f"pontuação mín {configuracao['quantidade_minima_entradas']}")
+    elif modo == 'aproximado':
+        texto = (f"{configuracao['intervalo_minutos']}min aprox. ({configuracao['contadores']} contadores x "
+                 f"{configuracao['fatias']} fatias), mín {configuracao['quantidade_minima_entradas']} entradas")
+    else:
+        texto = f"{configuracao['intervalo_minutos']}min, mín {configuracao['quantidade_minima_entradas']} entradas"
+    historico = historico_simulacao(configuracao)
+    if historico == 'mistura':
+        texto += f" + histórico (mistura, peso {configuracao.get('peso_historico', 1.0)})"
+    elif historico:
+        texto += " + histórico (reserva)"
+    return texto
+
+def sugerir_destino(entradas, tim_entrada_ns, intervalo_minutos, quantidade_minima_entradas):
+    """
+    Destino sugerido para uma entrada, com a mesma regra de obterSugestaoDestino
+
+    Considera as entradas da portaria com horário anterior a tim_entrada_ns e
+    no máximo intervalo_minutos antes dele; no empate vence o destino que
+    aparece primeiro em entradas.
+
+    Args:
+        entradas: sequência de (tim_entrada_ns, ide_destino) da portaria, na
+            ordem do arquivo (ide_destino None é ignorado)
+        tim_entrada_ns: horário da entrada em nanossegundos desde 1970
+        intervalo_minutos: Intervalo em minutos para análise
+        quantidade_minima_entradas: Quantidade mínima de entradas
+
+    Returns:
+        ID do destino sugerido ou None
+    """
+    limite_ns = tim_entrada_ns - int(intervalo_minutos * 60 * 10**9)
+    janela = JanelaDestinos()
+    for ordem, (tim_ns, destino) in enumerate(entradas):
+        if destino is not None and limite_ns <= tim_ns < tim_entrada_ns:
+            janela.incluir(destino, ordem)
+    destino, contagem = janela.topo()
+    if destino is None or contagem < quantidade_minima_entradas:
+        return None
+    return destino
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reprodução de Entradas - Gerador de Carga do Serviço de Sugestões
+Reproduz as entradas de um ou mais CSV da pasta input, em ordem de horário,
+pelo mesmo caminho do serviço em tempo real (ServicoSugestoes.processar_entrada)
+e mede se as sugestões acompanham os picos de chegada das portarias
+
+- Velocidade 1 reproduz em tempo real; N reproduz N vezes mais rápido; 0 não
+  espera entre as entradas (mede a capacidade máxima)
+- Com vários dias, cada dia extra é trazido para a data do primeiro e suas
+  portarias ganham novos IDs, simulando mais portarias no mesmo horário
+
+Relatório por portaria: entradas, pico de chegadas por minuto, latência de
+cada consulta (p50/p95/p99) e atraso em relação ao horário previsto.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from array import array
+from datetime import datetime
+
+from ServicoSugestoesDestinos import ServicoSugestoes, converter_horario_ns, parse_perfis
+
+# Deslocamento dos IDs das portarias de cada dia extra (dia k: ide_portaria + k * deslocamento)
+deslocamento_portarias = 1000
+
+# Percentis de latência relatados
+percentis = [50, 95, 99]
+
+
+def _horario(texto):
+    return datetime.fromisoformat(texto.strip())
+
+
+def ler_entradas_reproducao(arquivos_csv, hora_inicio=None, hora_fim=None):
+    """
+    Lê as entradas dos arquivos (um por dia) e as ordena por horário
+
+    O primeiro arquivo mantém portarias e horários; o dia k (k >= 1) é
+    trazido para a data do primeiro, com ide_portaria + k * deslocamento_portarias.
+
+    Args:
+        arquivos_csv: Arquivos CSV no layout SIVIS
+        hora_inicio, hora_fim: Reproduz apenas as entradas entre esses horários
+            do dia (datetime.time, opcional)
+
+    Returns:
+        tuple: (eventos, descricoes), com eventos em ordem de horário como
+        (horario_ns, ide_portaria, tim_entrada, ide_destino, desdestinoGenerico)
+        e descricoes ide_portaria -> des_portaria
+    """
+    eventos = []
+    descricoes = {}
+    data_base = None
+    for k, arquivo in enumerate(arquivos_csv):
+        with open(arquivo, 'r', encoding='utf-8', newline='') as f:
+            for linha in csv.DictReader(f):
+                horario = _horario(linha['tim_entrada'])
+                if data_base is None:
+                    data_base = horario.date()
+                if hora_inicio is not None and horario.time() < hora_inicio:
+                    continue
+                if hora_fim is not None and horario.time() > hora_fim:
+                    continue
+                ide_portaria = int(linha['ide_portaria']) + k * deslocamento_portarias
+                if k:
+                    horario = datetime.combine(data_base, horario.time())
+                if ide_portaria not in descricoes:
+                    descricao = linha.get('des_portaria') or f"Portaria {linha['ide_portaria']}"
+                    descricoes[ide_portaria] = descricao + (f" (dia {k + 1})" if k else '')
+                eventos.append((converter_horario_ns(horario), ide_portaria,
+                                horario.isoformat(sep=' ', timespec='milliseconds'),
+                                linha.get('ide_destino'), linha.get('desdestinoGenerico')))
+    eventos.sort(key=lambda evento: evento[0])
+    return eventos, descricoes
+
+
+def reproduzir(servico, eventos, velocidade=1.0):
+    """
+    Envia os eventos ao serviço respeitando os intervalos originais divididos
+    pela velocidade (0 = sem espera)
+
+    Returns:
+        dict: ide_portaria -> {'latencias': segundos de cada consulta,
+        'atrasos': segundos de atraso sobre o horário previsto}, e a duração total
+    """
+    medidas = {}
+    if not eventos:
+        return medidas, 0.0
+    inicio_relogio = time.perf_counter()
+    inicio_eventos = eventos[0][0]
+    for horario_ns, ide_portaria, tim_entrada, ide_destino, descricao_destino in eventos:
+        medida = medidas.get(ide_portaria)
+        if medida is None:
+            medida = medidas[ide_portaria] = {'latencias': array('d'), 'atrasos': array('d')}
+        if velocidade > 0:
+            previsto = inicio_relogio + (horario_ns - inicio_eventos) / 1e9 / velocidade
+            espera = previsto - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+        inicio = time.perf_counter()
+        servico.processar_entrada(ide_portaria, tim_entrada, ide_destino, descricao_destino)
+        medida['latencias'].append(time.perf_counter() - inicio)
+        if velocidade > 0:
+            medida['atrasos'].append(max(0.0, inicio - previsto))
+    return medidas, time.perf_counter() - inicio_relogio
+
+
+def _percentil(ordenados, percentil):
+    """Percentil pelo método do posto mais próximo (valores já ordenados)"""
+    if not ordenados:
+        return None
+    posicao = max(0, min(len(ordenados) - 1, -(-len(ordenados) * percentil // 100) - 1))
+    return ordenados[int(posicao)]
+
+
+def pico_por_minuto(horarios_ns):
+    """Maior quantidade de entradas em qualquer janela de 60 segundos (horários ordenados)"""
+    pico = 0
+    inicio = 0
+    for fim, horario in enumerate(horarios_ns):
+        while horario - horarios_ns[inicio] >= 60 * 10**9:
+            inicio += 1
+        pico = max(pico, fim - inicio + 1)
+    return pico
+
+
+def resumir(eventos, medidas, descricoes, duracao, velocidade):
+    """
+    Monta o relatório: uma linha por portaria e o total
+
+    Latências em microssegundos; atrasos em milissegundos (só com velocidade > 0).
+    """
+    horarios = {}
+    for horario_ns, ide_portaria, *_ in eventos:
+        horarios.setdefault(ide_portaria, []).append(horario_ns)
+
+    def linha(nome, descricao, latencias, atrasos, picos):
+        latencias = sorted(latencias)
+        item = {
+            'ide_portaria': nome,
+            'descricao': descricao,
+            'entradas': len(latencias),
+            'pico_por_minuto': picos,
+            'media_us': round(sum(latencias) / len(latencias) * 1e6, 1) if latencias else None,
+        }
+        for p in percentis:
+            valor = _percentil(latencias, p)
+            item[f'p{p}_us'] = round(valor * 1e6, 1) if valor is not None else None
+        item['max_us'] = round(latencias[-1] * 1e6, 1) if latencias else None
+        if velocidade > 0 and atrasos:
+            atrasos = sorted(atrasos)
+            item['atraso_p99_ms'] = round(_percentil(atrasos, 99) * 1e3, 2)
+            item['atraso_max_ms'] = round(atrasos[-1] * 1e3, 2)
+        return item
+
+    portarias = [linha(ide_portaria, descricoes.get(ide_portaria), medida['latencias'], medida['atrasos'],
+                       pico_por_minuto(horarios[ide_portaria]))
+                 for ide_portaria, medida in sorted(medidas.items())]
+    total = linha('Todas', 'Todas as portarias',
+                  [valor for medida in medidas.values() for valor in medida['latencias']],
+                  [valor for medida in medidas.values() for valor in medida['atrasos']],
+                  pico_por_minuto([evento[0] for evento in eventos]))
+    processamento = sum(sum(medida['latencias']) for medida in medidas.values())
+    return {
+        'velocidade': velocidade,
+        'duracao_s': round(duracao, 3),
+        'vazao_por_segundo': round(len(eventos) / duracao, 1) if duracao > 0 else None,
+        'capacidade_por_segundo': round(len(eventos) / processamento, 1) if processamento > 0 else None,
+        'portarias': portarias,
+        'total': total,
+    }
+
+
+def mostrar_relatorio(relatorio):
+    print(f"\n📈 {relatorio['total']['entradas']:,} entradas em {relatorio['duracao_s']:.1f}s "
+          f"(velocidade {relatorio['velocidade']:g}x): {relatorio['vazao_por_segundo'] or 0:,.0f} entradas/s; "
+          f"capacidade do caminho de sugestão {relatorio['capacidade_por_segundo'] or 0:,.0f} entradas/s")
+    colunas_atraso = relatorio['velocidade'] > 0
+    cabecalho = f"   {'Portaria':<32} {'Entradas':>9} {'Pico/min':>9} " + \
+        ' '.join(f"{f'p{p} (µs)':>10}" for p in percentis) + f" {'máx (µs)':>10}"
+    if colunas_atraso:
+        cabecalho += f" {'atraso p99 (ms)':>16}"
+    print(cabecalho)
+    for item in relatorio['portarias'] + [relatorio['total']]:
+        nome = f"{item['ide_portaria']} - {item['descricao']}" if item is not relatorio['total'] else item['descricao']
+        texto = f"   {nome[:32]:<32} {item['entradas']:>9,} {item['pico_por_minuto']:>9,} " + \
+            ' '.join(f"{item[f'p{p}_us']:>10,.1f}" for p in percentis) + f" {item['max_us']:>10,.1f}"
+        if colunas_atraso:
+            texto += f" {item.get('atraso_p99_ms', 0):>16,.2f}"
+        print(texto)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproduz entradas SIVIS pelo serviço de sugestões e mede a latência")
+    parser.add_argument("arquivos", nargs="*", default=[os.path.join("input", "Entradas-28-10-2025.csv")],
+                        help="CSV de entrada; vários arquivos são intercalados como portarias extras "
+                             "(padrão: input/Entradas-28-10-2025.csv)")
+    parser.add_argument("--velocidade", type=float, default=1.0,
+                        help="1 = tempo real, N = N vezes mais rápido, 0 = sem espera (padrão: 1)")
+    parser.add_argument("--de", metavar="HH:MM", help="Reproduz a partir deste horário do dia (ex.: 07:00)")
+    parser.add_argument("--ate", metavar="HH:MM", help="Reproduz até este horário do dia (ex.: 09:30)")
+    parser.add_argument("--perfis", help="Perfis 'intervalo:quantidade_minima' (padrão: lista simulacoes do simulador)")
+    parser.add_argument("--top-k", type=int, default=0, metavar="K",
+                        help="Calcula também o ranking dos K destinos mais frequentes em cada consulta")
+    parser.add_argument("--saida", metavar="JSON", help="Grava o relatório em JSON")
+    args = parser.parse_args()
+
+    hora_inicio = datetime.strptime(args.de, '%H:%M').time() if args.de else None
+    hora_fim = datetime.strptime(args.ate, '%H:%M').time() if args.ate else None
+    arquivos_faltando = [arquivo for arquivo in args.arquivos if not os.path.exists(arquivo)]
+    if arquivos_faltando:
+        print(f"❌ Arquivo(s) não encontrado(s): {', '.join(arquivos_faltando)}")
+        sys.exit(1)
+
+    eventos, descricoes = ler_entradas_reproducao(args.arquivos, hora_inicio, hora_fim)
+    servico = ServicoSugestoes(parse_perfis(args.perfis) if args.perfis else None, top_k=args.top_k)
+    if eventos:
+        duracao_prevista = (eventos[-1][0] - eventos[0][0]) / 1e9 / args.velocidade if args.velocidade > 0 else 0
+        print(f"▶️ Reproduzindo {len(eventos):,} entradas de {len(descricoes)} portaria(s) "
+              f"com {len(servico.perfis)} perfil(is)"
+              + (f", cerca de {duracao_prevista / 60:.1f} min" if args.velocidade > 0 else ", sem espera"))
+    medidas, duracao = reproduzir(servico, eventos, args.velocidade)
+    relatorio = resumir(eventos, medidas, descricoes, duracao, args.velocidade)
+    relatorio['arquivos'] = args.arquivos
+    relatorio['perfis'] = servico.perfis
+    if eventos:
+        mostrar_relatorio(relatorio)
+    else:
+        print("⚠️ Nenhuma entrada no período informado.")
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        print(f"📁 Relatório: {args.saida}")
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço de Sugestões de Destinos em Tempo Real
+Consome as entradas das portarias à medida que chegam e responde, para cada
+visitante, o destino que seria sugerido naquele momento
+
+Usa a mesma lógica de obterSugestaoDestino (janela de intervalo_minutos,
+quantidade mínima de entradas e desempate pela ordem de chegada), mas mantém
+o estado de cada portaria de forma incremental.
+
+Fontes de entrada:
+- stdin           -> uma entrada por linha (CSV no layout SIVIS ou JSON)
+- --seguir ARQ    -> acompanha um CSV que está sendo gravado (como tail -f)
+- --porta N       -> socket TCP local, um pedido por linha
+
+Cada linha recebida gera uma linha JSON de resposta. Com --atraso-maximo as
+entradas ficam em espera e são respondidas em ordem de tim_entrada, o que
+permite consumir arquivos que não chegam em ordem cronológica (como o CSV
+exportado do SIVIS); --conferir reproduz um CSV desse modo e compara as
+respostas com as sugestões do simulador.
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from NucleoSugestoes import JanelaAproximada, JanelaDestinos, PontuacaoDecaimento, modo_simulacao
+from SimuladorSugestoesDestinos import (calcular_sugestoes_multiplas, carregar_entradas, contadores_aproximado,
+                                        fatias_aproximado, simulacoes)
+
+# Colunas do arquivo SIVIS, na ordem do CSV exportado
+COLUNAS_SIVIS = ["ide_entrada", "ide_portaria", "des_portaria", "tim_entrada", "data_entrada",
+                 "hora_minuto_entrada", "ide_destino", "desdestinoGenerico"]
+
+_EPOCA = datetime(1970, 1, 1)
+
+
+def converter_horario_ns(tim_entrada):
+    """Converte 'AAAA-MM-DD HH:MM:SS.mmm' (ou datetime) em nanossegundos desde 1970"""
+    if isinstance(tim_entrada, (int, float)):
+        return int(tim_entrada)
+    if isinstance(tim_entrada, str):
+        tim_entrada = datetime.fromisoformat(tim_entrada.strip())
+    delta = tim_entrada.replace(tzinfo=None) - _EPOCA
+    return (delta.days * 86400 + delta.seconds) * 10**9 + delta.microseconds * 1000
+
+
+def normalizar_destino(ide_destino):
+    """Converte o ide_destino (ou ide_entrada) recebido em int (None quando vazio)"""
+    if ide_destino is None:
+        return None
+    if isinstance(ide_destino, str):
+        ide_destino = ide_destino.strip()
+        if ide_destino == '':
+            return None
+    valor = float(ide_destino)
+    return int(valor) if valor.is_integer() else valor
+
+
+class EstadoPortaria:
+    """
+    Estado incremental de uma portaria para vários perfis de simulação
+
+    As entradas ficam em um único buffer compartilhado; cada perfil guarda
+    apenas a posição (sequência) da sua entrada mais antiga e suas contagens.
+    Entradas que saíram da janela de todos os perfis são descartadas. Perfis
+    no modo decaimento (PontuacaoDecaimento) e no modo aproximado
+    (JanelaAproximada, memória fixa) não usam o buffer.
+
+    Como na simulação, a janela de um horário t só contém entradas com
+    horário estritamente anterior a t: as entradas registradas em t ficam
+    retidas e entram nas janelas quando chega uma consulta ou entrada posterior.
+    """
+
+    def __init__(self, perfis):
+        self.perfis = perfis
+        self.modos = [modo_simulacao(p) for p in perfis]
+        self.limites_ns = [None if modo == 'decaimento' else int(p['intervalo_minutos'] * 60 * 10**9)
+                           for p, modo in zip(perfis, self.modos)]
+        self.janelas = [self._criar_janela(p, modo) for p, modo in zip(perfis, self.modos)]
+        self.inicios = [0] * len(perfis)  # sequência da primeira entrada de cada janela
+        self.entradas = deque()  # (tim_entrada_ns, ide_destino, ordem)
+        self.sequencia_base = 0  # sequência da entrada em self.entradas[0]
+        self.ultimo_horario_ns = None
+        self.retidas = []  # (tim_entrada_ns, ide_destino, ordem) registradas em ultimo_horario_ns
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _criar_janela(perfil, modo):
+        if modo == 'decaimento':
+            return PontuacaoDecaimento(perfil['meia_vida_minutos'])
+        if modo == 'aproximado':
+            return JanelaAproximada(perfil['intervalo_minutos'], perfil.get('contadores', contadores_aproximado),
+                                    perfil.get('fatias', fatias_aproximado))
+        return JanelaDestinos()
+
+    def _expirar(self, horario_ns):
+        for w, janela in enumerate(self.janelas):
+            if self.modos[w] != 'janela':
+                if self.modos[w] == 'aproximado':
+                    janela.expirar(horario_ns - self.limites_ns[w])
+                self.inicios[w] = self.sequencia_base + len(self.entradas)
+                continue
+            limite = horario_ns - self.limites_ns[w]
+            inicio = self.inicios[w]
+            fim = self.sequencia_base + len(self.entradas)
+            while inicio < fim:
+                tim, destino, ordem = self.entradas[inicio - self.sequencia_base]
+                if tim >= limite:
+                    break
+                janela.retirar(destino, ordem)
+                inicio += 1
+            self.inicios[w] = inicio
+        # Descarta o que já saiu de todas as janelas
+        menor_inicio = min(self.inicios)
+        while self.sequencia_base < menor_inicio:
+            self.entradas.popleft()
+            self.sequencia_base += 1
+
+    def _liberar_retidas(self, horario_ns):
+        """Inclui nas janelas as entradas retidas com horário anterior a horario_ns"""
+        if self.retidas and self.retidas[0][0] < horario_ns:
+            for entrada in self.retidas:
+                self._incluir(*entrada)
+            self.retidas = []
+
+    def sugerir(self, horario_ns):
+        """Destino sugerido por perfil no horário informado: lista de (destino, contagem) ou None"""
+        self._liberar_retidas(horario_ns)
+        self._expirar(horario_ns)
+        sugestoes = []
+        for perfil, janela, modo in zip(self.perfis, self.janelas, self.modos):
+            destino, contagem = janela.topo(horario_ns) if modo == 'decaimento' else janela.topo()
+            if destino is not None and contagem >= perfil['quantidade_minima_entradas']:
+                sugestoes.append((destino, contagem))
+            else:
+                sugestoes.append(None)
+        return sugestoes
+
+    def ranking(self, horario_ns, quantidade):
+        """Os destinos mais frequentes por perfil (lista de (destino, contagem)), após sugerir()"""
+        rankings = []
+        for perfil, janela, modo in zip(self.perfis, self.janelas, self.modos):
+            mais_frequentes = janela.mais_frequentes(quantidade, horario_ns) if modo == 'decaimento' \
+                else janela.mais_frequentes(quantidade)
+            rankings.append([(destino, contagem) for destino, contagem in mais_frequentes
+                             if contagem >= perfil['quantidade_minima_entradas']])
+        return rankings
+
+    def conferir_ordem(self, horario_ns):
+        """Rejeita entradas anteriores à última já registrada na portaria"""
+        if self.ultimo_horario_ns is not None and horario_ns < self.ultimo_horario_ns:
+            raise ValueError("entrada fora de ordem cronológica para a portaria "
+                             "(use atraso_maximo_minutos / --atraso-maximo para reordenar)")
+
+    def registrar(self, horario_ns, destino, ordem):
+        """Inclui uma entrada (as entradas de uma portaria devem chegar em ordem de horário)"""
+        self.conferir_ordem(horario_ns)
+        self.ultimo_horario_ns = horario_ns
+        self._liberar_retidas(horario_ns)
+        self.retidas.append((horario_ns, destino, ordem))
+
+    def _incluir(self, horario_ns, destino, ordem):
+        """Contabiliza a entrada no buffer e nas janelas de todos os perfis"""
+        if 'janela' in self.modos:
+            self.entradas.append((horario_ns, destino, ordem))
+        for janela, modo in zip(self.janelas, self.modos):
+            if modo == 'decaimento':
+                janela.incluir(destino, horario_ns)
+            elif modo == 'aproximado':
+                janela.adicionar(horario_ns, destino, ordem)
+            else:
+                janela.incluir(destino, ordem)
+
+
+class ServicoSugestoes:
+    """
+    Sugestões de destino em tempo real para todas as portarias
+
+    Cada portaria tem seu próprio estado e trava, de modo que entradas de
+    portarias diferentes podem ser processadas simultaneamente. Com top_k > 0
+    cada resposta traz também o ranking dos top_k destinos de cada perfil.
+
+    Com atraso_maximo_minutos > 0, receber_entrada() guarda as entradas em
+    espera e só as processa, em ordem de tim_entrada, quando a entrada mais
+    recente recebida passa atraso_maximo_minutos além do seu horário (como
+    processar_em_blocos no simulador); a ordem de chegada continua sendo usada
+    no desempate.
+    """
+
+    def __init__(self, perfis=None, top_k=0, atraso_maximo_minutos=0):
+        self.perfis = list(perfis or simulacoes)
+        self.top_k = top_k
+        self.atraso_maximo_minutos = atraso_maximo_minutos
+        self.atraso_maximo_ns = int(atraso_maximo_minutos * 60 * 10**9)
+        self.modos_perfis = [modo_simulacao(p) for p in self.perfis]
+        self.estados = {}
+        self.descricoes_destino = {}
+        self._lock_estados = threading.Lock()
+        self._lock_sequencia = threading.Lock()
+        self._sequencia = 0
+        self._pendentes = []  # heap de (tim_entrada_ns, ordem, entrada) em espera
+        self._horario_maximo_ns = None
+        self._lock_pendentes = threading.Lock()
+
+    def _estado(self, ide_portaria):
+        estado = self.estados.get(ide_portaria)
+        if estado is None:
+            with self._lock_estados:
+                estado = self.estados.setdefault(ide_portaria, EstadoPortaria(self.perfis))
+        return estado
+
+    def _proxima_ordem(self):
+        with self._lock_sequencia:
+            self._sequencia += 1
+            return self._sequencia
+
+    def _resposta(self, ide_portaria, tim_entrada, sugestoes, rankings=None, ide_entrada=None):
+        resposta = []
+        for k, (perfil, sugestao) in enumerate(zip(self.perfis, sugestoes)):
+            item = {
+                'perfil': perfil.get('descricao'),
+                'intervalo_minutos': perfil.get('intervalo_minutos'),
+                'quantidade_minima_entradas': perfil['quantidade_minima_entradas'],
+                'ide_destino': None,
+            }
+            if self.modos_perfis[k] == 'decaimento':
+                item['meia_vida_minutos'] = perfil['meia_vida_minutos']
+            elif self.modos_perfis[k] == 'aproximado':
+                item['contadores'] = perfil.get('contadores', contadores_aproximado)
+                item['fatias'] = perfil.get('fatias', fatias_aproximado)
+            if sugestao is not None:
+                item['ide_destino'] = sugestao[0]
+                item['contagem'] = sugestao[1]
+                item['desdestinoGenerico'] = self.descricoes_destino.get(sugestao[0])
+            if rankings is not None:
+                item['ranking'] = [{'ide_destino': destino, 'contagem': contagem,
+                                    'desdestinoGenerico': self.descricoes_destino.get(destino)}
+                                   for destino, contagem in rankings[k]]
+            resposta.append(item)
+        cabecalho = {'ide_entrada': ide_entrada} if ide_entrada is not None else {}
+        return {**cabecalho, 'ide_portaria': ide_portaria, 'tim_entrada': str(tim_entrada), 'sugestoes': resposta}
+
+    def consultar(self, ide_portaria, tim_entrada=None):
+        """Sugestões para o próximo visitante da portaria, sem registrar entrada"""
+        horario_ns = converter_horario_ns(tim_entrada if tim_entrada is not None else datetime.now())
+        estado = self._estado(ide_portaria)
+        with estado.lock:
+            sugestoes = estado.sugerir(horario_ns)
+            rankings = estado.ranking(horario_ns, self.top_k) if self.top_k else None
+        return self._resposta(ide_portaria, tim_entrada, sugestoes, rankings)
+
+    def processar_entrada(self, ide_portaria, tim_entrada, ide_destino=None, desdestinoGenerico=None,
+                          ide_entrada=None):
+        """
+        Responde a sugestão para o visitante que está entrando (calculada antes
+        de contabilizá-lo, como na simulação) e registra seu destino na janela
+        """
+        return self._processar(ide_portaria, tim_entrada, converter_horario_ns(tim_entrada), ide_destino,
+                               desdestinoGenerico, ide_entrada, self._proxima_ordem())
+
+    def _processar(self, ide_portaria, tim_entrada, horario_ns, ide_destino, desdestinoGenerico, ide_entrada,
+                   ordem):
+        destino = normalizar_destino(ide_destino)
+        if destino is not None and desdestinoGenerico:
+            self.descricoes_destino[destino] = desdestinoGenerico
+        estado = self._estado(ide_portaria)
+        with estado.lock:
+            if destino is not None:
+                estado.conferir_ordem(horario_ns)
+            sugestoes = estado.sugerir(horario_ns)
+            rankings = estado.ranking(horario_ns, self.top_k) if self.top_k else None
+            if destino is not None:
+                estado.registrar(horario_ns, destino, ordem)
+        return self._resposta(ide_portaria, tim_entrada, sugestoes, rankings, ide_entrada)
+
+    def receber_entrada(self, ide_portaria, tim_entrada, ide_destino=None, desdestinoGenerico=None,
+                        ide_entrada=None):
+        """
+        Recebe uma entrada e retorna a lista de respostas das entradas liberadas
+
+        Sem atraso máximo a entrada é processada na hora; com atraso máximo ela
+        fica em espera e a lista traz as entradas que deixaram a espera (de
+        qualquer portaria), em ordem de tim_entrada.
+        """
+        if not self.atraso_maximo_ns:
+            return [self.processar_entrada(ide_portaria, tim_entrada, ide_destino, desdestinoGenerico, ide_entrada)]
+        horario_ns = converter_horario_ns(tim_entrada)
+        with self._lock_pendentes:
+            entrada = (ide_portaria, tim_entrada, horario_ns, ide_destino, desdestinoGenerico, ide_entrada)
+            heapq.heappush(self._pendentes, (horario_ns, self._proxima_ordem(), entrada))
+            if self._horario_maximo_ns is None or horario_ns > self._horario_maximo_ns:
+                self._horario_maximo_ns = horario_ns
+            return self._liberar(self._horario_maximo_ns - self.atraso_maximo_ns)
+
+    def liberar_pendentes(self):
+        """Processa todas as entradas em espera (fim da leitura) e retorna suas respostas"""
+        with self._lock_pendentes:
+            return self._liberar(None)
+
+    def _liberar(self, limite_ns):
+        respostas = []
+        while self._pendentes and (limite_ns is None or self._pendentes[0][0] <= limite_ns):
+            _, ordem, entrada = heapq.heappop(self._pendentes)
+            ide_portaria, tim_entrada, horario_ns, ide_destino, desdestinoGenerico, ide_entrada = entrada
+            try:
+                respostas.append(self._processar(ide_portaria, tim_entrada, horario_ns, ide_destino,
+                                                 desdestinoGenerico, ide_entrada, ordem))
+            except ValueError:
+                respostas.append({'erro': f"entrada fora de ordem cronológica para a portaria, além do atraso "
+                                          f"máximo de {self.atraso_maximo_minutos} min",
+                                  'ide_entrada': ide_entrada, 'ide_portaria': ide_portaria,
+                                  'tim_entrada': str(tim_entrada)})
+        return respostas
+
+    def processar_linha(self, linha, colunas=COLUNAS_SIVIS):
+        """
+        Processa uma linha recebida (JSON ou CSV no layout SIVIS)
+
+        JSON com "consulta": true apenas consulta; demais linhas registram a
+        entrada (receber_entrada). Retorna a lista de respostas, vazia para
+        linhas ignoradas ou entradas que ficaram em espera.
+        """
+        linha = linha.strip()
+        if not linha:
+            return []
+        try:
+            if linha.startswith('{'):
+                dados = json.loads(linha)
+            else:
+                valores = next(csv.reader([linha]))
+                if valores and valores[0] == colunas[0]:
+                    return []  # cabeçalho
+                dados = dict(zip(colunas, valores))
+            ide_portaria = int(dados['ide_portaria'])
+            if dados.get('consulta'):
+                return [self.consultar(ide_portaria, dados.get('tim_entrada'))]
+            ide_entrada = normalizar_destino(dados.get('ide_entrada'))
+            return self.receber_entrada(ide_portaria, dados['tim_entrada'], dados.get('ide_destino'),
+                                        dados.get('desdestinoGenerico'), ide_entrada)
+        except (KeyError, ValueError, TypeError) as e:
+            return [{'erro': str(e), 'linha': linha}]
+
+
+def parse_perfis(texto):
+    """
+    Converte 'intervalo:quantidade,intervalo:quantidade' em perfis de simulação
+
+    Um item 'd<meia_vida>:<pontuacao>' (ex.: d15:3) cria um perfil no modo decaimento
+    e 'a<intervalo>:<quantidade>' (ex.: a240:20), um perfil no modo aproximado
+    (contadores_aproximado e fatias_aproximado do simulador).
+    """
+    perfis = []
+    for i, item in enumerate(texto.split(','), 1):
+        intervalo, quantidade = item.split(':')
+        if intervalo.startswith('d'):
+            meia_vida = intervalo[1:]
+            perfis.append({
+                'descricao': f'Perfil {i}',
+                'modo': 'decaimento',
+                'meia_vida_minutos': float(meia_vida) if '.' in meia_vida else int(meia_vida),
+                'quantidade_minima_entradas': float(quantidade) if '.' in quantidade else int(quantidade),
+            })
+            continue
+        if intervalo.startswith('a'):
+            perfis.append({
+                'descricao': f'Perfil {i}',
+                'modo': 'aproximado',
+                'intervalo_minutos': int(intervalo[1:]),
+                'quantidade_minima_entradas': int(quantidade),
+                'contadores': contadores_aproximado,
+                'fatias': fatias_aproximado,
+            })
+            continue
+        perfis.append({
+            'descricao': f'Perfil {i}',
+            'intervalo_minutos': float(intervalo) if '.' in intervalo else int(intervalo),
+            'quantidade_minima_entradas': int(quantidade),
+        })
+    return perfis
+
+
+def _responder(respostas, saida=sys.stdout):
+    for resposta in respostas:
+        saida.write(json.dumps(resposta, ensure_ascii=False, default=str) + '\n')
+    if respostas:
+        saida.flush()
+
+
+def servir_stdin(servico):
+    """Lê entradas da entrada padrão até o fim"""
+    for linha in sys.stdin:
+        _responder(servico.processar_linha(linha))
+    _responder(servico.liberar_pendentes())
+
+
+def seguir_arquivo(servico, arquivo, desde_inicio=False, intervalo_espera=0.2):
+    """Acompanha um CSV que está sendo gravado, processando cada nova linha"""
+    with open(arquivo, 'r', encoding='utf-8', newline='') as f:
+        cabecalho = f.readline()
+        colunas = next(csv.reader([cabecalho])) if cabecalho else COLUNAS_SIVIS
+        if not desde_inicio:
+            f.seek(0, os.SEEK_END)
+        pendente = ''
+        em_dia = False
+        while True:
+            trecho = f.readline()
+            if not trecho:
+                if not em_dia:
+                    # Fim do conteúdo já existente: responde o que ficou em espera
+                    _responder(servico.liberar_pendentes())
+                    em_dia = True
+                time.sleep(intervalo_espera)
+                continue
+            pendente += trecho
+            if not pendente.endswith('\n'):
+                continue  # linha ainda sendo gravada
+            _responder(servico.processar_linha(pendente, colunas))
+            pendente = ''
+
+
+def servir_socket(servico, porta, host='127.0.0.1'):
+    """Atende pedidos por socket TCP local (um pedido JSON/CSV por linha)"""
+
+    class _Tratador(socketserver.StreamRequestHandler):
+        def handle(self):
+            for linha in self.rfile:
+                for resposta in servico.processar_linha(linha.decode('utf-8')):
+                    self.wfile.write((json.dumps(resposta, ensure_ascii=False, default=str) + '\n').encode('utf-8'))
+
+    class _Servidor(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    with _Servidor((host, porta), _Tratador) as servidor:
+        print(f"🛰️ Serviço de sugestões ouvindo em {host}:{porta}", file=sys.stderr)
+        servidor.serve_forever()
+
+
+def conferir_com_simulador(arquivo_csv, perfis=None, atraso_maximo_minutos=24 * 60):
+    """
+    Reproduz um CSV de entradas pelo serviço e compara com o simulador
+
+    As linhas são enviadas na ordem do arquivo (com atraso máximo para
+    reordená-las) e a sugestão de cada perfil é comparada, por ide_entrada,
+    com calcular_sugestoes_multiplas sobre as mesmas entradas.
+
+    Returns:
+        int: quantidade de sugestões divergentes (inclui entradas sem resposta)
+    """
+    servico = ServicoSugestoes(perfis, atraso_maximo_minutos=atraso_maximo_minutos)
+    respostas = {}
+    erros = []
+    with open(arquivo_csv, 'r', encoding='utf-8', newline='') as f:
+        colunas = next(csv.reader([f.readline()]))
+        for linha in f:
+            for resposta in servico.processar_linha(linha, colunas):
+                if 'erro' in resposta:
+                    erros.append(resposta)
+                else:
+                    respostas[resposta.get('ide_entrada')] = resposta
+    for resposta in servico.liberar_pendentes():
+        if 'erro' in resposta:
+            erros.append(resposta)
+        else:
+            respostas[resposta.get('ide_entrada')] = resposta
+    for erro in erros[:5]:
+        print(f"⚠️ {erro}", file=sys.stderr)
+    
+    df, _ = carregar_entradas(arquivo_csv, usar_cache=False)
+    esperadas = calcular_sugestoes_multiplas(df, servico.perfis, ordem=df.index.to_numpy())
+    divergencias = 0
+    for k, (perfil, esperada) in enumerate(zip(servico.perfis, esperadas)):
+        divergentes = 0
+        for ide_entrada, destino in zip(df['ide_entrada'].tolist(), esperada.tolist()):
+            resposta = respostas.get(ide_entrada)
+            obtido = resposta['sugestoes'][k]['ide_destino'] if resposta is not None else None
+            if obtido != (None if destino is None or destino != destino else destino):
+                divergentes += 1
+                if divergentes <= 3:
+                    print(f"   ❌ {perfil.get('descricao')}: entrada {ide_entrada} sugeriu {obtido}, "
+                          f"simulador {destino}", file=sys.stderr)
+        divergencias += divergentes
+    print(f"{'✅' if divergencias == 0 else '❌'} {len(df):,} entradas x {len(servico.perfis)} perfis: "
+          f"{divergencias:,} sugestões divergentes ({len(erros):,} erros)", file=sys.stderr)
+    return divergencias
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço de sugestões de destinos em tempo real")
+    parser.add_argument("--perfis", help="Perfis 'intervalo:quantidade_minima' separados por vírgula; "
+                                         "'d<meia_vida>:<pontuacao>' usa decaimento e 'a<intervalo>:<quantidade>' o modo "
+                                         "aproximado (padrão: lista simulacoes do simulador)")
+    parser.add_argument("--seguir", metavar="ARQUIVO", help="Acompanha um CSV que está sendo gravado")
+    parser.add_argument("--desde-inicio", action="store_true",
+                        help="Com --seguir, processa também as linhas já existentes")
+    parser.add_argument("--porta", type=int, help="Atende por socket TCP local nesta porta")
+    parser.add_argument("--top-k", type=int, default=0, metavar="K",
+                        help="Inclui em cada resposta o ranking dos K destinos mais frequentes")
+    parser.add_argument("--atraso-maximo", type=float, default=0, metavar="MINUTOS",
+                        help="Mantém as entradas em espera até este atraso e as responde em ordem de "
+                             "tim_entrada (para arquivos fora de ordem cronológica; padrão: 0, sem espera)")
+    parser.add_argument("--conferir", metavar="ARQUIVO",
+                        help="Reproduz o CSV pelo serviço e compara as respostas com o simulador "
+                             "(padrão de atraso máximo: 1440 min)")
+    args = parser.parse_args()
+
+    perfis = parse_perfis(args.perfis) if args.perfis else None
+    if args.conferir:
+        sys.exit(1 if conferir_com_simulador(args.conferir, perfis, args.atraso_maximo or 24 * 60) else 0)
+    servico = ServicoSugestoes(perfis, top_k=args.top_k, atraso_maximo_minutos=args.atraso_maximo)
+    try:
+        if args.porta:
+            servir_socket(servico, args.porta)
+        elif args.seguir:
+            seguir_arquivo(servico, args.seguir, desde_inicio=args.desde_inicio)
+        else:
+            servir_stdin(servico)
+    except KeyboardInterrupt:
+        pass
@@ -9,12 +9,48 @@ Estrutura de pastas:
 - output/ -> Planilhas Excel geradas
 """
 
-import pandas as pd
+import hashlib
+import importlib.util
+import json
+import re
+import resource
+import shutil
+import sqlite3
 import sys
 import os
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from NucleoSugestoes import (JanelaAproximada, JanelaDestinos, PontuacaoDecaimento, descrever_parametros,
+                             historico_simulacao, modo_simulacao)
+
+def _importacao_tardia(nome):
+    """
+    Registra o módulo para ser carregado apenas no primeiro acesso a um atributo
+
+    pandas e NumPy levam mais de meio segundo para carregar; com a importação
+    tardia, caminhos que não os usam (ajuda da linha de comando, listagem da
+    pasta input, importação por ServicoSugestoesDestinos) partem em milissegundos.
+    """
+    if nome in sys.modules:
+        return sys.modules[nome]
+    especificacao = importlib.util.find_spec(nome)
+    carregador = importlib.util.LazyLoader(especificacao.loader)
+    especificacao.loader = carregador
+    modulo = importlib.util.module_from_spec(especificacao)
+    sys.modules[nome] = modulo
+    carregador.exec_module(modulo)
+    return modulo
+
+pd = _importacao_tardia('pandas')
+np = _importacao_tardia('numpy')
+
 # Lista de parâmetros para simulações de portaria
+# (uma simulação com "modo": "decaimento" usa "meia_vida_minutos" no lugar de
+# "intervalo_minutos" e compara a quantidade mínima com a pontuação decaída;
+# uma com "modo": "aproximado" conta a janela com memória fixa, usando também
+# "contadores" e "fatias")
 simulacoes = [
     {
         "descricao": "Simulação 1",
@@ -69,31 +105,351 @@ simulacoes = [
 
 ]
 
+# Grade de parâmetros avaliada no modo de otimização (--otimizar)
+grade_otimizacao = {
+    "intervalos_minutos": list(range(1, 181)),  # Intervalos (em minutos) avaliados
+    "quantidades_minimas": list(range(1, 31)),  # Quantidades mínimas de entradas avaliadas
+}
+
+# Pasta com resultados reaproveitados entre execuções
+cache_dir = "cache"
+
+# Formato de exibição de datas/horários nas planilhas (preserva os milissegundos do SIVIS)
+formato_data_hora_excel = 'yyyy-mm-dd hh:mm:ss.000'
+
+# Colunas lidas do CSV SIVIS (as demais são ignoradas) e colunas de texto
+# derivadas de tim_entrada, recriadas apenas na saída (formato -> coluna)
+colunas_entradas = ['ide_entrada', 'ide_portaria', 'des_portaria', 'tim_entrada', 'ide_destino', 'desdestinoGenerico']
+colunas_derivadas = {'data_entrada': '%d/%m/%Y', 'hora_minuto_entrada': '%H:%M'}
+
+# Formatos de saída disponíveis (--formato); as tabelas exportadas fora do Excel
+# são Dados_e_Simulacoes, Estatisticas_Gerais, Estatisticas_por_Portaria e Sequencias_Destinos
+formatos_saida = ['xlsx', 'parquet', 'csv', 'sqlite']
+
+# Índice histórico (simulações com "historico": "reserva" ou "mistura"): frequências
+# de destinos dos dias anteriores por portaria x dia da semana x faixa horária
+faixa_historico_minutos = 30
+
+# Cache das varreduras de cada simulação (intervalo ou meia-vida) entre execuções:
+# limites de espaço e de quantidade de varreduras, descartando as usadas há mais tempo
+limite_cache_varreduras_mb = 512
+limite_cache_varreduras_itens = 200
+
+# Entradas entre pontos de controle do CuboHistogramas (contagens acumuladas por destino)
+bloco_cubo = 256
+
+# Modo aproximado (--aproximado): contadores Space-Saving por fatia de tempo e
+# fatias por intervalo; memória por portaria de (fatias + 1) x contadores contadores
+contadores_aproximado = 16
+fatias_aproximado = 6
+
 # Variável global para armazenar os dados da planilha
 _dados_planilha = None
+_arquivo_dados_planilha = None
+
+class PerfilExecucao:
+    """
+    Instrumentação opcional das etapas do processamento (--perfil)
+
+    Cada etapa registra tempo de relógio, tempo de CPU (incluindo processos
+    filhos já encerrados), registros processados e pico de memória residente.
+    Etapas podem ser aninhadas (perfil_etapa) ou marcadas em sequência dentro
+    da etapa atual (marcar_etapa, que encerra a marcação anterior).
+    No Linux o pico é medido por etapa (VmHWM zerado a cada transição);
+    nos demais sistemas é o pico do processo até o fim da etapa.
+    """
+
+    def __init__(self, cprofile=False):
+        self.etapas = []
+        self.abertas = []  # pilha de etapas em andamento
+        self.cprofile = cprofile
+        self.funcoes_mais_custosas = []
+        self.inicio = time.perf_counter()
+        self.data_hora = datetime.now().isoformat(timespec='seconds')
+        self.pico_por_etapa = self._reiniciar_pico()
+
+    @staticmethod
+    def _cpu():
+        filhos = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return time.process_time() + filhos.ru_utime + filhos.ru_stime
+
+    @staticmethod
+    def _reiniciar_pico():
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            return True
+        except OSError:
+            return False
+
+    def _pico_atual_mb(self):
+        if self.pico_por_etapa:
+            with open('/proc/self/status') as f:
+                for linha in f:
+                    if linha.startswith('VmHWM:'):
+                        return int(linha.split()[1]) / 1024
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2**20 if sys.platform == 'darwin' else pico / 1024
+
+    def _atualizar_picos(self):
+        # O pico desde a última transição vale para todas as etapas abertas
+        pico = self._pico_atual_mb()
+        for etapa in self.abertas:
+            etapa['pico_rss_mb'] = max(etapa['pico_rss_mb'], pico)
+        if self.pico_por_etapa:
+            self._reiniciar_pico()
+
+    def iniciar(self, nome, registros=None):
+        self._atualizar_picos()
+        etapa = {
+            'etapa': nome,
+            'nivel': len(self.abertas),
+            'pai': self.abertas[-1]['etapa'] if self.abertas else None,
+            'inicio_s': time.perf_counter() - self.inicio,
+            'registros': registros,
+            'pico_rss_mb': 0.0,
+            '_relogio': time.perf_counter(),
+            '_cpu': self._cpu(),
+            '_marcacao': False,
+        }
+        self.etapas.append(etapa)
+        self.abertas.append(etapa)
+        return etapa
+
+    def encerrar(self):
+        # Encerra também a marcação sequencial em andamento dentro da etapa
+        if len(self.abertas) > 1 and self.abertas[-1]['_marcacao'] and not self.abertas[-2]['_marcacao']:
+            self._encerrar_topo()
+        self._encerrar_topo()
+
+    def _encerrar_topo(self):
+        self._atualizar_picos()
+        etapa = self.abertas.pop()
+        etapa['segundos'] = time.perf_counter() - etapa.pop('_relogio')
+        etapa['cpu_segundos'] = self._cpu() - etapa.pop('_cpu')
+        etapa.pop('_marcacao')
+        if etapa['registros'] and etapa['segundos'] > 0:
+            etapa['registros_por_segundo'] = etapa['registros'] / etapa['segundos']
+        if self.abertas:
+            self.abertas[-1]['pico_rss_mb'] = max(self.abertas[-1]['pico_rss_mb'], etapa['pico_rss_mb'])
+
+    def marcar(self, nome, registros=None):
+        if self.abertas and self.abertas[-1]['_marcacao']:
+            self._encerrar_topo()
+        self.iniciar(nome, registros)['_marcacao'] = True
+
+    def relatorio(self, **informacoes):
+        """Relatório da execução (dicionário serializável em JSON)"""
+        while self.abertas:
+            self._encerrar_topo()
+        etapas = []
+        for etapa in self.etapas:
+            etapa = {chave: (round(valor, 4) if isinstance(valor, float) else valor) for chave, valor in etapa.items()}
+            etapas.append(etapa)
+        return {
+            'data_hora': self.data_hora,
+            **informacoes,
+            'segundos_total': round(time.perf_counter() - self.inicio, 4),
+            'pico_rss_processo_mb': round(max([e['pico_rss_mb'] for e in self.etapas] + [self._pico_atual_mb()]), 2),
+            'pico_rss_por_etapa': self.pico_por_etapa,
+            'etapas': etapas,
+            'funcoes_mais_custosas': self.funcoes_mais_custosas,
+        }
+
+# Perfil da execução atual (None quando --perfil não foi pedido)
+_perfil = None
+
+def iniciar_perfil(cprofile=False):
+    """Ativa a instrumentação das etapas para a execução atual"""
+    global _perfil
+    _perfil = PerfilExecucao(cprofile=cprofile)
+    return _perfil
+
+def encerrar_perfil(nome_relatorio, **informacoes):
+    """Grava o relatório JSON do perfil ativo e desativa a instrumentação"""
+    global _perfil
+    if _perfil is None:
+        return None
+    relatorio = _perfil.relatorio(**informacoes)
+    _perfil = None
+    with open(nome_relatorio, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2, default=str)
+    print(f"⏱️ Relatório de desempenho: {nome_relatorio}")
+    for etapa in relatorio['etapas']:
+        print(f"   {'  ' * etapa['nivel']}{etapa['etapa']:<{40 - 2 * etapa['nivel']}} {etapa['segundos']:>9.3f}s "
+              f"(CPU {etapa['cpu_segundos']:>8.3f}s, pico {etapa['pico_rss_mb']:>8.1f} MB)")
+    return relatorio
+
+def descartar_perfil():
+    """Desativa a instrumentação sem gravar relatório"""
+    global _perfil
+    _perfil = None
+
+@contextmanager
+def perfil_etapa(nome, registros=None, cprofile=False):
+    """
+    Mede uma etapa quando o perfil está ativo (sem custo quando não está)
+
+    Com cprofile=True e o perfil criado com cprofile, guarda as funções mais
+    custosas da etapa e grava o .prof em cache_dir.
+    """
+    if _perfil is None:
+        yield
+        return
+    perfil = _perfil
+    perfil.iniciar(nome, registros)
+    perfilador = None
+    if cprofile and perfil.cprofile:
+        import cProfile
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+    try:
+        yield
+    finally:
+        if perfilador is not None:
+            perfilador.disable()
+            _registrar_funcoes_custosas(perfil, nome, perfilador)
+        perfil.encerrar()
+
+def marcar_etapa(nome, registros=None):
+    """Inicia uma etapa sequencial dentro da etapa atual, encerrando a anterior (se o perfil estiver ativo)"""
+    if _perfil is not None:
+        _perfil.marcar(nome, registros)
 
-def carregar_dados_planilha():
+def _registrar_funcoes_custosas(perfil, nome, perfilador, quantidade=25):
+    import pstats
+    os.makedirs(cache_dir, exist_ok=True)
+    arquivo_prof = os.path.join(cache_dir, f"perfil_{nome}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+    perfilador.dump_stats(arquivo_prof)
+    estatisticas = pstats.Stats(perfilador)
+    linhas = sorted(estatisticas.stats.items(), key=lambda item: item[1][2], reverse=True)[:quantidade]
+    perfil.funcoes_mais_custosas.append({
+        'etapa': nome,
+        'arquivo_prof': arquivo_prof,
+        'funcoes': [{
+            'funcao': f"{os.path.basename(arquivo)}:{linha}({funcao})",
+            'chamadas': chamadas_totais,
+            'tempo_proprio_s': round(tempo_proprio, 4),
+            'tempo_acumulado_s': round(tempo_acumulado, 4),
+        } for (arquivo, linha, funcao), (_, chamadas_totais, tempo_proprio, tempo_acumulado, _) in linhas],
+    })
+
+def carregar_dados_planilha(arquivo_csv=None):
     """
     Carrega os dados da planilha em uma variável global para otimizar o acesso
+    
+    Args:
+        arquivo_csv: Arquivo CSV a carregar (opcional, padrão é o primeiro
+            arquivo em ordem alfabética da pasta input)
     """
-    global _dados_planilha
+    global _dados_planilha, _arquivo_dados_planilha
+    if arquivo_csv is not None and arquivo_csv != _arquivo_dados_planilha:
+        _dados_planilha = None
     if _dados_planilha is None:
-        # Procura o arquivo CSV na pasta input
-        input_dir = "input"
-        arquivos_csv = [f for f in os.listdir(input_dir) if f.endswith('.csv')]
-        if arquivos_csv:
-            arquivo_csv = os.path.join(input_dir, arquivos_csv[0])
-            _dados_planilha = pd.read_csv(arquivo_csv)
-            # Converte tim_entrada para datetime para facilitar comparações
-            _dados_planilha['tim_entrada'] = pd.to_datetime(_dados_planilha['tim_entrada'])
-            # Remove registros sem ide_destino
-            _dados_planilha = _dados_planilha.dropna(subset=['ide_destino'])
-            _dados_planilha = _dados_planilha[_dados_planilha['ide_destino'].astype(str).str.strip() != '']
+        if arquivo_csv is None:
+            # Procura o arquivo CSV na pasta input
+            input_dir = "input"
+            arquivos_csv = sorted(f for f in os.listdir(input_dir) if f.endswith('.csv'))
+            if arquivos_csv:
+                arquivo_csv = os.path.join(input_dir, arquivos_csv[0])
+        if arquivo_csv:
+            _arquivo_dados_planilha = arquivo_csv
+            # Mesma leitura compacta da simulação (registros sem ide_destino já removidos),
+            # de volta à ordem do arquivo, que define o desempate em value_counts
+            _dados_planilha, _ = carregar_entradas(arquivo_csv)
+            _dados_planilha = _dados_planilha.sort_index()
     return _dados_planilha
 
+class IndiceSugestoes:
+    """
+    Índice para consultas pontuais de sugestão (ide_portaria, tim_entrada,
+    intervalo, quantidade mínima), montado uma única vez a partir de um
+    DataFrame ou de um arquivo
+
+    Para cada portaria guarda os horários (ns) em ordem, o código de cada
+    destino e a ordem da entrada no arquivo. Uma consulta localiza a janela
+    com duas buscas binárias (searchsorted) e conta apenas as entradas dentro
+    dela, em qualquer ordem de consulta. O resultado é o mesmo de
+    obterSugestaoDestino: no empate vence o destino que aparece primeiro no
+    arquivo entre as entradas da janela.
+
+    O índice não é alterado depois de montado e pode ser compartilhado entre
+    threads; dois índices podem servir conjuntos de dados diferentes.
+    """
+
+    def __init__(self, df, ordem=None):
+        """
+        Args:
+            df: DataFrame com as colunas ide_portaria, tim_entrada e ide_destino
+            ordem: Posição de cada linha no arquivo original, usada no desempate
+                (opcional, padrão é a posição da linha no df)
+        """
+        portarias, tempos, codigos, destinos_unicos, ordens = _colunas_entradas(df, ordem)
+        self.destinos = destinos_unicos
+        self.portarias = {}  # ide_portaria -> (tempos_ns, codigos, ordens) em ordem de horário
+        validos = codigos >= 0
+        portarias, tempos, codigos, ordens = (portarias[validos], tempos[validos], codigos[validos],
+                                              np.asarray(ordens, dtype=np.int64)[validos])
+        posicoes = np.lexsort((ordens, tempos, portarias))
+        cortes = np.flatnonzero(np.diff(portarias[posicoes])) + 1
+        for grupo in np.split(posicoes, cortes):
+            if len(grupo):
+                self.portarias[portarias[grupo[0]]] = (tempos[grupo], codigos[grupo], ordens[grupo])
+
+    @classmethod
+    def de_arquivo(cls, arquivo_csv, usar_cache=True):
+        """Monta o índice a partir de um CSV SIVIS (leitura de carregar_entradas)"""
+        df, _ = carregar_entradas(arquivo_csv, usar_cache=usar_cache)
+        return cls(df, ordem=df.index)
+
+    def __len__(self):
+        return sum(len(tempos) for tempos, _, _ in self.portarias.values())
+
+    def topo(self, ide_portaria, tim_entrada, intervalo_minutos):
+        """
+        Destino mais frequente e sua contagem na janela de intervalo_minutos
+        antes de tim_entrada: (destino, contagem) ou (None, 0)
+        """
+        entradas = self.portarias.get(ide_portaria)
+        if entradas is None:
+            return None, 0
+        tempos, codigos, ordens = entradas
+        horario_ns = pd.Timestamp(tim_entrada).value
+        inicio = np.searchsorted(tempos, horario_ns - int(intervalo_minutos * 60 * 10**9), side='left')
+        fim = np.searchsorted(tempos, horario_ns, side='left')
+        if fim <= inicio:
+            return None, 0
+        janela = codigos[inicio:fim]
+        destinos, primeiras, contagens = np.unique(janela, return_index=True, return_counts=True)
+        maior = contagens.max()
+        empatados = np.flatnonzero(contagens == maior)
+        if len(empatados) > 1:
+            # Desempate: destino cuja primeira entrada na janela vem antes no arquivo
+            ordens_janela = ordens[inicio:fim]
+            vencedor = min(empatados, key=lambda k: ordens_janela[janela == destinos[k]].min())
+        else:
+            vencedor = empatados[0]
+        return self.destinos[destinos[vencedor]], int(maior)
+
+    def sugerir(self, ide_portaria, tim_entrada, intervalo_minutos, quantidade_minima_entradas):
+        """Destino sugerido ou None se a janela não atingir a quantidade mínima"""
+        destino, contagem = self.topo(ide_portaria, tim_entrada, intervalo_minutos)
+        if destino is None or contagem < quantidade_minima_entradas:
+            return None
+        return destino
+
+# Nome em inglês mantido para integrações externas
+SuggestionIndex = IndiceSugestoes
+
+_indice_planilha = None  # (dados da planilha, IndiceSugestoes) usado por obterSugestaoDestino
+
 def obterSugestaoDestino(ide_portaria, tim_entrada, intervalo_minutos, quantidade_minima_entradas, ide_destino=None):
     """
     Calcula o destino sugerido com base nos parâmetros da simulação
+
+    Mantida por compatibilidade: consulta um IndiceSugestoes montado uma vez
+    sobre os dados de carregar_dados_planilha. Para outros conjuntos de
+    dados, ou consultas de várias threads, use IndiceSugestoes diretamente.
     
     Args:
         ide_portaria: ID da portaria
@@ -105,54 +461,1109 @@ def obterSugestaoDestino(ide_portaria, tim_entrada, intervalo_minutos, quantidad
     Returns:
         int ou None: ID do destino sugerido ou None se não encontrar sugestão válida
     """
+    global _indice_planilha
     # Verifica se ide_destino tem valor válido
     if pd.isna(ide_destino) or ide_destino == '' or ide_destino is None:
         return None
     
-    # Carrega os dados da planilha
+    # Carrega os dados da planilha (e monta o índice quando eles mudam)
     dados = carregar_dados_planilha()
     if dados is None or dados.empty:
         return None
+    if _indice_planilha is None or _indice_planilha[0] is not dados:
+        _indice_planilha = (dados, IndiceSugestoes(dados))
     
-    # Converte tim_entrada para datetime se for string
-    if isinstance(tim_entrada, str):
-        tim_entrada_dt = pd.to_datetime(tim_entrada)
+    return _indice_planilha[1].sugerir(ide_portaria, tim_entrada, intervalo_minutos, quantidade_minima_entradas)
+
+class CuboHistogramas:
+    """
+    Contagens acumuladas por destino para responder qualquer janela sem
+    percorrer as entradas (consultas "e se" e avaliação de configurações)
+
+    As entradas com destino válido ficam em ordem de portaria, horário e ordem
+    do arquivo. A cada bloco_cubo entradas é guardada uma linha com a contagem
+    acumulada de cada destino (pontos de controle), de modo que a contagem de
+    todos os destinos até uma posição é o ponto de controle anterior mais no
+    máximo bloco_cubo entradas. O histograma de uma janela é a diferença das
+    contagens acumuladas nas duas posições que a delimitam, encontradas por
+    busca binária. Listas de posições por destino dão a contagem de um único
+    destino em O(log n) e a menor ordem do destino na janela, usada no
+    desempate (o mesmo de obterSugestaoDestino e das varreduras).
+
+    O cubo é montado uma vez por conjunto de dados; de_arquivo o grava junto
+    ao cache das entradas (cache_dir/entradas_*/cubo_<bloco>.npz).
+    """
+
+    versao = 1
+
+    def __init__(self, df, ordem=None, bloco=None, arquivo_cache=None):
+        """
+        Args:
+            df: DataFrame com as colunas ide_portaria, tim_entrada e ide_destino
+            ordem: Posição de cada linha no arquivo original, usada no desempate
+                (opcional, padrão é a posição da linha no df)
+            bloco: entradas entre pontos de controle (padrão: bloco_cubo)
+            arquivo_cache: .npz de onde o cubo é lido, se corresponder aos
+                mesmos dados, ou onde é gravado depois de montado (opcional)
+        """
+        self.bloco = int(bloco or bloco_cubo)
+        portarias, self.tempos, self.codigos, self.destinos, ordens = _colunas_entradas(df, ordem)
+        self.ordens = np.asarray(ordens, dtype=np.int64)
+        self.ide_portarias, indice_portaria = np.unique(portarias, return_inverse=True)
+        self.indice_portaria = indice_portaria.astype(np.int64)
+        impressao = CacheVarreduras.impressao_digital(portarias, self.tempos, self.codigos, self.destinos, self.ordens)
+        if arquivo_cache is None or not self._ler(arquivo_cache, impressao):
+            self._montar()
+            if arquivo_cache is not None:
+                self._gravar(arquivo_cache, impressao)
+        self.quantidade_destinos = self.pontos_controle.shape[1]
+        self._codigos_sequencia = self.codigos[self.sequencia]
+        self._indice_destinos = pd.Index(self.destinos)
+        self._ordens_sequencia = np.append(self.ordens[self.sequencia][self.posicoes_destino], 0)
+        self._chaves_destino = (self._codigos_sequencia[self.posicoes_destino] * (len(self.sequencia) + 1)
+                                + self.posicoes_destino)
+
+    @classmethod
+    def de_arquivo(cls, arquivo_csv, usar_cache=True, bloco=None):
+        """Monta (ou lê do cache das entradas) o cubo de um CSV SIVIS"""
+        df, _ = carregar_entradas(arquivo_csv, usar_cache=usar_cache)
+        arquivo_cache = None
+        if usar_cache:
+            arquivo_cache = os.path.join(_pasta_cache_entradas(_chave_arquivo(arquivo_csv)),
+                                         f"cubo_{int(bloco or bloco_cubo)}.npz")
+        return cls(df, ordem=df.index, bloco=bloco, arquivo_cache=arquivo_cache)
+
+    def _montar(self):
+        validos = np.flatnonzero(self.codigos >= 0)
+        self.sequencia = validos[np.lexsort((self.ordens[validos], self.tempos[validos],
+                                             self.indice_portaria[validos]))]
+        self.horarios = np.unique(self.tempos[validos])
+        self.chaves = (self.indice_portaria[self.sequencia] * (len(self.horarios) + 1)
+                       + np.searchsorted(self.horarios, self.tempos[self.sequencia]))
+        codigos = self.codigos[self.sequencia]
+        quantidade_destinos = len(self.destinos)
+        blocos = np.arange(len(codigos)) // self.bloco
+        quantidade_blocos = len(codigos) // self.bloco + 1
+        contagens = np.bincount(blocos * quantidade_destinos + codigos,
+                                minlength=quantidade_blocos * quantidade_destinos)
+        self.pontos_controle = np.zeros((quantidade_blocos, quantidade_destinos), dtype=np.int32)
+        np.cumsum(contagens.reshape(quantidade_blocos, quantidade_destinos)[:-1], axis=0,
+                  out=self.pontos_controle[1:])
+        self.posicoes_destino = np.argsort(codigos, kind='stable')
+
+    def _ler(self, arquivo_cache, impressao):
+        try:
+            with np.load(arquivo_cache) as dados:
+                if int(dados['versao']) != self.versao or str(dados['impressao']) != impressao \
+                        or int(dados['bloco']) != self.bloco:
+                    return False
+                for nome in ('sequencia', 'horarios', 'chaves', 'pontos_controle', 'posicoes_destino'):
+                    setattr(self, nome, dados[nome])
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def _gravar(self, arquivo_cache, impressao):
+        os.makedirs(os.path.dirname(arquivo_cache) or '.', exist_ok=True)
+        temporario = arquivo_cache + f".tmp{os.getpid()}.npz"
+        np.savez(temporario, versao=self.versao, impressao=impressao, bloco=self.bloco,
+                 sequencia=self.sequencia, horarios=self.horarios, chaves=self.chaves,
+                 pontos_controle=self.pontos_controle, posicoes_destino=self.posicoes_destino)
+        os.replace(temporario, arquivo_cache)
+
+    def __len__(self):
+        return len(self.sequencia)
+
+    def _limites(self, indice_portaria, tempos, intervalo_minutos):
+        """Posições (na sequência) que delimitam as janelas [t - intervalo, t) de cada consulta"""
+        base = indice_portaria * (len(self.horarios) + 1)
+        fim = np.searchsorted(self.chaves, base + np.searchsorted(self.horarios, tempos, side='left'))
+        inicio = np.searchsorted(self.chaves, base + np.searchsorted(
+            self.horarios, tempos - int(intervalo_minutos * 60 * 10**9), side='left'))
+        return inicio, fim
+
+    def _acumulados(self, posicoes):
+        """Contagem acumulada de cada destino antes de cada posição: matriz consultas x destinos"""
+        blocos = posicoes // self.bloco
+        restantes = posicoes - blocos * self.bloco
+        # Entradas entre o ponto de controle e a posição: (consulta, destino) -> célula da matriz
+        primeiras = np.cumsum(restantes) - restantes
+        fontes = np.arange(int(restantes.sum())) + np.repeat(blocos * self.bloco - primeiras, restantes)
+        celulas = (np.repeat(np.arange(len(posicoes)) * self.quantidade_destinos, restantes)
+                   + self._codigos_sequencia[fontes])
+        parciais = np.bincount(celulas, minlength=len(posicoes) * self.quantidade_destinos)
+        return self.pontos_controle[blocos] + parciais.reshape(len(posicoes), self.quantidade_destinos)
+
+    def _ranking(self, inicio, fim, quantidade):
+        """
+        Os `quantidade` destinos mais frequentes de cada janela [inicio, fim),
+        com o desempate pela menor ordem do destino na janela
+
+        Returns:
+            tuple: (topos, contagens), matrizes consultas x quantidade (-1/0 sem destino)
+        """
+        topos = np.full((len(inicio), quantidade), -1, dtype=np.int64)
+        contagens = np.zeros((len(inicio), quantidade), dtype=np.int64)
+        if len(inicio) == 0:
+            return topos, contagens
+        histogramas = self._acumulados(fim) - self._acumulados(inicio)
+        if quantidade == 1:
+            limiar = np.maximum(histogramas.max(axis=1), 1)
+        else:
+            corte = max(0, self.quantidade_destinos - quantidade)
+            limiar = np.maximum(np.partition(histogramas, corte, axis=1)[:, corte], 1)
+        linhas, destinos = np.nonzero(histogramas >= limiar[:, None])
+        quantidades = histogramas[linhas, destinos]
+        # Menor ordem de cada destino candidato na janela, pelas listas de posições
+        chave = destinos * (len(self.sequencia) + 1)
+        primeiros = np.searchsorted(self._chaves_destino, chave + inicio[linhas])
+        ultimos = np.searchsorted(self._chaves_destino, chave + fim[linhas])
+        menores = np.minimum.reduceat(self._ordens_sequencia,
+                                      np.column_stack((primeiros, ultimos)).ravel())[::2]
+        ordem = np.lexsort((menores, -quantidades, linhas))
+        linhas, destinos, quantidades = linhas[ordem], destinos[ordem], quantidades[ordem]
+        inicios_linha = np.flatnonzero(np.r_[True, linhas[1:] != linhas[:-1]])
+        posicao = np.arange(len(linhas)) - np.repeat(inicios_linha, np.diff(np.r_[inicios_linha, len(linhas)]))
+        manter = posicao < quantidade
+        topos[linhas[manter], posicao[manter]] = destinos[manter]
+        contagens[linhas[manter], posicao[manter]] = quantidades[manter]
+        return topos, contagens
+
+    def varrer(self, intervalos, top_k=1):
+        """
+        Destino mais frequente e contagem da janela de cada linha do df para
+        cada intervalo, no mesmo formato de _varrer_janelas (códigos em
+        self.destinos), calculados só com os pontos de controle
+        """
+        total = len(self.codigos)
+        quantidade = max(1, int(top_k))
+        topos = np.full((len(intervalos), total, quantidade), -1, dtype=np.int64)
+        contagens = np.zeros((len(intervalos), total, quantidade), dtype=np.int64)
+        consultas_por_parte = max(1, 2**21 // max(1, self.quantidade_destinos))
+        for w, intervalo in enumerate(intervalos):
+            inicio, fim = self._limites(self.indice_portaria, self.tempos, intervalo)
+            linhas = np.flatnonzero((fim > inicio) & (self.codigos >= 0))
+            for parte in range(0, len(linhas), consultas_por_parte):
+                selecionadas = linhas[parte:parte + consultas_por_parte]
+                topos[w, selecionadas], contagens[w, selecionadas] = self._ranking(
+                    inicio[selecionadas], fim[selecionadas], quantidade)
+        if top_k <= 1:
+            return topos[:, :, 0], contagens[:, :, 0]
+        return topos, contagens
+
+    def _consulta(self, ide_portaria, tim_entrada, intervalo_minutos):
+        posicao = np.searchsorted(self.ide_portarias, ide_portaria)
+        if posicao >= len(self.ide_portarias) or self.ide_portarias[posicao] != ide_portaria:
+            return None
+        inicio, fim = self._limites(np.array([posicao]), np.array([pd.Timestamp(tim_entrada).value]),
+                                    intervalo_minutos)
+        return inicio, fim
+
+    def histograma(self, ide_portaria, tim_entrada, intervalo_minutos):
+        """
+        Contagem de cada destino na janela de intervalo_minutos antes de
+        tim_entrada, na ordem do value_counts (maior contagem e, no empate,
+        o destino que aparece primeiro no arquivo)
+        """
+        limites = self._consulta(ide_portaria, tim_entrada, intervalo_minutos)
+        if limites is None or limites[1][0] <= limites[0][0]:
+            return pd.Series(dtype=np.int64, name='count')
+        topos, contagens = self._ranking(*limites, self.quantidade_destinos)
+        presentes = topos[0] >= 0
+        return pd.Series(contagens[0][presentes], index=pd.Index(self.destinos[topos[0][presentes]],
+                                                                  name='ide_destino'), name='count')
+
+    def contagem(self, ide_portaria, ide_destino, tim_entrada, intervalo_minutos):
+        """Entradas de um destino na janela de intervalo_minutos antes de tim_entrada"""
+        limites = self._consulta(ide_portaria, tim_entrada, intervalo_minutos)
+        codigo = self._indice_destinos.get_indexer([ide_destino])[0]
+        if limites is None or codigo < 0:
+            return 0
+        chave = codigo * (len(self.sequencia) + 1)
+        inicio, fim = limites
+        return int(np.searchsorted(self._chaves_destino, chave + fim[0])
+                   - np.searchsorted(self._chaves_destino, chave + inicio[0]))
+
+    def topo(self, ide_portaria, tim_entrada, intervalo_minutos):
+        """Destino mais frequente e sua contagem na janela: (destino, contagem) ou (None, 0)"""
+        limites = self._consulta(ide_portaria, tim_entrada, intervalo_minutos)
+        if limites is None or limites[1][0] <= limites[0][0]:
+            return None, 0
+        topos, contagens = self._ranking(*limites, 1)
+        return self.destinos[topos[0, 0]], int(contagens[0, 0])
+
+    def sugerir(self, ide_portaria, tim_entrada, intervalo_minutos, quantidade_minima_entradas):
+        """Destino sugerido ou None se a janela não atingir a quantidade mínima"""
+        destino, contagem = self.topo(ide_portaria, tim_entrada, intervalo_minutos)
+        if destino is None or contagem < quantidade_minima_entradas:
+            return None
+        return destino
+
+    def avaliar(self, configuracoes=None):
+        """
+        Métricas de acerto de configurações do modo janela sobre os dados do
+        cubo ("e se"), com uma varredura por intervalo distinto
+
+        Args:
+            configuracoes: dicionários com intervalo_minutos e
+                quantidade_minima_entradas (padrão: as de simulacoes no modo janela)
+
+        Returns:
+            DataFrame: Intervalo_Minutos, Qtd_Min_Entradas, Total_Registros,
+            Total_Sugestoes, Total_Acertos, Precisao_Pct, Cobertura_Pct e Eficiencia_F1
+        """
+        if configuracoes is None:
+            configuracoes = [sim for sim in simulacoes if modo_simulacao(sim) == 'janela']
+        intervalos = sorted({c['intervalo_minutos'] for c in configuracoes})
+        topos, contagens = self.varrer(intervalos)
+        validos = self.codigos >= 0
+        linhas = []
+        for configuracao in configuracoes:
+            w = intervalos.index(configuracao['intervalo_minutos'])
+            sugeridos = validos & (topos[w] >= 0) & (contagens[w] >= configuracao['quantidade_minima_entradas'])
+            linhas.append({
+                'Intervalo_Minutos': configuracao['intervalo_minutos'],
+                'Qtd_Min_Entradas': configuracao['quantidade_minima_entradas'],
+                'Total_Registros': int(validos.sum()),
+                'Total_Sugestoes': int(sugeridos.sum()),
+                'Total_Acertos': int((sugeridos & (topos[w] == self.codigos)).sum()),
+            })
+        df_metricas = pd.DataFrame(linhas)
+        precisao, cobertura, eficiencia = calcular_metricas(
+            df_metricas['Total_Registros'], df_metricas['Total_Sugestoes'], df_metricas['Total_Acertos'])
+        df_metricas['Precisao_Pct'] = np.round(precisao, 1)
+        df_metricas['Cobertura_Pct'] = np.round(cobertura, 1)
+        df_metricas['Eficiencia_F1'] = np.round(eficiencia, 1)
+        return df_metricas
+
+def parse_simulacoes_decaimento(texto, primeira=None):
+    """
+    Converte 'meia_vida:pontuacao_minima,...' em simulações no modo decaimento
+
+    Args:
+        primeira: número da primeira simulação gerada (padrão: após as de simulacoes)
+    """
+    primeira = len(simulacoes) + 1 if primeira is None else primeira
+    configuracoes = []
+    for i, item in enumerate(texto.split(','), primeira):
+        meia_vida, pontuacao = item.split(':')
+        configuracoes.append({
+            'descricao': f'Simulação {i}',
+            'modo': 'decaimento',
+            'meia_vida_minutos': float(meia_vida) if '.' in meia_vida else int(meia_vida),
+            'quantidade_minima_entradas': float(pontuacao) if '.' in pontuacao else int(pontuacao),
+        })
+    return configuracoes
+
+def parse_simulacoes_aproximadas(texto, contadores=None, fatias=None, primeira=None):
+    """
+    Converte 'intervalo:quantidade_minima,...' em simulações no modo aproximado
+
+    Args:
+        contadores, fatias: memória das simulações (padrão: contadores_aproximado e fatias_aproximado)
+        primeira: número da primeira simulação gerada (padrão: após as de simulacoes)
+    """
+    primeira = len(simulacoes) + 1 if primeira is None else primeira
+    configuracoes = []
+    for i, item in enumerate(texto.split(','), primeira):
+        intervalo, quantidade = item.split(':')
+        configuracoes.append({
+            'descricao': f'Simulação {i}',
+            'modo': 'aproximado',
+            'intervalo_minutos': int(intervalo),
+            'quantidade_minima_entradas': int(quantidade),
+            'contadores': contadores or contadores_aproximado,
+            'fatias': fatias or fatias_aproximado,
+        })
+    return configuracoes
+
+def _colunas_entradas(df, ordem=None):
+    """
+    Converte o DataFrame nas colunas compactas usadas pelo motor de simulação
+
+    Returns:
+        tuple: (portarias, tempos_ns, codigos_destino, destinos_unicos, ordens),
+        onde codigos_destino é -1 nas linhas sem ide_destino válido
+    """
+    portarias = df['ide_portaria'].to_numpy()
+    tempos = pd.to_datetime(df['tim_entrada']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    validos = pd.notna(df['ide_destino']).to_numpy()
+    if not pd.api.types.is_numeric_dtype(df['ide_destino']):
+        validos &= (df['ide_destino'].astype(str).str.strip() != '').to_numpy()
+    codigos, destinos_unicos = pd.factorize(df['ide_destino'])
+    codigos = np.where(validos, codigos, -1).astype(np.int64)
+    ordens = np.arange(len(df)) if ordem is None else np.asarray(ordem)
+    return portarias, tempos, codigos, np.asarray(destinos_unicos), ordens
+
+def _agrupar_entradas_por_portaria(portarias, tempos, codigos, ordens):
+    """
+    Ordena uma única vez as linhas com destino válido por portaria, horário e
+    ordem do arquivo e devolve, para cada portaria, as listas
+    (posicoes, tempos_ns, codigos_destino, ordens)
+    """
+    posicoes = np.flatnonzero(codigos >= 0)
+    posicoes = posicoes[np.lexsort((ordens[posicoes], tempos[posicoes], portarias[posicoes]))]
+
+    # Limites de cada portaria dentro das posições ordenadas
+    cortes = np.flatnonzero(np.diff(portarias[posicoes])) + 1
+    grupos = []
+    for grupo in np.split(posicoes, cortes):
+        if len(grupo) == 0:
+            continue
+        grupos.append((grupo.tolist(), tempos[grupo].tolist(), codigos[grupo].tolist(), ordens[grupo].tolist()))
+    return grupos
+
+def _varrer_janelas(portarias, tempos, codigos, ordens, intervalos, top_k=1):
+    """
+    Percorre cada portaria uma única vez calculando, para cada intervalo, o
+    destino mais frequente da janela e sua contagem em todas as linhas
+
+    As janelas aninhadas (a de 90 minutos contém a de 5) compartilham o mesmo
+    buffer ordenado de entradas: cada uma guarda apenas seu ponteiro de início
+    e suas contagens.
+
+    Args:
+        top_k: com valor maior que 1, guarda os top_k destinos mais frequentes
+            de cada janela (JanelaDestinos.mais_frequentes) em vez de apenas o topo
+
+    Returns:
+        tuple: (topos, contagens), matrizes len(intervalos) x N com o código do
+        destino mais frequente (-1 se a janela estiver vazia) e sua contagem;
+        com top_k > 1 as matrizes ganham uma terceira dimensão (posição no ranking)
+    """
+    total = len(codigos)
+    forma = (len(intervalos), total) if top_k <= 1 else (len(intervalos), total, top_k)
+    topos = np.full(forma, -1, dtype=np.int64)
+    contagens = np.zeros(forma, dtype=np.int64)
+    limites_ns = [int(intervalo * 60 * 10**9) for intervalo in intervalos]
+
+    for grupo, t, d, o in _agrupar_entradas_por_portaria(portarias, tempos, codigos, ordens):
+        janelas = [JanelaDestinos() for _ in intervalos]
+        inicios = [0] * len(intervalos)
+        proxima = 0
+        for i, posicao in enumerate(grupo):
+            # Inclui em todas as janelas as entradas estritamente anteriores ao horário atual
+            while proxima < i and t[proxima] < t[i]:
+                for janela in janelas:
+                    janela.incluir(d[proxima], o[proxima])
+                proxima += 1
+            # Cada janela avança seu próprio início sobre o buffer compartilhado
+            for w, janela in enumerate(janelas):
+                limite = t[i] - limites_ns[w]
+                inicio = inicios[w]
+                while inicio < proxima and t[inicio] < limite:
+                    janela.retirar(d[inicio], o[inicio])
+                    inicio += 1
+                inicios[w] = inicio
+                if top_k > 1:
+                    for k, (destino, contagem) in enumerate(janela.mais_frequentes(top_k)):
+                        topos[w, posicao, k] = destino
+                        contagens[w, posicao, k] = contagem
+                    continue
+                destino, contagem = janela.topo()
+                if destino is not None:
+                    topos[w, posicao] = destino
+                    contagens[w, posicao] = contagem
+
+    return topos, contagens
+
+def _varrer_decaimento(portarias, tempos, codigos, ordens, meias_vidas, top_k=1):
+    """
+    Percorre cada portaria uma única vez calculando, para cada meia-vida, o
+    destino de maior pontuação com decaimento (PontuacaoDecaimento) em todas
+    as linhas, considerando as entradas estritamente anteriores ao horário
+
+    Mesmo formato de retorno de _varrer_janelas, com as pontuações (float)
+    no lugar das contagens.
+    """
+    total = len(codigos)
+    forma = (len(meias_vidas), total) if top_k <= 1 else (len(meias_vidas), total, top_k)
+    topos = np.full(forma, -1, dtype=np.int64)
+    pontuacoes = np.zeros(forma, dtype=np.float64)
+
+    for grupo, t, d, _ in _agrupar_entradas_por_portaria(portarias, tempos, codigos, ordens):
+        decaimentos = [PontuacaoDecaimento(meia_vida) for meia_vida in meias_vidas]
+        proxima = 0
+        for i, posicao in enumerate(grupo):
+            while proxima < i and t[proxima] < t[i]:
+                for decaimento in decaimentos:
+                    decaimento.incluir(d[proxima], t[proxima])
+                proxima += 1
+            for w, decaimento in enumerate(decaimentos):
+                if top_k > 1:
+                    for k, (destino, pontuacao) in enumerate(decaimento.mais_frequentes(top_k, t[i])):
+                        topos[w, posicao, k] = destino
+                        pontuacoes[w, posicao, k] = pontuacao
+                    continue
+                destino, pontuacao = decaimento.topo(t[i])
+                if destino is not None:
+                    topos[w, posicao] = destino
+                    pontuacoes[w, posicao] = pontuacao
+
+    return topos, pontuacoes
+
+def _varrer_aproximado(portarias, tempos, codigos, ordens, parametros, top_k=1):
+    """
+    Percorre cada portaria uma única vez calculando, para cada
+    (intervalo, contadores, fatias), o destino mais frequente estimado pela
+    JanelaAproximada em todas as linhas
+
+    Mesmo formato de retorno de _varrer_janelas, com as contagens estimadas.
+    """
+    total = len(codigos)
+    forma = (len(parametros), total) if top_k <= 1 else (len(parametros), total, top_k)
+    topos = np.full(forma, -1, dtype=np.int64)
+    contagens = np.zeros(forma, dtype=np.int64)
+    limites_ns = [int(intervalo * 60 * 10**9) for intervalo, _, _ in parametros]
+
+    for grupo, t, d, o in _agrupar_entradas_por_portaria(portarias, tempos, codigos, ordens):
+        janelas = [JanelaAproximada(*parametro) for parametro in parametros]
+        proxima = 0
+        for i, posicao in enumerate(grupo):
+            while proxima < i and t[proxima] < t[i]:
+                for janela in janelas:
+                    janela.adicionar(t[proxima], d[proxima], o[proxima])
+                proxima += 1
+            for w, janela in enumerate(janelas):
+                janela.expirar(t[i] - limites_ns[w])
+                if top_k > 1:
+                    for k, (destino, contagem) in enumerate(janela.mais_frequentes(top_k)):
+                        topos[w, posicao, k] = destino
+                        contagens[w, posicao, k] = contagem
+                    continue
+                destino, contagem = janela.topo()
+                if destino is not None:
+                    topos[w, posicao] = destino
+                    contagens[w, posicao] = contagem
+
+    return topos, contagens
+
+def contar_destino_na_janela(portarias, tempos, codigos, consultas, intervalo_minutos, inicios_ns=None):
+    """
+    Quantidade de entradas de um destino específico na janela de cada linha
+
+    Conta, para cada linha, as entradas da mesma portaria com o destino
+    consultas[i] (código; -1 = nenhum) e horário em [t - intervalo, t). Cada
+    entrada vira uma chave inteira (portaria, destino, posição do horário) e a
+    consulta é feita com duas buscas binárias vetorizadas.
+
+    Args:
+        inicios_ns: horário inicial da janela de cada linha, no lugar de
+            t - intervalo (opcional)
+    """
+    resultado = np.zeros(len(codigos), dtype=np.int64)
+    validos = codigos >= 0
+    consultadas = consultas >= 0
+    if not validos.any() or not consultadas.any():
+        return resultado
+    _, indice_portaria = np.unique(portarias, return_inverse=True)
+    indice_portaria = indice_portaria.astype(np.int64)
+    quantidade_destinos = int(max(codigos.max(), consultas.max())) + 1
+    horarios = np.unique(tempos[validos])
+    largura = len(horarios) + 1
+    grupos = indice_portaria * quantidade_destinos + np.where(validos, codigos, 0)
+    chaves = np.sort(grupos[validos] * largura + np.searchsorted(horarios, tempos[validos]))
+
+    grupos_consulta = (indice_portaria[consultadas] * quantidade_destinos + consultas[consultadas]) * largura
+    t = tempos[consultadas]
+    fim = np.searchsorted(horarios, t, side='left')
+    if inicios_ns is None:
+        inicio = np.searchsorted(horarios, t - int(intervalo_minutos * 60 * 10**9), side='left')
     else:
-        tim_entrada_dt = pd.to_datetime(tim_entrada)
-    
-    # Filtra registros da mesma portaria
-    dados_portaria = dados[dados['ide_portaria'] == ide_portaria].copy()
-    
-    # Filtra registros com tim_entrada anterior ao parâmetro
-    dados_anteriores = dados_portaria[dados_portaria['tim_entrada'] < tim_entrada_dt].copy()
-    
-    if dados_anteriores.empty:
-        return None
-    
-    # Calcula a diferença em minutos entre tim_entrada dos registros e o parâmetro
-    dados_anteriores['diferenca_minutos'] = (tim_entrada_dt - dados_anteriores['tim_entrada']).dt.total_seconds() / 60
-    
-    # Filtra registros que estão dentro do intervalo_minutos
-    dados_no_intervalo = dados_anteriores[dados_anteriores['diferenca_minutos'] <= intervalo_minutos]
-    
-    if dados_no_intervalo.empty:
-        return None
-    
-    # Conta a frequência de cada ide_destino
-    frequencia_destinos = dados_no_intervalo['ide_destino'].value_counts()
-    
-    if frequencia_destinos.empty:
+        inicio = np.searchsorted(horarios, np.asarray(inicios_ns)[consultadas], side='left')
+    resultado[consultadas] = (np.searchsorted(chaves, grupos_consulta + fim, side='left')
+                              - np.searchsorted(chaves, grupos_consulta + inicio, side='left'))
+    return resultado
+
+def _particionar_portarias(indice_portaria, quantidade_partes):
+    """
+    Distribui as portarias em até quantidade_partes grupos com quantidade de
+    linhas equilibrada (maiores primeiro) e devolve as linhas de cada grupo
+    """
+    tamanhos = np.bincount(indice_portaria)
+    partes = [[] for _ in range(max(1, quantidade_partes))]
+    cargas = [0] * len(partes)
+    for portaria in np.argsort(-tamanhos, kind='stable'):
+        k = cargas.index(min(cargas))
+        partes[k].append(portaria)
+        cargas[k] += tamanhos[portaria]
+    return [np.flatnonzero(np.isin(indice_portaria, parte)) for parte in partes if parte]
+
+def _varrer_janelas_paralelo(portarias, tempos, codigos, ordens, intervalos, workers=1, dividir_intervalos=False,
+                             top_k=1, varredura=_varrer_janelas):
+    """
+    Executa _varrer_janelas (ou outra varredura com a mesma assinatura, como
+    _varrer_decaimento) em um pool de processos
+
+    As linhas são particionadas por portaria (cada portaria é independente) e,
+    opcionalmente, os intervalos também são divididos entre os processos. Cada
+    processo recebe apenas arrays compactos e os resultados são remontados nas
+    posições originais, de modo que a saída é idêntica à execução sequencial.
+    """
+    if workers <= 1 or len(codigos) == 0:
+        return varredura(portarias, tempos, codigos, ordens, intervalos, top_k)
+
+    _, indice_portaria = np.unique(portarias, return_inverse=True)
+    indice_portaria = indice_portaria.astype(np.int64)
+    partes = _particionar_portarias(indice_portaria, workers)
+    quantidade_blocos = 1
+    if dividir_intervalos:
+        quantidade_blocos = max(1, min(len(intervalos), workers // len(partes)))
+    blocos = [list(range(len(intervalos)))[k::quantidade_blocos] for k in range(quantidade_blocos)]
+
+    tarefas = [(linhas, bloco) for linhas in partes for bloco in blocos]
+    forma = (len(intervalos), len(codigos)) if top_k <= 1 else (len(intervalos), len(codigos), top_k)
+    topos = np.full(forma, -1, dtype=np.int64)
+    contagens = None
+    ordens = np.asarray(ordens)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parciais = executor.map(
+            varredura,
+            [indice_portaria[linhas] for linhas, _ in tarefas],
+            [tempos[linhas] for linhas, _ in tarefas],
+            [codigos[linhas] for linhas, _ in tarefas],
+            [ordens[linhas] for linhas, _ in tarefas],
+            [[intervalos[w] for w in bloco] for _, bloco in tarefas],
+            [top_k] * len(tarefas),
+        )
+        for (linhas, bloco), (topos_parte, contagens_parte) in zip(tarefas, parciais):
+            if contagens is None:
+                contagens = np.zeros(forma, dtype=contagens_parte.dtype)
+            topos[np.ix_(bloco, linhas)] = topos_parte
+            contagens[np.ix_(bloco, linhas)] = contagens_parte
+    return topos, contagens
+
+def _chave_varredura(configuracao):
+    """
+    Parâmetro que define a varredura de uma configuração: (modo, intervalo,
+    meia-vida ou (intervalo, contadores, fatias) no modo aproximado)
+    """
+    modo = modo_simulacao(configuracao)
+    if modo == 'decaimento':
+        return 'decaimento', configuracao['meia_vida_minutos']
+    if modo == 'aproximado':
+        return 'aproximado', (configuracao['intervalo_minutos'],
+                              configuracao.get('contadores', contadores_aproximado),
+                              configuracao.get('fatias', fatias_aproximado))
+    return 'janela', configuracao['intervalo_minutos']
+
+class CacheVarreduras:
+    """
+    Varreduras (topos e contagens de cada linha) gravadas em cache_dir/varreduras
+
+    Cada varredura é identificada pela impressão digital dos dados (portarias,
+    horários, destinos e ordem do arquivo), pela _chave_varredura e pelo top_k.
+    Como a quantidade mínima e o histórico são aplicados depois da varredura,
+    ao ajustar uma simulação só os intervalos/meias-vidas novos são varridos.
+    Acima de limite_cache_varreduras_mb ou limite_cache_varreduras_itens são
+    descartadas as varreduras usadas há mais tempo (LRU).
+    """
+
+    versao = 1
+
+    def __init__(self, limite_mb=None, limite_itens=None):
+        self.limite_bytes = (limite_mb or limite_cache_varreduras_mb) * 1024 * 1024
+        self.limite_itens = limite_itens or limite_cache_varreduras_itens
+        self.reaproveitadas = 0
+        self.calculadas = 0
+
+    def _pasta(self):
+        return os.path.join(cache_dir, "varreduras")
+
+    def _ler_manifesto(self):
+        try:
+            with open(os.path.join(self._pasta(), "indice.json"), encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return manifesto.get('itens', {}) if manifesto.get('versao') == self.versao else {}
+
+    def _gravar_manifesto(self, itens):
+        os.makedirs(self._pasta(), exist_ok=True)
+        temporario = os.path.join(self._pasta(), f"indice.json.tmp{os.getpid()}")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'versao': self.versao, 'itens': itens}, f, indent=1)
+        os.replace(temporario, os.path.join(self._pasta(), "indice.json"))
+
+    @staticmethod
+    def impressao_digital(portarias, tempos, codigos, destinos_unicos, ordens):
+        """Hash do conteúdo das colunas usadas pela varredura"""
+        hash_dados = hashlib.sha256()
+        for array in (np.asarray(portarias, dtype=np.int64), tempos, codigos, np.asarray(ordens, dtype=np.int64)):
+            hash_dados.update(np.ascontiguousarray(array).tobytes())
+        hash_dados.update(repr([str(destino) for destino in destinos_unicos]).encode())
+        return hash_dados.hexdigest()[:24]
+
+    @staticmethod
+    def _nome(impressao, chave, top_k):
+        return hashlib.sha256(repr((impressao, chave, top_k)).encode()).hexdigest()[:24] + ".npz"
+
+    def obter(self, impressao, chave, top_k):
+        """Retorna (topos, contagens) da varredura gravada ou None"""
+        itens = self._ler_manifesto()
+        nome = self._nome(impressao, chave, top_k)
+        if nome not in itens:
+            return None
+        try:
+            with np.load(os.path.join(self._pasta(), nome)) as dados:
+                varredura = dados['topos'].astype(np.int64), dados['contagens']
+        except (OSError, ValueError, KeyError):
+            return None
+        if varredura[1].dtype.kind == 'i':
+            varredura = varredura[0], varredura[1].astype(np.int64)
+        itens[nome]['uso'] = time.time()
+        self._gravar_manifesto(itens)
+        self.reaproveitadas += 1
+        return varredura
+
+    def guardar(self, impressao, chave, top_k, topos, contagens):
+        """Grava a varredura e descarta as usadas há mais tempo acima dos limites"""
+        os.makedirs(self._pasta(), exist_ok=True)
+        nome = self._nome(impressao, chave, top_k)
+        # Códigos e contagens cabem em 32 bits; voltam a int64 na leitura
+        if contagens.dtype.kind == 'i':
+            contagens = contagens.astype(np.int32)
+        np.savez(os.path.join(self._pasta(), nome), topos=topos.astype(np.int32), contagens=contagens)
+        itens = self._ler_manifesto()
+        itens[nome] = {'uso': time.time(), 'bytes': os.path.getsize(os.path.join(self._pasta(), nome)),
+                       'modo': chave[0], 'parametro': chave[1], 'top_k': top_k}
+        self.calculadas += 1
+        total = sum(item['bytes'] for item in itens.values())
+        for antigo in sorted(itens, key=lambda n: itens[n]['uso']):
+            if total <= self.limite_bytes and len(itens) <= self.limite_itens:
+                break
+            if antigo == nome:
+                continue
+            total -= itens.pop(antigo)['bytes']
+            try:
+                os.remove(os.path.join(self._pasta(), antigo))
+            except OSError:
+                pass
+        self._gravar_manifesto(itens)
+
+def _varrer_configuracoes(df, configuracoes, ordem=None, workers=1, dividir_simulacoes=False, top_k=1,
+                          cache_varreduras=None):
+    """
+    Varre uma única vez cada intervalo (modo janela), cada meia-vida (modo
+    decaimento) e cada (intervalo, contadores, fatias) (modo aproximado)
+    distintos das configurações
+
+    Com cache_varreduras (CacheVarreduras) as varreduras já gravadas para os
+    mesmos dados são reaproveitadas e apenas as demais são calculadas.
+
+    Returns:
+        tuple: (destinos_unicos, varreduras), com varreduras mapeando
+        _chave_varredura -> (topos, contagens) alinhados ao df
+    """
+    portarias, tempos, codigos, destinos_unicos, ordens = _colunas_entradas(df, ordem)
+    chaves = {_chave_varredura(c) for c in configuracoes}
+    varreduras = {}
+    impressao = None
+    if cache_varreduras is not None:
+        impressao = cache_varreduras.impressao_digital(portarias, tempos, codigos, destinos_unicos, ordens)
+        for chave in chaves:
+            varredura = cache_varreduras.obter(impressao, chave, top_k)
+            if varredura is not None:
+                varreduras[chave] = varredura
+    for modo, varredura in (('janela', _varrer_janelas), ('decaimento', _varrer_decaimento),
+                            ('aproximado', _varrer_aproximado)):
+        parametros = sorted(parametro for m, parametro in chaves if m == modo and (m, parametro) not in varreduras)
+        if not parametros:
+            continue
+        topos, contagens = _varrer_janelas_paralelo(portarias, tempos, codigos, ordens, parametros,
+                                                    workers=workers, dividir_intervalos=dividir_simulacoes,
+                                                    top_k=top_k, varredura=varredura)
+        for w, parametro in enumerate(parametros):
+            varreduras[(modo, parametro)] = (topos[w], contagens[w])
+            if cache_varreduras is not None:
+                cache_varreduras.guardar(impressao, (modo, parametro), top_k, topos[w], contagens[w])
+    return destinos_unicos, varreduras
+
+def _aplicar_historico(configuracao, sugeridos, resultado, topos, contagens, destinos_unicos, portarias, tempos,
+                      codigos, referencia):
+    """
+    Completa/combina a sugestão da janela com o índice histórico
+
+    - reserva: nas linhas sem sugestão, usa o destino mais frequente do histórico
+      para a portaria, dia da semana e faixa horária
+    - mistura: compara o destino mais frequente da janela e o do histórico pela
+      pontuação contagem na janela + peso_historico x entradas esperadas na janela
+      (média diária do histórico na faixa, proporcional ao intervalo); sugere o de
+      maior pontuação se ela atingir a quantidade mínima
+
+    Args:
+        referencia: (destino_historico, media_historico, media_do_topo_da_janela)
+            de IndiceHistorico.consultar
+    """
+    destino_historico, media_historico, media_topo = referencia
+    tem_historico = pd.notna(destino_historico)
+    if historico_simulacao(configuracao) == 'reserva':
+        reserva = ~sugeridos & tem_historico
+        resultado[reserva] = destino_historico[reserva]
+        return resultado
+
+    escala = configuracao.get('peso_historico', 1.0) * configuracao['intervalo_minutos'] / faixa_historico_minutos
+    codigos_historico = np.full(len(resultado), -1, dtype=np.int64)
+    codigos_historico[tem_historico] = pd.Index(destinos_unicos).get_indexer(destino_historico[tem_historico])
+    contagem_historico = contar_destino_na_janela(portarias, tempos, codigos, codigos_historico,
+                                                  configuracao['intervalo_minutos'])
+    pontuacao_janela = np.where(topos >= 0, contagens + escala * media_topo, -np.inf)
+    pontuacao_historico = np.where(tem_historico, contagem_historico + escala * media_historico, -np.inf)
+    usar_historico = pontuacao_historico > pontuacao_janela
+    pontuacao = np.maximum(pontuacao_janela, pontuacao_historico)
+    suficiente = pontuacao >= configuracao['quantidade_minima_entradas']
+    resultado[:] = np.nan
+    da_janela = suficiente & ~usar_historico
+    resultado[da_janela] = destinos_unicos[topos[da_janela]]
+    resultado[suficiente & usar_historico] = destino_historico[suficiente & usar_historico]
+    return resultado
+
+def _consultar_historico(df, configuracoes, indice_historico, varreduras, destinos_unicos, tempos):
+    """Consulta o índice histórico uma vez por linha (e pelo topo de cada janela em mistura)"""
+    portarias = df['ide_portaria'].to_numpy()
+    destino_historico, media_historico = indice_historico.consultar(portarias, tempos)
+    referencias = {}
+    for configuracao in configuracoes:
+        historico = historico_simulacao(configuracao)
+        chave = _chave_varredura(configuracao)
+        if not historico or (chave, historico) in referencias:
+            continue
+        media_topo = np.zeros(len(df))
+        if historico == 'mistura':
+            topos = varreduras[chave][0]
+            topos = topos[:, 0] if topos.ndim == 2 else topos
+            destinos_topo = np.full(len(df), np.nan, dtype=object)
+            destinos_topo[topos >= 0] = destinos_unicos[topos[topos >= 0]]
+            media_topo = indice_historico.consultar(portarias, tempos, destinos_topo)
+        referencias[chave, historico] = (destino_historico, media_historico, media_topo)
+    return referencias
+
+def calcular_sugestoes_multiplas(df, configuracoes, ordem=None, workers=1, dividir_simulacoes=False,
+                                 indice_historico=None, cache_varreduras=None):
+    """
+    Calcula as sugestões de várias simulações em uma única varredura
+
+    Ordena e agrupa as entradas uma única vez e percorre cada portaria
+    mantendo uma janela por intervalo distinto; as quantidades mínimas de um
+    mesmo intervalo reaproveitam o mesmo destino mais frequente. Configurações
+    com "modo": "decaimento" usam a pontuação com meia_vida_minutos
+    (PontuacaoDecaimento) e aplicam a quantidade mínima à pontuação.
+
+    Args:
+        df: DataFrame com as colunas ide_portaria, tim_entrada e ide_destino
+        configuracoes: lista de dicionários com intervalo_minutos e
+            quantidade_minima_entradas (mesmo formato de simulacoes)
+        ordem: Posição de cada linha no arquivo original, usada no desempate
+            (opcional, padrão é a posição da linha no df)
+        workers: quantidade de processos; as portarias são divididas entre eles
+        dividir_simulacoes: também divide os intervalos entre os processos
+        indice_historico: IndiceHistorico usado pelas configurações com
+            "historico" (sem índice elas usam apenas a janela)
+        cache_varreduras: CacheVarreduras que reaproveita as varreduras de
+            execuções anteriores sobre os mesmos dados (opcional)
+
+    Returns:
+        list[pd.Series]: uma série por configuração, alinhada ao df
+    """
+    if len(df) == 0 or not configuracoes:
+        return [pd.Series(np.nan, index=df.index) for _ in configuracoes]
+
+    destinos_unicos, varreduras = _varrer_configuracoes(df, configuracoes, ordem, workers, dividir_simulacoes,
+                                                        cache_varreduras=cache_varreduras)
+    return _montar_sugestoes(df, configuracoes, destinos_unicos, varreduras, indice_historico)
+
+def _montar_sugestoes(df, configuracoes, destinos_unicos, varreduras, indice_historico=None):
+    """Aplica a quantidade mínima (e o histórico) de cada configuração sobre as varreduras"""
+    referencias = {}
+    if indice_historico is not None and any(historico_simulacao(c) for c in configuracoes):
+        portarias, tempos, codigos, _, _ = _colunas_entradas(df)
+        referencias = _consultar_historico(df, configuracoes, indice_historico, varreduras, destinos_unicos, tempos)
+    resultados = []
+    for configuracao in configuracoes:
+        topos, contagens = varreduras[_chave_varredura(configuracao)]
+        if topos.ndim == 2:
+            topos, contagens = topos[:, 0], contagens[:, 0]
+        sugeridos = (topos >= 0) & (contagens >= configuracao['quantidade_minima_entradas'])
+        resultado = np.full(len(df), np.nan, dtype=object)
+        resultado[sugeridos] = destinos_unicos[topos[sugeridos]]
+        referencia = referencias.get((_chave_varredura(configuracao), historico_simulacao(configuracao)))
+        if referencia is not None:
+            resultado = _aplicar_historico(configuracao, sugeridos, resultado, topos, contagens, destinos_unicos,
+                                           portarias, tempos, codigos, referencia)
+        resultados.append(pd.Series(resultado, index=df.index).infer_objects())
+    return resultados
+
+def calcular_sugestoes_ranking(df, configuracoes, top_k, ordem=None, workers=1, dividir_simulacoes=False,
+                               indice_historico=None, cache_varreduras=None):
+    """
+    Calcula, além da sugestão de cada simulação, o ranking dos top_k destinos
+    mais frequentes da janela (modo top-K)
+
+    Entram no ranking apenas os destinos com pelo menos a quantidade mínima de
+    entradas da configuração, de modo que o primeiro do ranking é sempre a
+    sugestão de calcular_sugestoes_multiplas e o ranking existe exatamente nas
+    linhas em que há sugestão. Nas configurações com "historico" a sugestão
+    considera o índice histórico e o ranking continua sendo o da janela.
+
+    Returns:
+        tuple: (sugestoes, rankings) - sugestoes como em calcular_sugestoes_multiplas;
+        rankings com uma matriz N x top_k por configuração, com os destinos em
+        ordem de frequência (NaN nas posições sem destino)
+    """
+    top_k = max(1, int(top_k))
+    if len(df) == 0 or not configuracoes:
+        return ([pd.Series(np.nan, index=df.index) for _ in configuracoes],
+                [np.full((len(df), top_k), np.nan, dtype=object) for _ in configuracoes])
+
+    destinos_unicos, varreduras = _varrer_configuracoes(df, configuracoes, ordem, workers, dividir_simulacoes,
+                                                        top_k=max(2, top_k), cache_varreduras=cache_varreduras)
+
+    rankings = []
+    for configuracao in configuracoes:
+        topos, contagens = varreduras[_chave_varredura(configuracao)]
+        presentes = (topos >= 0) & (contagens >= configuracao['quantidade_minima_entradas'])
+        ranking = np.full(topos.shape, np.nan, dtype=object)
+        ranking[presentes] = destinos_unicos[topos[presentes]]
+        rankings.append(ranking[:, :top_k])
+    sugestoes = _montar_sugestoes(df, configuracoes, destinos_unicos, varreduras, indice_historico)
+    return sugestoes, rankings
+
+def calcular_sugestoes_janela(df, intervalo_minutos, quantidade_minima_entradas, ordem=None):
+    """
+    Calcula a sugestão de destino de todas as linhas em uma única passagem
+
+    Equivalente a aplicar obterSugestaoDestino linha a linha usando o próprio df
+    como histórico, mas percorre as entradas de cada portaria em ordem de horário
+    uma única vez, com dois ponteiros delimitando a janela de intervalo_minutos.
+
+    Args:
+        df: DataFrame com as colunas ide_portaria, tim_entrada e ide_destino
+        intervalo_minutos: Intervalo em minutos para análise
+        quantidade_minima_entradas: Quantidade mínima de entradas
+        ordem: Posição de cada linha no arquivo original, usada no desempate
+            (opcional, padrão é a posição da linha no df)
+
+    Returns:
+        pd.Series: destino sugerido por linha (NaN quando não há sugestão), alinhada ao df
+    """
+    configuracao = {
+        'intervalo_minutos': intervalo_minutos,
+        'quantidade_minima_entradas': quantidade_minima_entradas,
+    }
+    return calcular_sugestoes_multiplas(df, [configuracao], ordem=ordem)[0]
+
+def medir_simulacoes_aproximadas(df, configuracoes, ordem=None, workers=1, cache_varreduras=None):
+    """
+    Compara as simulações do modo aproximado com o motor exato, linha a linha
+
+    Cada configuração aproximada é varrida junto com a janela exata do mesmo
+    intervalo (as varreduras vêm do cache_varreduras quando já calculadas) e
+    cada linha recebe:
+    - Divergente: a sugestão (antes do histórico) difere da do motor exato
+    - Erro_Contagem: |contagem estimada - contagem exata na janela| do destino sugerido
+    - Limite_Erro: excesso máximo garantido da contagem estimada, entradas
+      cobertas pelas fatias guardadas / contadores (Space-Saving) mais as
+      entradas da fatia mais antiga anteriores ao início da janela
+
+    Returns:
+        DataFrame longo com Simulacao_Idx (posição em configuracoes, a partir
+        de 1), Linha, ide_portaria, Divergente, Erro_Contagem e Limite_Erro
+        (NaN nas linhas sem sugestão), ou None sem simulações aproximadas
+    """
+    indices = [i for i, c in enumerate(configuracoes, 1) if modo_simulacao(c) == 'aproximado']
+    if not indices or len(df) == 0:
         return None
-    
-    # Obtém o destino mais frequente
-    destino_mais_frequente = frequencia_destinos.index[0]
-    maior_frequencia = frequencia_destinos.iloc[0]
-    
-    # Retorna o destino sugerido apenas se a frequência for >= quantidade_minima_entradas
-    if maior_frequencia >= quantidade_minima_entradas:
-        return destino_mais_frequente
+    aproximadas = [configuracoes[i - 1] for i in indices]
+    exatas = [{'intervalo_minutos': c['intervalo_minutos'], 'quantidade_minima_entradas': 0} for c in aproximadas]
+    _, varreduras = _varrer_configuracoes(df, aproximadas + exatas, ordem, workers,
+                                          cache_varreduras=cache_varreduras)
+    portarias, tempos, codigos, _, _ = _colunas_entradas(df, ordem)
+    todas = np.where(codigos >= 0, 0, -1)
+    consultas_todas = np.zeros(len(df), dtype=np.int64)
+
+    medidas = []
+    for indice, configuracao, exata in zip(indices, aproximadas, exatas):
+        quantidade_minima = configuracao['quantidade_minima_entradas']
+        topos, contagens = varreduras[_chave_varredura(configuracao)]
+        topos_exatos, contagens_exatas = varreduras[_chave_varredura(exata)]
+        sugeridos = (topos >= 0) & (contagens >= quantidade_minima)
+        sugeridos_exatos = (topos_exatos >= 0) & (contagens_exatas >= quantidade_minima)
+        divergente = np.where(sugeridos, topos, -1) != np.where(sugeridos_exatos, topos_exatos, -1)
+
+        intervalo_ns = int(configuracao['intervalo_minutos'] * 60 * 10**9)
+        duracao_fatia = max(1, intervalo_ns // max(1, int(configuracao.get('fatias', fatias_aproximado))))
+        inicios_cobertos = (tempos - intervalo_ns) // duracao_fatia * duracao_fatia
+        cobertas = contar_destino_na_janela(portarias, tempos, todas, consultas_todas, 0, inicios_ns=inicios_cobertos)
+        na_janela = contar_destino_na_janela(portarias, tempos, todas, consultas_todas,
+                                             configuracao['intervalo_minutos'])
+        exatas_do_topo = contar_destino_na_janela(portarias, tempos, codigos, np.where(sugeridos, topos, -1),
+                                                  configuracao['intervalo_minutos'])
+        contadores = configuracao.get('contadores', contadores_aproximado)
+        medidas.append(pd.DataFrame({
+            'Simulacao_Idx': indice,
+            'Linha': np.arange(len(df)),
+            'ide_portaria': portarias,
+            'Divergente': divergente,
+            'Erro_Contagem': np.where(sugeridos, np.abs(contagens - exatas_do_topo), np.nan),
+            'Limite_Erro': np.where(sugeridos, cobertas / contadores + (cobertas - na_janela), np.nan),
+        }))
+    return pd.concat(medidas, ignore_index=True)
+
+def calcular_metricas(total_registros, total_sugestoes, total_acertos):
+    """
+    Calcula precisão, cobertura e F1-Score (em %) de forma vetorizada
+
+    Aceita escalares ou arrays; onde não há sugestões todas as métricas são 0.
+    """
+    total_registros = np.asarray(total_registros, dtype=float)
+    total_sugestoes = np.asarray(total_sugestoes, dtype=float)
+    total_acertos = np.asarray(total_acertos, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precisao = np.where(total_sugestoes > 0, total_acertos / total_sugestoes * 100, 0.0)
+        cobertura = np.where(total_sugestoes > 0, total_sugestoes / total_registros * 100, 0.0)
+        eficiencia = np.where((precisao > 0) & (cobertura > 0),
+                              2 * (precisao * cobertura) / (precisao + cobertura), 0.0)
+    return precisao, cobertura, eficiencia
+
+def _avaliar_bloco_intervalos(indice_portaria, quantidade_portarias, tempos, codigos, ordens, medidos,
+                              intervalos, quantidade_maxima):
+    """
+    Avalia um bloco de intervalos (executado em processo separado no modo paralelo)
+
+    Recebe apenas arrays compactos e devolve, por intervalo e portaria, o
+    histograma das contagens do destino mais frequente (limitadas a
+    quantidade_maxima) de todas as sugestões e das que acertaram o destino,
+    considerando apenas as linhas marcadas em medidos.
+    """
+    topos, contagens = _varrer_janelas(indice_portaria, tempos, codigos, ordens, intervalos)
+    validos = (codigos >= 0) & medidos
+    largura = quantidade_maxima + 1
+    forma = (quantidade_portarias, largura)
+    hist_sugestoes = np.zeros((len(intervalos),) + forma, dtype=np.int64)
+    hist_acertos = np.zeros((len(intervalos),) + forma, dtype=np.int64)
+    for w in range(len(intervalos)):
+        chave = indice_portaria[validos] * largura + np.minimum(contagens[w][validos], quantidade_maxima)
+        acertos = topos[w][validos] == codigos[validos]
+        hist_sugestoes[w] = np.bincount(chave, minlength=forma[0] * forma[1]).reshape(forma)
+        hist_acertos[w] = np.bincount(chave[acertos], minlength=forma[0] * forma[1]).reshape(forma)
+    return hist_sugestoes, hist_acertos
+
+def _marcar_fronteira_pareto(resultados):
+    """Marca as combinações não dominadas em precisão e cobertura dentro de cada escopo"""
+    fronteira = np.zeros(len(resultados), dtype=bool)
+    for _, grupo in resultados.groupby(['Escopo', 'IDE_Portaria'], dropna=False, sort=False):
+        grupo = grupo[grupo['Total_Sugestoes'] > 0]
+        grupo = grupo.sort_values(['Cobertura_Pct', 'Precisao_Pct'], ascending=False, kind='stable')
+        melhor_precisao = -1.0
+        for posicao, precisao in zip(grupo.index, grupo['Precisao_Pct']):
+            if precisao > melhor_precisao:
+                fronteira[posicao] = True
+                melhor_precisao = precisao
+    resultados['Fronteira_Pareto'] = fronteira
+    return resultados
+
+def avaliar_grade(df, intervalos, quantidades_minimas, ordem=None, workers=1, usar_cache=True, mascara=None):
+    """
+    Mede precisão, cobertura e F1-Score de cada combinação de intervalo e
+    quantidade mínima, por portaria e no geral
+
+    Cada intervalo exige uma única varredura; todas as quantidades mínimas são
+    obtidas do histograma das contagens. Com workers > 1 os intervalos são
+    divididos entre processos. O resultado fica em cache_dir, indexado pelos
+    dados e pela grade, de modo que repetir a mesma avaliação é imediato.
+
+    Args:
+        df: DataFrame com as colunas ide_portaria, tim_entrada e ide_destino
+        intervalos: lista de intervalos em minutos
+        quantidades_minimas: lista de quantidades mínimas de entradas
+        ordem: Posição de cada linha no arquivo original, usada no desempate
+        workers: quantidade de processos (1 = sem paralelismo)
+        usar_cache: reaproveita/grava o resultado em cache_dir
+        mascara: linhas consideradas nas métricas; as demais servem apenas de
+            histórico para as janelas (opcional, padrão são todas)
+
+    Returns:
+        pd.DataFrame: uma linha por escopo (geral e cada portaria), intervalo e
+        quantidade mínima, com a coluna Fronteira_Pareto
+    """
+    intervalos = sorted(set(intervalos))
+    quantidades_minimas = sorted(set(max(1, q) for q in quantidades_minimas))
+    portarias, tempos, codigos, destinos_unicos, ordens = _colunas_entradas(df, ordem)
+    ids_portaria, indice_portaria = np.unique(portarias, return_inverse=True)
+    indice_portaria = indice_portaria.astype(np.int64)
+    medidos = np.ones(len(codigos), dtype=bool) if mascara is None else np.asarray(mascara, dtype=bool)
+
+    # Chave do cache: conteúdo dos dados + grade avaliada
+    arquivo_cache = None
+    if usar_cache:
+        hash_dados = hashlib.sha256()
+        for array in (np.asarray(portarias, dtype=np.int64), tempos, codigos, np.asarray(ordens, dtype=np.int64), medidos):
+            hash_dados.update(np.ascontiguousarray(array).tobytes())
+        hash_dados.update(repr((intervalos, quantidades_minimas)).encode())
+        arquivo_cache = os.path.join(cache_dir, f"grade_{hash_dados.hexdigest()[:24]}.pkl")
+        if os.path.exists(arquivo_cache):
+            return pd.read_pickle(arquivo_cache)
+
+    quantidade_maxima = max(quantidades_minimas)
+    argumentos = (indice_portaria, len(ids_portaria), tempos, codigos, ordens, medidos)
+    if workers > 1 and len(intervalos) > 1:
+        # Blocos intercalados equilibram a carga entre os processos
+        quantidade_blocos = min(len(intervalos), workers * 4)
+        blocos = [intervalos[k::quantidade_blocos] for k in range(quantidade_blocos)]
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parciais = list(executor.map(
+                _avaliar_bloco_intervalos,
+                *zip(*[argumentos + (bloco, quantidade_maxima) for bloco in blocos])
+            ))
+        ordem_intervalos = [intervalo for bloco in blocos for intervalo in bloco]
+        reordenar = np.argsort(ordem_intervalos)
+        hist_sugestoes = np.concatenate([p[0] for p in parciais])[reordenar]
+        hist_acertos = np.concatenate([p[1] for p in parciais])[reordenar]
     else:
-        return None
+        hist_sugestoes, hist_acertos = _avaliar_bloco_intervalos(*argumentos, intervalos, quantidade_maxima)
+
+    # Soma acumulada do fim para o início: linhas com contagem >= q
+    sugestoes = hist_sugestoes[:, :, ::-1].cumsum(axis=2)[:, :, ::-1][:, :, quantidades_minimas]
+    acertos = hist_acertos[:, :, ::-1].cumsum(axis=2)[:, :, ::-1][:, :, quantidades_minimas]
+    registros = np.bincount(indice_portaria[(codigos >= 0) & medidos], minlength=len(ids_portaria))
+
+    descricoes = {}
+    if 'des_portaria' in df.columns:
+        descricoes = df.drop_duplicates('ide_portaria').set_index('ide_portaria')['des_portaria'].to_dict()
+
+    linhas = []
+    grade_i, grade_q = np.meshgrid(intervalos, quantidades_minimas, indexing='ij')
+    escopos = [('Geral', np.nan, 'Todas as portarias', sugestoes.sum(axis=1), acertos.sum(axis=1), registros.sum())]
+    for p, portaria in enumerate(ids_portaria):
+        if registros[p] == 0:
+            continue
+        escopos.append(('Portaria', portaria, descricoes.get(portaria, f'Portaria {portaria}'),
+                        sugestoes[:, p, :], acertos[:, p, :], registros[p]))
+    for escopo, portaria, descricao, total_sugestoes, total_acertos, total_registros in escopos:
+        precisao, cobertura, eficiencia = calcular_metricas(total_registros, total_sugestoes, total_acertos)
+        linhas.append(pd.DataFrame({
+            'Escopo': escopo,
+            'IDE_Portaria': portaria,
+            'Descricao_Portaria': descricao,
+            'Intervalo_Min': grade_i.ravel(),
+            'Qtd_Min_Entradas': grade_q.ravel(),
+            'Total_Registros': total_registros,
+            'Total_Sugestoes': total_sugestoes.ravel(),
+            'Total_Acertos': total_acertos.ravel(),
+            'Precisao_Pct': precisao.ravel(),
+            'Cobertura_Pct': cobertura.ravel(),
+            'Eficiencia_F1': eficiencia.ravel(),
+        }))
+    resultados = _marcar_fronteira_pareto(pd.concat(linhas, ignore_index=True))
+    resultados[['Precisao_Pct', 'Cobertura_Pct', 'Eficiencia_F1']] = resultados[
+        ['Precisao_Pct', 'Cobertura_Pct', 'Eficiencia_F1']].round(1)
+
+    if arquivo_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        resultados.to_pickle(arquivo_cache)
+    return resultados
 
 def listar_arquivos_input():
     """Lista arquivos CSV disponíveis na pasta input"""
@@ -163,39 +1574,1679 @@ def listar_arquivos_input():
     arquivos = [f for f in os.listdir(input_dir) if f.endswith('.csv')]
     return arquivos
 
-def csv_para_excel_simples(arquivo_csv):
+def data_do_arquivo(nome_arquivo):
+    """Extrai a data (DD-MM-AAAA) do nome do arquivo, ou None se não houver"""
+    encontrado = re.search(r'(\d{2})-(\d{2})-(\d{4})', os.path.basename(nome_arquivo))
+    if not encontrado:
+        return None
+    dia, mes, ano = encontrado.groups()
+    try:
+        return datetime(int(ano), int(mes), int(dia)).date()
+    except ValueError:
+        return None
+
+def listar_arquivos_lote(data_inicio=None, data_fim=None):
     """
-    Converte arquivo CSV diretamente para Excel
+    Lista os arquivos CSV da pasta input em ordem cronológica
+
+    Args:
+        data_inicio: Primeira data incluída (opcional)
+        data_fim: Última data incluída (opcional)
+
+    Returns:
+        list: caminhos dos arquivos com data no nome dentro do período
     """
-    try:
-        # Lê o CSV
-        df = pd.read_csv(arquivo_csv)
-        
-        # Filtra apenas registros que possuem ide_destino preenchido
-        if 'ide_destino' in df.columns:
-            total_registros_original = len(df)
-            # Remove registros onde ide_destino está vazio, NaN ou None
-            df = df.dropna(subset=['ide_destino'])
-            # Remove registros onde ide_destino está vazio (string vazia)
-            df = df[df['ide_destino'].astype(str).str.strip() != '']
-            registros_filtrados = len(df)
-            print(f"🔍 Filtro aplicado: registros com 'ide_destino' preenchido")
-            print(f"📊 Registros originais: {total_registros_original:,}")
-            print(f"📊 Registros filtrados: {registros_filtrados:,}")
-            print(f"📊 Registros removidos: {total_registros_original - registros_filtrados:,}")
-        else:
-            print(f"⚠️ Coluna 'ide_destino' não encontrada. Processando todos os registros.")
+    arquivos = []
+    for arquivo in listar_arquivos_input():
+        data = data_do_arquivo(arquivo)
+        if data is None:
+            print(f"⚠️ Arquivo sem data no nome ignorado no lote: {arquivo}")
+            continue
+        if (data_inicio and data < data_inicio) or (data_fim and data > data_fim):
+            continue
+        arquivos.append((data, os.path.join("input", arquivo)))
+    return [arquivo for _, arquivo in sorted(arquivos)]
+
+def filtrar_e_ordenar_entradas(df):
+    """
+    Mantém apenas os registros com ide_destino preenchido e ordena por
+    ide_portaria e tim_entrada
+    """
+    # Filtra apenas registros que possuem ide_destino preenchido
+    if 'ide_destino' in df.columns:
+        total_registros_original = len(df)
+        # Remove registros onde ide_destino está vazio, NaN ou None
+        df = df.dropna(subset=['ide_destino'])
+        # Remove registros onde ide_destino está vazio (string vazia)
+        if not pd.api.types.is_numeric_dtype(df['ide_destino']):
+            df = df[df['ide_destino'].astype(str).str.strip() != '']
+        registros_filtrados = len(df)
+        print(f"🔍 Filtro aplicado: registros com 'ide_destino' preenchido")
+        print(f"📊 Registros originais: {total_registros_original:,}")
+        print(f"📊 Registros filtrados: {registros_filtrados:,}")
+        print(f"📊 Registros removidos: {total_registros_original - registros_filtrados:,}")
+    else:
+        print(f"⚠️ Coluna 'ide_destino' não encontrada. Processando todos os registros.")
+    
+    # Ordena os dados pelas colunas ide_portaria e tim_entrada
+    colunas_ordenacao = []
+    if 'ide_portaria' in df.columns:
+        colunas_ordenacao.append('ide_portaria')
+    if 'tim_entrada' in df.columns:
+        colunas_ordenacao.append('tim_entrada')
+    
+    if colunas_ordenacao:
+        df = df.sort_values(by=colunas_ordenacao)
+        print(f"📊 Dados ordenados por: {', '.join(colunas_ordenacao)}")
+    
+    return df
+
+def _chave_arquivo(arquivo_csv):
+    """Identifica a versão de um arquivo pelo caminho, tamanho e data de modificação"""
+    info = os.stat(arquivo_csv)
+    return {'caminho': os.path.abspath(arquivo_csv), 'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns}
+
+def _pasta_cache_entradas(chave):
+    hash_chave = hashlib.sha256(json.dumps(chave, sort_keys=True).encode()).hexdigest()[:24]
+    return os.path.join(cache_dir, f"entradas_{hash_chave}")
+
+def salvar_cache_entradas(df, total_registros_original, chave):
+    """
+    Grava as colunas já limpas, ordenadas e tipadas em formato NumPy (.npy),
+    uma coluna por arquivo, para leitura por memory-map nas próximas execuções
+    """
+    pasta = _pasta_cache_entradas(chave)
+    temporaria = pasta + f".tmp{os.getpid()}"
+    os.makedirs(temporaria, exist_ok=True)
+    colunas = {}
+    for nome, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(temporaria, f"{nome}.npy"), serie.cat.codes.to_numpy())
+            colunas[nome] = {'tipo': 'categoria', 'categorias': serie.cat.categories.tolist()}
+        elif isinstance(serie.dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(serie):
+            # Inteiro com valores ausentes: valores + máscara
+            tipo_numpy = serie.dtype.numpy_dtype
+            np.save(os.path.join(temporaria, f"{nome}.npy"), serie.to_numpy(dtype=tipo_numpy, na_value=0))
+            np.save(os.path.join(temporaria, f"{nome}.ausentes.npy"), serie.isna().to_numpy())
+            colunas[nome] = {'tipo': 'inteiro_nulo', 'dtype': str(serie.dtype)}
+        elif pd.api.types.is_datetime64_any_dtype(serie):
+            np.save(os.path.join(temporaria, f"{nome}.npy"), serie.to_numpy(dtype='datetime64[ns]').astype(np.int64))
+            colunas[nome] = {'tipo': 'datetime_ns'}
+        else:
+            np.save(os.path.join(temporaria, f"{nome}.npy"), serie.to_numpy())
+            colunas[nome] = {'tipo': str(serie.dtype)}
+    np.save(os.path.join(temporaria, "_ordem.npy"), df.index.to_numpy(dtype=np.int64))
+    meta = {'versao': 2, 'chave': chave, 'total_registros_original': int(total_registros_original),
+            'colunas': colunas, 'ordem_colunas': list(df.columns)}
+    with open(os.path.join(temporaria, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.replace(temporaria, pasta)
+
+def ler_cache_entradas(chave):
+    """
+    Lê as colunas gravadas por salvar_cache_entradas (por memory-map)
+
+    Returns:
+        tuple ou None: (df, total_registros_original) ou None se não houver cache válido
+    """
+    pasta = _pasta_cache_entradas(chave)
+    try:
+        with open(os.path.join(pasta, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('versao') != 2 or meta.get('chave') != chave:
+            return None
+        dados = {}
+        for nome in meta['ordem_colunas']:
+            info = meta['colunas'][nome]
+            valores = np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode='r')
+            if info['tipo'] == 'categoria':
+                dados[nome] = pd.Categorical.from_codes(valores, categories=info['categorias'])
+            elif info['tipo'] == 'datetime_ns':
+                dados[nome] = valores.view('datetime64[ns]')
+            elif info['tipo'] == 'inteiro_nulo':
+                ausentes = np.load(os.path.join(pasta, f"{nome}.ausentes.npy"))
+                dados[nome] = pd.array(np.asarray(valores), dtype=info['dtype'])
+                dados[nome][ausentes] = pd.NA
+            else:
+                dados[nome] = valores
+        ordem = np.load(os.path.join(pasta, "_ordem.npy"), mmap_mode='r')
+        return pd.DataFrame(dados, index=pd.Index(ordem)), meta['total_registros_original']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def ler_entradas_compactas(arquivo_csv):
+    """
+    Lê o CSV de entradas em representação compacta
+
+    Arquivos no layout SIVIS têm apenas colunas_entradas lidas: descrições como
+    categorias, IDs numéricos e tim_entrada como datetime64[ns] (inteiros de
+    64 bits em nanossegundos); data_entrada e hora_minuto_entrada são
+    descartadas e recriadas na saída (adicionar_colunas_derivadas). Outros
+    CSV são lidos por completo, sem alteração de tipos.
+    """
+    cabecalho = pd.read_csv(arquivo_csv, nrows=0).columns
+    if not {'ide_portaria', 'tim_entrada', 'ide_destino'}.issubset(cabecalho):
+        df = pd.read_csv(arquivo_csv)
+    else:
+        tipos = {'des_portaria': 'category', 'desdestinoGenerico': 'category', 'tim_entrada': str}
+        df = pd.read_csv(arquivo_csv, usecols=lambda coluna: coluna in colunas_entradas,
+                         dtype={c: t for c, t in tipos.items() if c in cabecalho})
+    if 'tim_entrada' in df.columns:
+        df['tim_entrada'] = pd.to_datetime(df['tim_entrada']).astype('datetime64[ns]')
+    return df
+
+def ler_entradas_em_blocos(arquivo_csv, tamanho_bloco):
+    """
+    Lê o CSV SIVIS em blocos de tamanho_bloco linhas, já sem os registros sem ide_destino
+
+    Lê apenas colunas_entradas, com tim_entrada em datetime64[ns] e IDs em
+    int64 (o mesmo tipo em todos os blocos); o índice de cada bloco é a posição
+    da linha no arquivo, como em carregar_entradas.
+
+    Yields:
+        tuple: (bloco filtrado, quantidade de linhas lidas no bloco)
+    """
+    cabecalho = pd.read_csv(arquivo_csv, nrows=0).columns
+    if not {'ide_portaria', 'tim_entrada', 'ide_destino'}.issubset(cabecalho):
+        raise ValueError("o modo em blocos exige as colunas ide_portaria, tim_entrada e ide_destino")
+    leitor = pd.read_csv(arquivo_csv, usecols=lambda coluna: coluna in colunas_entradas,
+                         dtype={'tim_entrada': str}, chunksize=tamanho_bloco)
+    for bloco in leitor:
+        lidas = len(bloco)
+        bloco = bloco.dropna(subset=['ide_destino'])
+        if not pd.api.types.is_numeric_dtype(bloco['ide_destino']):
+            bloco = bloco[bloco['ide_destino'].astype(str).str.strip() != '']
+        bloco['tim_entrada'] = pd.to_datetime(bloco['tim_entrada']).astype('datetime64[ns]')
+        for coluna in ['ide_entrada', 'ide_portaria', 'ide_destino']:
+            if coluna in bloco.columns and pd.api.types.is_numeric_dtype(bloco[coluna]) \
+                    and not bloco[coluna].isna().any() and (bloco[coluna] % 1 == 0).all():
+                bloco[coluna] = bloco[coluna].astype(np.int64)
+        yield bloco, lidas
+
+def _inteiro_compacto(serie):
+    """
+    Converte a coluna para o menor inteiro (16, 32 ou 64 bits) que comporta
+    seus valores; com valores ausentes usa o inteiro anulável (Int16/Int32/Int64).
+    Colunas com valores não inteiros são mantidas.
+    """
+    if not pd.api.types.is_numeric_dtype(serie):
+        return serie
+    validos = serie.dropna()
+    if len(validos) and (validos % 1 != 0).any():
+        return serie
+    menor, maior = (validos.min(), validos.max()) if len(validos) else (0, 0)
+    tipo = next(t for t in (np.int16, np.int32, np.int64) if np.iinfo(t).min <= menor and maior <= np.iinfo(t).max)
+    if len(validos) < len(serie):
+        return serie.astype(np.dtype(tipo).name.capitalize())
+    return serie.astype(tipo)
+
+def adicionar_colunas_derivadas(df):
+    """
+    Recria data_entrada e hora_minuto_entrada (colunas_derivadas) a partir de
+    tim_entrada, logo após ela, como categorias
+
+    Os textos são formatados uma vez por minuto distinto, não por linha.
+    """
+    if 'tim_entrada' not in df.columns or not pd.api.types.is_datetime64_any_dtype(df['tim_entrada']):
+        return df
+    codigos, minutos = pd.factorize(df['tim_entrada'].dt.floor('min'))
+    posicao = df.columns.get_loc('tim_entrada') + 1
+    for nome, formato in colunas_derivadas.items():
+        if nome in df.columns:
+            continue
+        textos = np.append(minutos.strftime(formato).to_numpy(dtype=object), None)
+        df.insert(posicao, nome, pd.Categorical(textos[codigos]))
+        posicao += 1
+    return df
+
+def relatorio_memoria(df):
+    """
+    Memória ocupada por coluna do DataFrame (incluindo o conteúdo dos textos)
+
+    Returns:
+        DataFrame: Coluna, Tipo, Bytes e Bytes_por_Registro, com a linha Total ao final
+    """
+    uso = df.memory_usage(deep=True)
+    relatorio = pd.DataFrame({
+        'Coluna': [str(c) for c in uso.index],
+        'Tipo': ['índice' if c == 'Index' else str(df[c].dtype) for c in uso.index],
+        'Bytes': uso.to_numpy(),
+    })
+    relatorio.loc[len(relatorio)] = ['Total', '', int(uso.sum())]
+    relatorio['Bytes_por_Registro'] = (relatorio['Bytes'] / max(len(df), 1)).round(1)
+    return relatorio
+
+def _mostrar_memoria_total(df):
+    total = int(df.memory_usage(deep=True).sum())
+    print(f"💾 Memória das entradas: {total / 2**20:,.2f} MB ({total / max(len(df), 1):,.0f} bytes/registro)")
+
+def mostrar_relatorio_memoria(df):
+    """Imprime o relatorio_memoria do DataFrame"""
+    print(f"\n💾 Memória por coluna ({len(df):,} registros):")
+    for _, linha in relatorio_memoria(df).iterrows():
+        print(f"   {linha['Coluna']:<22} {linha['Tipo']:<16} {linha['Bytes'] / 1024:>12,.1f} KB "
+              f"{linha['Bytes_por_Registro']:>8,.1f} B/registro")
+
+def carregar_entradas(arquivo_csv, usar_cache=True):
+    """
+    Lê o CSV de entradas já filtrado, ordenado e com colunas tipadas
+
+    Na primeira leitura o resultado é gravado no cache colunar (cache_dir),
+    indexado por caminho, tamanho e data de modificação do arquivo; as
+    execuções seguintes carregam as colunas direto do cache, sem interpretar
+    o CSV nem converter datas.
+
+    Returns:
+        tuple: (df, total_registros_original); o índice do df é a posição da
+        linha no arquivo (usada no desempate das sugestões)
+    """
+    chave = _chave_arquivo(arquivo_csv) if usar_cache else None
+    if chave:
+        with perfil_etapa('leitura_cache'):
+            em_cache = ler_cache_entradas(chave)
+        if em_cache is not None:
+            df, total_registros_original = em_cache
+            print(f"⚡ Dados carregados do cache colunar: {len(df):,} registros "
+                  f"({total_registros_original:,} originais)")
+            _mostrar_memoria_total(df)
+            return df, total_registros_original
+    
+    with perfil_etapa('leitura_csv'):
+        df = ler_entradas_compactas(arquivo_csv)
+    total_registros_original = len(df)
+    
+    with perfil_etapa('limpeza', registros=total_registros_original):
+        df = filtrar_e_ordenar_entradas(df)
+        
+        # IDs no menor tipo inteiro possível (após o filtro, ide_destino costuma não ter ausentes)
+        for coluna in ['ide_entrada', 'ide_portaria', 'ide_destino']:
+            if coluna in df.columns:
+                df[coluna] = _inteiro_compacto(df[coluna])
+    
+    colunas_necessarias = {'ide_portaria', 'tim_entrada', 'ide_destino'}
+    if chave and colunas_necessarias.issubset(df.columns):
+        try:
+            salvar_cache_entradas(df, total_registros_original, chave)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o cache colunar: {e}")
+    
+    _mostrar_memoria_total(df)
+    return df, total_registros_original
+
+def contar_entradas_historico(df, faixa_minutos=None):
+    """
+    Tabela de frequências de um dia: entradas por portaria, faixa horária e destino
+
+    Returns:
+        DataFrame: ide_portaria, faixa, ide_destino, contagem (tipos compactos)
+    """
+    faixa_minutos = faixa_minutos or faixa_historico_minutos
+    tempos = pd.to_datetime(df['tim_entrada'])
+    validos = df['ide_destino'].notna().to_numpy()
+    faixas = (tempos.dt.hour * 60 + tempos.dt.minute) // faixa_minutos
+    tabela = pd.DataFrame({
+        'ide_portaria': df['ide_portaria'].to_numpy()[validos],
+        'faixa': faixas.to_numpy()[validos].astype(np.int16),
+        'ide_destino': df['ide_destino'].to_numpy()[validos],
+    }).groupby(['ide_portaria', 'faixa', 'ide_destino'], sort=True).size().rename('contagem').reset_index()
+    tabela['contagem'] = tabela['contagem'].astype(np.int32)
+    return tabela
+
+class IndiceHistorico:
+    """
+    Índice histórico de destinos por portaria x dia da semana x faixa horária
+
+    Guarda, para cada dia já processado, a tabela de frequências de
+    contar_entradas_historico (o dia da semana vem da data do dia). As tabelas
+    são gravadas em cache_dir/indice_historico, uma por dia (.npz), e apenas
+    os dias novos ou alterados são recalculados (atualizar).
+
+    A consulta de uma linha usa somente os dias anteriores à data da linha:
+    a média diária de entradas de cada destino na faixa horária, calculada
+    com os dias do mesmo dia da semana quando houver dados da portaria na
+    faixa, ou com todos os dias anteriores caso contrário. As médias de cada
+    data consultada são montadas uma vez; cada linha é então uma busca em
+    tabela hash (O(1)).
+    """
+
+    versao = 1
+
+    def __init__(self, faixa_minutos=None):
+        self.faixa_minutos = faixa_minutos or faixa_historico_minutos
+        self.dias = {}  # data -> tabela de frequências do dia
+        self._medias = {}  # data consultada -> (médias por destino, destino mais frequente por faixa)
+
+    def __len__(self):
+        return len(self.dias)
+
+    def _pasta(self):
+        return os.path.join(cache_dir, "indice_historico")
+
+    def _ler_manifesto(self):
+        try:
+            with open(os.path.join(self._pasta(), "indice.json"), encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifesto.get('versao') != self.versao or manifesto.get('faixa_minutos') != self.faixa_minutos:
+            return {}
+        return manifesto.get('dias', {})
+
+    def adicionar_dia(self, data, df):
+        """Inclui (ou substitui) as frequências de um dia a partir das entradas carregadas"""
+        self.dias[data] = contar_entradas_historico(df, self.faixa_minutos)
+        self._medias.clear()
+
+    def somar_dia(self, data, df):
+        """Soma às frequências de um dia as entradas de mais uma parte dele (modo em blocos)"""
+        tabela = contar_entradas_historico(df, self.faixa_minutos)
+        if data in self.dias:
+            tabela = pd.concat([self.dias[data], tabela], ignore_index=True) \
+                .groupby(['ide_portaria', 'faixa', 'ide_destino'], sort=True)['contagem'].sum().reset_index()
+        self.dias[data] = tabela
+        self._medias.clear()
+
+    def atualizar(self, arquivos_csv, persistir=True):
+        """
+        Carrega do disco os dias já indexados e indexa apenas os arquivos novos ou alterados
+
+        Returns:
+            int: quantidade de dias (re)calculados
+        """
+        manifesto = self._ler_manifesto() if persistir else {}
+        novos = 0
+        for arquivo in arquivos_csv:
+            data = data_do_arquivo(arquivo)
+            if data is None:
+                continue
+            chave = _chave_arquivo(arquivo)
+            registro = manifesto.get(os.path.basename(arquivo))
+            if registro and registro['chave'] == chave:
+                try:
+                    with np.load(os.path.join(self._pasta(), registro['arquivo'])) as dados:
+                        self.dias[data] = pd.DataFrame({nome: dados[nome] for nome in dados.files})
+                    continue
+                except (OSError, ValueError, KeyError):
+                    pass
+            df, _ = carregar_entradas(arquivo, usar_cache=persistir)
+            self.adicionar_dia(data, df)
+            novos += 1
+            if persistir:
+                os.makedirs(self._pasta(), exist_ok=True)
+                nome = f"{data:%Y%m%d}_{hashlib.sha256(arquivo.encode()).hexdigest()[:12]}.npz"
+                tabela = self.dias[data]
+                np.savez_compressed(os.path.join(self._pasta(), nome),
+                                    **{coluna: tabela[coluna].to_numpy() for coluna in tabela.columns})
+                manifesto[os.path.basename(arquivo)] = {'chave': chave, 'data': data.isoformat(), 'arquivo': nome}
+        if persistir and novos:
+            with open(os.path.join(self._pasta(), "indice.json"), 'w', encoding='utf-8') as f:
+                json.dump({'versao': self.versao, 'faixa_minutos': self.faixa_minutos, 'dias': manifesto},
+                          f, ensure_ascii=False, indent=1)
+        self._medias.clear()
+        return novos
+
+    def _medias_da_data(self, data):
+        """Médias diárias por (portaria, faixa, destino) e destino mais frequente por (portaria, faixa)"""
+        if data in self._medias:
+            return self._medias[data]
+        anteriores = {dia: tabela for dia, tabela in self.dias.items() if dia < data}
+        chaves = ['ide_portaria', 'faixa', 'ide_destino']
+        if not anteriores:
+            medias = pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([[], [], []], names=chaves))
+        else:
+            mesmo_dia = [tabela for dia, tabela in anteriores.items() if dia.weekday() == data.weekday()]
+            medias = (pd.concat(anteriores.values(), ignore_index=True).groupby(chaves)['contagem'].sum()
+                      / len(anteriores))
+            if mesmo_dia:
+                medias_semana = (pd.concat(mesmo_dia, ignore_index=True).groupby(chaves)['contagem'].sum()
+                                 / len(mesmo_dia))
+                # Faixas com dados do mesmo dia da semana usam apenas esses dias
+                faixas_semana = medias_semana.index.droplevel('ide_destino').unique()
+                medias = pd.concat([medias_semana,
+                                    medias[~medias.index.droplevel('ide_destino').isin(faixas_semana)]])
+        medias = medias.rename('media').sort_index()
+        topos = (medias.reset_index()
+                 .sort_values(['ide_portaria', 'faixa', 'media'], ascending=[True, True, False], kind='stable')
+                 .drop_duplicates(['ide_portaria', 'faixa'])
+                 .set_index(['ide_portaria', 'faixa']))
+        self._medias[data] = (medias, topos)
+        return medias, topos
+
+    def consultar(self, portarias, tempos_ns, destinos=None):
+        """
+        Consulta o índice para cada linha (portaria e horário em nanossegundos)
+
+        Returns:
+            sem destinos: (destino_historico, media_historico) - destino mais
+                frequente da faixa (NaN sem histórico) e sua média diária de entradas
+            com destinos: média diária de entradas de destinos[i] na faixa (0 sem histórico)
+        """
+        tempos = np.asarray(tempos_ns).astype('datetime64[ns]')
+        datas = tempos.astype('datetime64[D]')
+        faixas = (tempos - datas).astype('timedelta64[m]').astype(np.int64) // self.faixa_minutos
+        portarias = np.asarray(portarias)
+        media = np.zeros(len(tempos))
+        destino = np.full(len(tempos), np.nan, dtype=object)
+        for data in np.unique(datas):
+            linhas = np.flatnonzero(datas == data)
+            medias, topos = self._medias_da_data(data.astype(object))
+            if destinos is None:
+                posicoes = topos.index.get_indexer(pd.MultiIndex.from_arrays([portarias[linhas], faixas[linhas]]))
+                encontrados = posicoes >= 0
+                destino[linhas[encontrados]] = topos['ide_destino'].to_numpy()[posicoes[encontrados]]
+                media[linhas[encontrados]] = topos['media'].to_numpy()[posicoes[encontrados]]
+            else:
+                posicoes = medias.index.get_indexer(pd.MultiIndex.from_arrays(
+                    [portarias[linhas], faixas[linhas], np.asarray(destinos, dtype=object)[linhas]]))
+                encontrados = posicoes >= 0
+                media[linhas[encontrados]] = medias.to_numpy()[posicoes[encontrados]]
+        if destinos is None:
+            return destino, media
+        return media
+
+def preparar_indice_historico(arquivos_csv=None, usar_cache=True):
+    """
+    Monta (ou atualiza) o índice histórico com os arquivos datados da pasta input
+
+    Com usar_cache=False o índice é montado apenas em memória.
+    """
+    if arquivos_csv is None:
+        arquivos_csv = [os.path.join("input", arquivo) for arquivo in sorted(listar_arquivos_input())]
+    indice = IndiceHistorico()
+    novos = indice.atualizar(arquivos_csv, persistir=usar_cache)
+    print(f"📚 Índice histórico: {len(indice)} dia(s), {novos} indexado(s) agora "
+          f"(faixas de {indice.faixa_minutos} min)")
+    return indice
+
+def _texto_ranking(ranking):
+    """Junta os destinos de cada linha do ranking em texto ('25, 12, 7'); None onde não há destino"""
+    texto = np.full(len(ranking), None, dtype=object)
+    for k in range(ranking.shape[1]):
+        codigos, unicos = pd.factorize(ranking[:, k])
+        rotulos = np.array([str(destino) for destino in unicos] + [''], dtype=object)
+        presentes = codigos >= 0
+        if k == 0:
+            texto[presentes] = rotulos[codigos[presentes]]
+        else:
+            texto[presentes] = texto[presentes] + ', ' + rotulos[codigos[presentes]]
+    return texto
+
+def adicionar_colunas_simulacao(df_simulacoes, sugestoes_simulacoes=None, rankings_simulacoes=None, mostrar=True):
+    """
+    Cria as colunas Simulacao_N_Destino e Simulacao_N_Conferencia
+
+    Com rankings_simulacoes (modo top-K) cria também Simulacao_N_TopK, com os
+    destinos do ranking em texto, e Simulacao_N_TopK_Conferencia (1 se o
+    ide_destino está no ranking).
+
+    Args:
+        df_simulacoes: DataFrame que recebe as colunas
+        sugestoes_simulacoes: lista com as sugestões de cada simulação, na mesma
+            ordem das linhas de df_simulacoes (None quando não há ide_destino)
+        rankings_simulacoes: lista com a matriz do ranking de cada simulação
+            (calcular_sugestoes_ranking), na mesma ordem das linhas
+        mostrar: imprime os parâmetros de cada simulação
+    """
+    tem_ide_destino = 'ide_destino' in df_simulacoes.columns
+    
+    # Para cada simulação, cria uma nova coluna com sugestões de destino
+    for i, simulacao in enumerate(simulacoes, 1):
+        marcar_etapa(f"simulacao_{i}", registros=len(df_simulacoes))
+        nome_coluna = f"Simulacao_{i}_Destino"
+        nome_coluna_conferencia = f"Simulacao_{i}_Conferencia"
+        
+        if tem_ide_destino and sugestoes_simulacoes is not None:
+            df_simulacoes[nome_coluna] = np.asarray(sugestoes_simulacoes[i - 1])
+        else:
+            df_simulacoes[nome_coluna] = None
+        
+        # Cria coluna de conferência: 1 se simulação == ide_destino, 0 caso contrário
+        if tem_ide_destino:
+            sugestao = df_simulacoes[nome_coluna]
+            destino = df_simulacoes['ide_destino']
+            df_simulacoes[nome_coluna_conferencia] = (
+                sugestao.notna() & destino.notna() & (sugestao == destino)
+            ).astype(np.int64)
+        else:
+            # Se não há coluna ide_destino, não é possível fazer conferência
+            df_simulacoes[nome_coluna_conferencia] = 0
+        
+        if tem_ide_destino and rankings_simulacoes is not None:
+            ranking = rankings_simulacoes[i - 1]
+            destino = df_simulacoes['ide_destino']
+            acerto_ranking = np.zeros(len(df_simulacoes), dtype=bool)
+            for k in range(ranking.shape[1]):
+                candidato = pd.Series(ranking[:, k], index=df_simulacoes.index).infer_objects()
+                acerto_ranking |= (candidato.notna() & destino.notna() & (candidato == destino)).to_numpy(dtype=bool)
+            df_simulacoes[f"Simulacao_{i}_TopK"] = _texto_ranking(ranking)
+            df_simulacoes[f"Simulacao_{i}_TopK_Conferencia"] = acerto_ranking.astype(np.int64)
+        
+        if mostrar:
+            print(f"   ✓ {simulacao.get('descricao', f'Simulação {i}')}: {descrever_parametros(simulacao)}")
+    
+    return df_simulacoes
+
+def montar_resultados_longos(df_simulacoes, colunas=('ide_portaria',)):
+    """
+    Empilha os resultados das simulações em formato longo (simulação x linha)
+
+    Cada linha do resultado é uma entrada avaliada por uma simulação, com as
+    colunas de agrupamento pedidas, Sugerido (há sugestão) e Acerto (0/1).
+    """
+    quantidade = len(simulacoes)
+    longo = pd.concat([df_simulacoes[list(colunas)]] * quantidade, ignore_index=True)
+    longo.insert(0, 'Simulacao_Idx', np.repeat(np.arange(1, quantidade + 1), len(df_simulacoes)))
+    longo['Sugerido'] = np.concatenate([df_simulacoes[f"Simulacao_{i}_Destino"].notna().to_numpy()
+                                        for i in range(1, quantidade + 1)])
+    longo['Acerto'] = np.concatenate([df_simulacoes[f"Simulacao_{i}_Conferencia"].to_numpy(dtype=np.int64)
+                                      for i in range(1, quantidade + 1)])
+    if "Simulacao_1_TopK_Conferencia" in df_simulacoes.columns:
+        longo['Acerto_TopK'] = np.concatenate([
+            df_simulacoes[f"Simulacao_{i}_TopK_Conferencia"].to_numpy(dtype=np.int64)
+            for i in range(1, quantidade + 1)
+        ])
+    return longo
+
+def totalizar_estatisticas(df_longo, chaves):
+    """
+    Totais por grupo de chaves (Total_Registros, Total_Sugestoes, Total_Acertos
+    e, no modo top-K, Total_Acertos_TopK)
+
+    Totais de partes diferentes dos dados podem ser somados antes de
+    calcular as métricas (modo em blocos).
+    """
+    totais = {
+        'Total_Registros': ('Sugerido', 'size'),
+        'Total_Sugestoes': ('Sugerido', 'sum'),
+        'Total_Acertos': ('Acerto', 'sum'),
+    }
+    if 'Acerto_TopK' in df_longo.columns:
+        totais['Total_Acertos_TopK'] = ('Acerto_TopK', 'sum')
+    df_grupos = df_longo.groupby(list(chaves), observed=True, sort=True).agg(**totais).reset_index()
+    df_grupos['Total_Sugestoes'] = df_grupos['Total_Sugestoes'].astype(np.int64)
+    return df_grupos
+
+def calcular_metricas_estatisticas(df_grupos):
+    """
+    Acrescenta aos totais Precisao_Pct, Cobertura_Pct e Eficiencia_F1 (arredondadas)
+
+    Com Total_Acertos_TopK (modo top-K) acrescenta também Precisao_TopK_Pct
+    (acertos no ranking / sugestões), Cobertura_TopK_Pct (acertos no ranking /
+    registros) e Eficiencia_F1_TopK. O ranking aparece nas mesmas linhas que
+    a sugestão, então a cobertura de sugestões é a própria Cobertura_Pct.
+    """
+    precisao, cobertura, eficiencia = calcular_metricas(
+        df_grupos['Total_Registros'], df_grupos['Total_Sugestoes'], df_grupos['Total_Acertos']
+    )
+    df_grupos['Precisao_Pct'] = precisao
+    df_grupos['Cobertura_Pct'] = cobertura
+    df_grupos['Eficiencia_F1'] = eficiencia
+    df_grupos[['Precisao_Pct', 'Cobertura_Pct', 'Eficiencia_F1']] = \
+        df_grupos[['Precisao_Pct', 'Cobertura_Pct', 'Eficiencia_F1']].round(1)
+    if 'Total_Acertos_TopK' in df_grupos.columns:
+        precisao_top_k, _, eficiencia_top_k = calcular_metricas(
+            df_grupos['Total_Registros'], df_grupos['Total_Sugestoes'], df_grupos['Total_Acertos_TopK']
+        )
+        cobertura_top_k = df_grupos['Total_Acertos_TopK'] / df_grupos['Total_Registros'] * 100
+        df_grupos['Precisao_TopK_Pct'] = np.round(precisao_top_k, 1)
+        df_grupos['Cobertura_TopK_Pct'] = np.round(cobertura_top_k, 1)
+        df_grupos['Eficiencia_F1_TopK'] = np.round(eficiencia_top_k, 1)
+    return df_grupos
+
+def agregar_estatisticas(df_longo, chaves):
+    """
+    Totais e métricas (precisão, cobertura e F1) por grupo de chaves, em uma única agregação
+
+    Returns:
+        DataFrame: chaves + Total_Registros, Total_Sugestoes, Total_Acertos,
+            Precisao_Pct, Cobertura_Pct e Eficiencia_F1 (mais as colunas de
+            top-K quando houver Acerto_TopK)
+    """
+    return calcular_metricas_estatisticas(totalizar_estatisticas(df_longo, chaves))
+
+def _identificar_simulacoes(df_grupos, coluna_intervalo='Intervalo_Min'):
+    """
+    Troca Simulacao_Idx pelas colunas Simulacao, Descricao, intervalo e quantidade mínima
+
+    Com simulações no modo decaimento acrescenta a coluna da meia-vida (o
+    intervalo fica vazio nessas linhas e Qtd_Min_Entradas é a pontuação mínima);
+    com simulações no modo aproximado, as colunas Contadores e Fatias.
+    """
+    indices = df_grupos.pop('Simulacao_Idx').to_numpy() - 1
+    colunas_info = {
+        'Simulacao': [f"Simulação {i}" for i in range(1, len(simulacoes) + 1)],
+        'Descricao': [sim.get('descricao', f'Simulação {i}') for i, sim in enumerate(simulacoes, 1)],
+        coluna_intervalo: [sim.get('intervalo_minutos') for sim in simulacoes],
+    }
+    if any(modo_simulacao(sim) == 'decaimento' for sim in simulacoes):
+        # object mantém os minutos inteiros (sem virar 35.0) ao lado das linhas vazias
+        colunas_info[coluna_intervalo] = pd.Series(colunas_info[coluna_intervalo], dtype=object)
+        colunas_info[coluna_intervalo.replace('Intervalo', 'Meia_Vida')] = pd.Series(
+            [sim.get('meia_vida_minutos') for sim in simulacoes], dtype=object
+        )
+    if any(modo_simulacao(sim) == 'aproximado' for sim in simulacoes):
+        aproximadas = [modo_simulacao(sim) == 'aproximado' for sim in simulacoes]
+        for coluna, chave, padrao in (('Contadores', 'contadores', contadores_aproximado),
+                                      ('Fatias', 'fatias', fatias_aproximado)):
+            colunas_info[coluna] = pd.Series([sim.get(chave, padrao) if aproximada else None
+                                              for sim, aproximada in zip(simulacoes, aproximadas)], dtype=object)
+    colunas_info['Qtd_Min_Entradas'] = [sim['quantidade_minima_entradas'] for sim in simulacoes]
+    if any(historico_simulacao(sim) for sim in simulacoes):
+        colunas_info['Historico'] = [historico_simulacao(sim) for sim in simulacoes]
+    info = pd.DataFrame(colunas_info).iloc[indices].reset_index(drop=True)
+    return pd.concat([info, df_grupos.reset_index(drop=True)], axis=1)
+
+def calcular_estatisticas_simulacoes(df_simulacoes):
+    """
+    Calcula as estatísticas de acertos de cada simulação, no geral e por portaria
+
+    Todas as combinações são agregadas de uma vez sobre o formato longo
+    (montar_resultados_longos), sem filtrar o DataFrame por portaria.
+
+    Returns:
+        tuple: (df_stats_gerais, df_stats_portaria)
+    """
+    df_longo = montar_resultados_longos(df_simulacoes)
+    descricoes = None
+    if 'des_portaria' in df_simulacoes.columns:
+        # Descrição da primeira entrada de cada portaria
+        descricoes = df_simulacoes.drop_duplicates('ide_portaria').set_index('ide_portaria')['des_portaria']
+    return montar_estatisticas(totalizar_estatisticas(df_longo, ['Simulacao_Idx']),
+                               totalizar_estatisticas(df_longo, ['Simulacao_Idx', 'ide_portaria']),
+                               descricoes)
+
+def montar_estatisticas(totais_gerais, totais_portaria, descricoes=None):
+    """
+    Monta as tabelas Estatisticas_Gerais e Estatisticas_por_Portaria a partir dos totais
+
+    Args:
+        totais_gerais: totalizar_estatisticas por Simulacao_Idx
+        totais_portaria: totalizar_estatisticas por Simulacao_Idx e ide_portaria
+        descricoes: série ide_portaria -> des_portaria (opcional)
+
+    Returns:
+        tuple: (df_stats_gerais, df_stats_portaria)
+    """
+    # Estatísticas por portaria (cada linha = simulação + portaria)
+    df_stats_portaria = calcular_metricas_estatisticas(totais_portaria)
+    df_stats_portaria = df_stats_portaria.rename(columns={'ide_portaria': 'IDE_Portaria'})
+    if descricoes is not None:
+        descricoes_portaria = df_stats_portaria['IDE_Portaria'].map(descricoes).astype(object)
+    else:
+        descricoes_portaria = 'Portaria ' + df_stats_portaria['IDE_Portaria'].astype(str)
+    df_stats_portaria.insert(2, 'Descricao_Portaria', descricoes_portaria)
+    df_stats_portaria = _identificar_simulacoes(df_stats_portaria)
+
+    # Estatísticas gerais
+    df_stats_gerais = _identificar_simulacoes(calcular_metricas_estatisticas(totais_gerais),
+                                              coluna_intervalo='Intervalo_Minutos')
+    
+    return df_stats_gerais, df_stats_portaria
+
+def acrescentar_erros_aproximados(df_stats_gerais, df_stats_portaria, df_medidas, mascara=None):
+    """
+    Acrescenta às estatísticas das simulações aproximadas a memória e os erros
+    medidos por medir_simulacoes_aproximadas (vazios nas demais simulações)
+
+    - Memoria_Contadores: contadores por portaria, (fatias + 1) x contadores
+    - Divergencia_Exata_Pct: % das entradas com sugestão diferente do motor exato
+    - Erro_Contagem_Medio/_Max: erro medido da contagem do destino sugerido
+    - Limite_Erro_Medio/_Max: excesso máximo garantido da contagem sugerida
+
+    Args:
+        mascara: linhas do df medido que entram nas estatísticas (opcional)
+    """
+    if df_medidas is None:
+        return df_stats_gerais, df_stats_portaria
+    if mascara is not None:
+        df_medidas = df_medidas[np.asarray(mascara)[df_medidas['Linha'].to_numpy()]]
+
+    def resumir(chaves):
+        df_grupos = df_medidas.groupby(chaves, sort=True).agg(
+            Divergencia_Exata_Pct=('Divergente', 'mean'),
+            Erro_Contagem_Medio=('Erro_Contagem', 'mean'),
+            Erro_Contagem_Max=('Erro_Contagem', 'max'),
+            Limite_Erro_Medio=('Limite_Erro', 'mean'),
+            Limite_Erro_Max=('Limite_Erro', 'max'),
+        ).reset_index()
+        df_grupos['Divergencia_Exata_Pct'] *= 100
+        df_grupos = df_grupos.round(2)
+        indices = df_grupos.pop('Simulacao_Idx')
+        df_grupos.insert(0, 'Simulacao', [f"Simulação {i}" for i in indices])
+        df_grupos.insert(1, 'Memoria_Contadores', [
+            (simulacoes[i - 1].get('fatias', fatias_aproximado) + 1)
+            * simulacoes[i - 1].get('contadores', contadores_aproximado) for i in indices
+        ])
+        return df_grupos
+
+    df_stats_gerais = df_stats_gerais.merge(resumir(['Simulacao_Idx']), on='Simulacao', how='left')
+    df_stats_portaria = df_stats_portaria.merge(
+        resumir(['Simulacao_Idx', 'ide_portaria']).rename(columns={'ide_portaria': 'IDE_Portaria'}),
+        on=['Simulacao', 'IDE_Portaria'], how='left'
+    )
+    return df_stats_gerais, df_stats_portaria
+
+# Detalhamentos opcionais das estatísticas (--detalhar): nome -> aba/tabela gerada
+detalhamentos_estatisticas = {
+    'hora': 'Estatisticas_por_Hora',
+    'destino': 'Estatisticas_por_Destino',
+}
+
+def calcular_estatisticas_detalhadas(df_simulacoes, detalhamentos):
+    """
+    Estatísticas de cada simulação por hora do dia e/ou por destino real da entrada
+
+    Args:
+        df_simulacoes: DataFrame com as colunas de simulação e conferência
+        detalhamentos: nomes entre as chaves de detalhamentos_estatisticas
+
+    Returns:
+        dict: nome da aba -> DataFrame
+    """
+    tabelas = {}
+    for detalhamento in detalhamentos:
+        if detalhamento == 'hora':
+            df_chaves = pd.DataFrame({'Hora': df_simulacoes['tim_entrada'].dt.hour.to_numpy()})
+            chaves = ['Hora']
+        elif detalhamento == 'destino':
+            df_chaves = pd.DataFrame({'IDE_Destino': df_simulacoes['ide_destino'].to_numpy()})
+            chaves = ['IDE_Destino']
+        else:
+            raise ValueError(f"detalhamento desconhecido: {detalhamento} "
+                             f"(disponíveis: {', '.join(detalhamentos_estatisticas)})")
+        for i in range(1, len(simulacoes) + 1):
+            df_chaves[f"Simulacao_{i}_Destino"] = df_simulacoes[f"Simulacao_{i}_Destino"].to_numpy()
+            df_chaves[f"Simulacao_{i}_Conferencia"] = df_simulacoes[f"Simulacao_{i}_Conferencia"].to_numpy()
+            if f"Simulacao_{i}_TopK_Conferencia" in df_simulacoes.columns:
+                df_chaves[f"Simulacao_{i}_TopK_Conferencia"] = \
+                    df_simulacoes[f"Simulacao_{i}_TopK_Conferencia"].to_numpy()
+        df_grupos = agregar_estatisticas(montar_resultados_longos(df_chaves, chaves), ['Simulacao_Idx'] + chaves)
+        if detalhamento == 'destino' and 'desdestinoGenerico' in df_simulacoes.columns:
+            descricoes = df_simulacoes.drop_duplicates('ide_destino').set_index('ide_destino')['desdestinoGenerico']
+            df_grupos.insert(2, 'Descricao_Destino', df_grupos['IDE_Destino'].map(descricoes).astype(object))
+        tabelas[detalhamentos_estatisticas[detalhamento]] = _identificar_simulacoes(df_grupos)
+    return tabelas
+
+def montar_analise_sugestoes(df_stats_gerais, df_avaliacao, ordem=None, mascara=None, otimizar=False,
+                             workers=1, usar_cache=True, nome_grade=None):
+    """
+    Monta a aba Analise_e_Sugestoes com métricas medidas nos dados
+
+    Args:
+        df_stats_gerais: Estatísticas gerais das simulações atuais
+        df_avaliacao: Histórico usado para medir as novas combinações
+        ordem: Posição de cada linha no arquivo original, usada no desempate
+        mascara: Linhas de df_avaliacao consideradas nas métricas (as demais
+            servem apenas de histórico para as janelas)
+        otimizar: Avalia a grade_otimizacao completa
+        workers: Quantidade de processos usados na otimização
+        usar_cache: Reaproveita resultados da otimização gravados em cache_dir
+        nome_grade: Arquivo CSV onde a grade completa é gravada (opcional)
+
+    Returns:
+        tuple: (df_analise, df_otimizacao), df_otimizacao é None sem otimização
+    """
+    # Cria análise e sugestões de novas simulações
+    analise_sugestoes = []
+
+    # Análise dos resultados atuais
+    melhor_eficiencia = df_stats_gerais['Eficiencia_F1'].max()
+    melhor_precisao = df_stats_gerais['Precisao_Pct'].max()
+    melhor_cobertura = df_stats_gerais['Cobertura_Pct'].max()
+    melhor_simulacao = df_stats_gerais.loc[df_stats_gerais['Eficiencia_F1'].idxmax()]
+    if pd.notna(melhor_simulacao['Intervalo_Minutos']):
+        observacao_melhor = f"Intervalo: {melhor_simulacao['Intervalo_Minutos']} min"
+        if pd.notna(melhor_simulacao.get('Contadores')):
+            observacao_melhor += f" (aproximado, {melhor_simulacao['Contadores']} contadores)"
+    else:
+        observacao_melhor = f"Meia-vida: {melhor_simulacao['Meia_Vida_Minutos']} min (decaimento)"
+
+    # Análise de tendências
+    analise_sugestoes.append({
+        'Categoria': 'ANÁLISE ATUAL',
+        'Tipo': 'Melhor Eficiência Atual',
+        'Valor': f"{melhor_eficiencia:.1f}",
+        'Simulacao': melhor_simulacao['Simulacao'],
+        'Observacao': observacao_melhor
+    })
+
+    analise_sugestoes.append({
+        'Categoria': 'ANÁLISE ATUAL',
+        'Tipo': 'Tendência Observada',
+        'Valor': 'Intervalos maiores',
+        'Simulacao': 'Padrão identificado',
+        'Observacao': 'Intervalos maiores aumentam cobertura, mas reduzem precisão'
+    })
+
+    # Sugestões de novas simulações para atingir F1 > 40, medidas nos próprios dados
+    sugestoes_intervalos = [35, 40, 45, 60, 90]
+    sugestoes_qtd_min = [5, 7, 8, 12, 15]
+
+    df_grade_sugestoes = avaliar_grade(df_avaliacao, sugestoes_intervalos, sugestoes_qtd_min,
+                                       ordem=ordem, mascara=mascara, usar_cache=False)
+    df_grade_sugestoes = df_grade_sugestoes[df_grade_sugestoes['Escopo'] == 'Geral']
+    medidas_sugestoes = df_grade_sugestoes.set_index(['Intervalo_Min', 'Qtd_Min_Entradas'])
+
+    for i, (intervalo, qtd_min) in enumerate(zip(sugestoes_intervalos, sugestoes_qtd_min), 6):
+        medida = medidas_sugestoes.loc[(intervalo, qtd_min)]
+        status = "✅ PROMISSORA" if medida['Eficiencia_F1'] > 40 else "⚠️ REVISAR"
+
+        analise_sugestoes.append({
+            'Categoria': 'SUGESTÃO NOVA',
+            'Tipo': f'Simulação {i}',
+            'Valor': f"{medida['Eficiencia_F1']:.1f} (medido)",
+            'Simulacao': f"{intervalo} min, mín {qtd_min} entradas",
+            'Observacao': f"{status} - Precisão: {medida['Precisao_Pct']:.1f}%, Cobertura: {medida['Cobertura_Pct']:.1f}%"
+        })
+
+    # Modo de otimização: avalia a grade completa de parâmetros
+    df_otimizacao = None
+    df_melhores = df_grade_sugestoes
+    if otimizar:
+        print(f"\n🔎 Otimizando parâmetros: {len(grade_otimizacao['intervalos_minutos'])} intervalos x "
+              f"{len(grade_otimizacao['quantidades_minimas'])} quantidades mínimas...")
+        df_grade = avaliar_grade(df_avaliacao, grade_otimizacao['intervalos_minutos'],
+                                 grade_otimizacao['quantidades_minimas'],
+                                 ordem=ordem, mascara=mascara, workers=workers, usar_cache=usar_cache)
+        if nome_grade:
+            df_grade.to_csv(nome_grade, index=False)
+            print(f"📁 Grade completa: {nome_grade}")
+
+        df_otimizacao = df_grade[df_grade['Fronteira_Pareto']].drop(columns='Fronteira_Pareto')
+        df_otimizacao = df_otimizacao.sort_values(['Escopo', 'IDE_Portaria', 'Eficiencia_F1'],
+                                                  ascending=[True, True, False], kind='stable')
+        df_melhores = df_grade[df_grade['Escopo'] == 'Geral']
+
+        df_melhores_escopo = df_grade.sort_values('Eficiencia_F1', ascending=False, kind='stable') \
+            .drop_duplicates(['Escopo', 'IDE_Portaria']).sort_values(['Escopo', 'IDE_Portaria'])
+        for _, melhor in df_melhores_escopo.iterrows():
+            analise_sugestoes.append({
+                'Categoria': 'OTIMIZAÇÃO',
+                'Tipo': f"Melhor F1 - {melhor['Descricao_Portaria']}",
+                'Valor': f"{melhor['Eficiencia_F1']:.1f} (medido)",
+                'Simulacao': f"{melhor['Intervalo_Min']} min, mín {melhor['Qtd_Min_Entradas']} entradas",
+                'Observacao': f"Precisão: {melhor['Precisao_Pct']:.1f}%, Cobertura: {melhor['Cobertura_Pct']:.1f}%"
+            })
+
+    melhor_medida = df_melhores.sort_values('Eficiencia_F1', ascending=False, kind='stable').iloc[0]
+
+    # Sugestões estratégicas
+    analise_sugestoes.append({
+        'Categoria': 'ESTRATÉGIA',
+        'Tipo': 'Otimização Híbrida',
+        'Valor': 'Combinação',
+        'Simulacao': '25 min + 50 min, mín 6 entradas',
+        'Observacao': 'Usar simulações complementares para diferentes horários/contextos'
+    })
+
+    analise_sugestoes.append({
+        'Categoria': 'ESTRATÉGIA',
+        'Tipo': 'Ajuste Quantidade Mínima',
+        'Valor': 'Reduzir limite',
+        'Simulacao': 'Intervalos 20-40 min, mín 3-7 entradas',
+        'Observacao': 'Reduzir quantidade mínima pode aumentar cobertura significativamente'
+    })
+
+    analise_sugestoes.append({
+        'Categoria': 'RECOMENDAÇÃO',
+        'Tipo': 'Próximo Teste',
+        'Valor': 'Alta prioridade',
+        'Simulacao': f"{melhor_medida['Intervalo_Min']} min, mín {melhor_medida['Qtd_Min_Entradas']} entradas",
+        'Observacao': f"Maior F1-Score medido ({melhor_medida['Eficiencia_F1']:.1f}) entre as combinações avaliadas"
+    })
+
+    df_analise = pd.DataFrame(analise_sugestoes)
+    
+    return df_analise, df_otimizacao
+
+def montar_sequencias_destinos(df_simulacoes):
+    """
+    Monta a aba Sequencias_Destinos: ordem em que cada destino passou a ser
+    sugerido por portaria e simulação
+
+    As sugestões de todas as simulações são ordenadas uma única vez (portaria,
+    horário) e a primeira ocorrência e o total de cada destino saem de uma
+    agregação agrupada; a descrição do destino vem de um mapa
+    (portaria, ide_destino) -> desdestinoGenerico montado antes.
+    """
+    colunas = [f"Simulacao_{i}_Destino" for i in range(1, len(simulacoes) + 1)
+               if f"Simulacao_{i}_Destino" in df_simulacoes.columns]
+    if df_simulacoes.empty or not colunas:
+        return pd.DataFrame()
+
+    # Portarias na ordem em que aparecem e ordem (portaria, horário) das linhas
+    codigos_portaria, portarias = pd.factorize(df_simulacoes['ide_portaria'])
+    posicoes = np.lexsort((df_simulacoes['tim_entrada'].to_numpy(), codigos_portaria))
+    sequencia = np.empty(len(posicoes), dtype=np.int64)
+    sequencia[posicoes] = np.arange(len(posicoes))
+
+    # Sugestões em formato longo (simulação x linha), apenas as não nulas
+    partes = []
+    for coluna in colunas:
+        destinos = df_simulacoes[coluna].to_numpy(dtype=float)
+        validos = np.flatnonzero(~np.isnan(destinos))
+        partes.append(pd.DataFrame({
+            'Codigo_Portaria': codigos_portaria[validos],
+            'Simulacao_Idx': int(coluna.split('_')[1]),
+            'Sequencia': sequencia[validos],
+            'Ide_Destino': destinos[validos],
+            'Linha': validos,
+        }))
+    df_longo = pd.concat(partes, ignore_index=True)
+    if df_longo.empty:
+        return pd.DataFrame()
+    df_longo = df_longo.sort_values(['Codigo_Portaria', 'Simulacao_Idx', 'Sequencia'], kind='stable')
+    
+    chaves = ['Codigo_Portaria', 'Simulacao_Idx', 'Ide_Destino']
+    totais = df_longo.groupby(chaves, sort=False).size().rename('Total_Vezes_Sugerido')
+    df_primeiras = df_longo.drop_duplicates(chaves).join(totais, on=chaves)
+    df_primeiras['Ordem_Sugestao'] = df_primeiras.groupby(['Codigo_Portaria', 'Simulacao_Idx']).cumcount() + 1
+
+    # Descrição da portaria (sua primeira linha) e do destino (primeira linha da portaria com aquele ide_destino)
+    df_primeiras['Portaria'] = portarias[df_primeiras['Codigo_Portaria'].to_numpy()]
+    if 'des_portaria' in df_simulacoes.columns:
+        _, primeiras_linhas = np.unique(codigos_portaria, return_index=True)
+        descricoes_portaria = df_simulacoes['des_portaria'].astype(object).to_numpy()[primeiras_linhas]
+        df_primeiras['Desc_Portaria'] = descricoes_portaria[df_primeiras['Codigo_Portaria'].to_numpy()]
+    else:
+        df_primeiras['Desc_Portaria'] = [f'Portaria_{p}' for p in df_primeiras['Portaria']]
+    
+    descricoes_destino = {}
+    if 'desdestinoGenerico' in df_simulacoes.columns:
+        df_destinos = pd.DataFrame({
+            'Codigo_Portaria': codigos_portaria,
+            'Ide_Destino': df_simulacoes['ide_destino'].to_numpy(dtype=float),
+            'Desc_Destino': df_simulacoes['desdestinoGenerico'].astype(object).to_numpy(),
+        }).drop_duplicates(['Codigo_Portaria', 'Ide_Destino'])
+        descricoes_destino = dict(zip(zip(df_destinos['Codigo_Portaria'], df_destinos['Ide_Destino']),
+                                      df_destinos['Desc_Destino']))
+    df_primeiras['Desc_Destino'] = [
+        descricoes_destino.get((c, d), f'Destino_{d}')
+        for c, d in zip(df_primeiras['Codigo_Portaria'], df_primeiras['Ide_Destino'])
+    ]
+    
+    df_primeiras['Simulacao'] = 'Simulação ' + df_primeiras['Simulacao_Idx'].astype(str)
+    df_primeiras['Horario_Primeira_Sugestao'] = df_simulacoes['tim_entrada'].to_numpy()[df_primeiras['Linha'].to_numpy()]
+    
+    df_sequencias = df_primeiras[['Portaria', 'Desc_Portaria', 'Simulacao', 'Ordem_Sugestao', 'Ide_Destino',
+                                  'Desc_Destino', 'Horario_Primeira_Sugestao', 'Total_Vezes_Sugerido']]
+    return df_sequencias.reset_index(drop=True)
+
+def formatar_colunas_data_hora(ws, df):
+    """Aplica formato_data_hora_excel às colunas de data/hora do df gravado em ws"""
+    for col_idx, (nome, serie) in enumerate(df.items(), 1):
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            for (cell,) in ws.iter_rows(min_row=2, max_row=len(df) + 1, min_col=col_idx, max_col=col_idx):
+                cell.number_format = formato_data_hora_excel
+
+def gravar_planilha_simulacoes(nome_excel, df_simulacoes, df_stats_gerais, df_stats_portaria,
+                               df_analise, df_sequencias, df_otimizacao=None, tabelas_detalhadas=None):
+    """
+    Salva a planilha de simulações com múltiplas abas e formatação
+
+    tabelas_detalhadas (nome da aba -> DataFrame, de calcular_estatisticas_detalhadas)
+    são gravadas ao final, com o mesmo mapa de calor das métricas.
+    """
+    # Salva o arquivo Excel com múltiplas abas e formatação
+    with pd.ExcelWriter(nome_excel, engine='openpyxl') as writer:
+        # Aba principal com dados e simulações
+        marcar_etapa('escrita_abas', registros=len(df_simulacoes))
+        df_simulacoes.to_excel(writer, sheet_name='Dados_e_Simulacoes', index=False)
+        formatar_colunas_data_hora(writer.sheets['Dados_e_Simulacoes'], df_simulacoes)
+
+        # Aba com estatísticas gerais
+        df_stats_gerais.to_excel(writer, sheet_name='Estatisticas_Gerais', index=False)
+
+        # Aba com estatísticas por portaria
+        df_stats_portaria.to_excel(writer, sheet_name='Estatisticas_por_Portaria', index=False)
+
+        # Aba com análise e sugestões
+        df_analise.to_excel(writer, sheet_name='Analise_e_Sugestoes', index=False)
+
+        # Salvar aba de sequências de destinos
+        df_sequencias.to_excel(writer, sheet_name='Sequencias_Destinos', index=False)
+        formatar_colunas_data_hora(writer.sheets['Sequencias_Destinos'], df_sequencias)
+
+        # Aba com a fronteira de Pareto medida no modo de otimização
+        if df_otimizacao is not None:
+            df_otimizacao.to_excel(writer, sheet_name='Otimizacao_Parametros', index=False)
+
+        # Abas de estatísticas detalhadas (--detalhar)
+        for nome_aba, df_detalhe in (tabelas_detalhadas or {}).items():
+            df_detalhe.to_excel(writer, sheet_name=nome_aba, index=False)
+
+        # Aplica formatação condicional nas abas de estatísticas
+        from openpyxl.formatting.rule import ColorScaleRule
+        from openpyxl.styles import Font, Alignment
+
+        # Formatação para Estatísticas Gerais
+        marcar_etapa('formatacao_Estatisticas_Gerais', registros=len(df_stats_gerais))
+        ws_gerais = writer.sheets['Estatisticas_Gerais']
+
+        # Encontra as colunas de Precisão, Cobertura e Eficiência
+        header_row = 1
+        precisao_col = None
+        cobertura_col = None
+        eficiencia_col = None
+
+        for col_idx, cell in enumerate(ws_gerais[header_row], 1):
+            if cell.value == 'Precisao_Pct':
+                precisao_col = col_idx
+            elif cell.value == 'Cobertura_Pct':
+                cobertura_col = col_idx
+            elif cell.value == 'Eficiencia_F1':
+                eficiencia_col = col_idx
+
+        # Aplica formatação condicional verde para Precisão
+        if precisao_col:
+            precisao_range = f"{ws_gerais.cell(row=2, column=precisao_col).coordinate}:{ws_gerais.cell(row=len(df_stats_gerais)+1, column=precisao_col).coordinate}"
+            rule_precisao = ColorScaleRule(start_type='min', start_color='E8F5E8',
+                                         mid_type='percentile', mid_value=50, mid_color='A8D8A8',
+                                         end_type='max', end_color='2E7D32')
+            ws_gerais.conditional_formatting.add(precisao_range, rule_precisao)
+
+        # Aplica formatação condicional verde para Cobertura
+        if cobertura_col:
+            cobertura_range = f"{ws_gerais.cell(row=2, column=cobertura_col).coordinate}:{ws_gerais.cell(row=len(df_stats_gerais)+1, column=cobertura_col).coordinate}"
+            rule_cobertura = ColorScaleRule(start_type='min', start_color='E8F5E8',
+                                          mid_type='percentile', mid_value=50, mid_color='A8D8A8',
+                                          end_type='max', end_color='2E7D32')
+            ws_gerais.conditional_formatting.add(cobertura_range, rule_cobertura)
+
+        # Aplica formatação condicional especial para Eficiência (tons de verde mais intensos)
+        if eficiencia_col:
+            eficiencia_range = f"{ws_gerais.cell(row=2, column=eficiencia_col).coordinate}:{ws_gerais.cell(row=len(df_stats_gerais)+1, column=eficiencia_col).coordinate}"
+            rule_eficiencia = ColorScaleRule(start_type='min', start_color='F1F8E9',
+                                            mid_type='percentile', mid_value=50, mid_color='66BB6A',
+                                            end_type='max', end_color='1B5E20')
+            ws_gerais.conditional_formatting.add(eficiencia_range, rule_eficiencia)
+
+        # Função para ajustar cor do texto baseada no valor (para mapa de calor)
+        def ajustar_cor_texto_por_valor(ws, df, colunas_percentuais):
+            """Ajusta a cor do texto baseada na intensidade do valor"""
+            for col_info in colunas_percentuais:
+                col_idx = col_info['col_idx']
+                col_name = col_info['col_name']
+
+                if col_idx and col_name in df.columns:
+                    valores = df[col_name]
+                    valor_min = valores.min()
+                    valor_max = valores.max()
+
+                    for row_idx in range(2, len(df) + 2):  # Pula cabeçalho
+                        cell = ws.cell(row=row_idx, column=col_idx)
+                        valor = valores.iloc[row_idx - 2]
+
+                        if pd.notna(valor) and valor_max > valor_min:
+                            # Normaliza o valor (0 a 1)
+                            intensidade = (valor - valor_min) / (valor_max - valor_min)
+
+                            # Define cor do texto baseada na intensidade
+                            if intensidade >= 0.7:  # Valores altos = fundo escuro = texto claro
+                                cor_texto = 'FFFFFF'  # Branco
+                            elif intensidade >= 0.4:  # Valores médios = fundo médio = texto escuro
+                                cor_texto = '2E2E2E'  # Cinza escuro
+                            else:  # Valores baixos = fundo claro = texto escuro
+                                cor_texto = '000000'  # Preto
+
+                            # Aplica a cor do texto mantendo outras formatações
+                            cell.font = Font(color=cor_texto, bold=cell.font.bold if cell.font else False)
+
+        # Aplica ajuste de cor do texto para estatísticas gerais
+        colunas_gerais = [
+            {'col_idx': precisao_col, 'col_name': 'Precisao_Pct'},
+            {'col_idx': cobertura_col, 'col_name': 'Cobertura_Pct'},
+            {'col_idx': eficiencia_col, 'col_name': 'Eficiencia_F1'}
+        ]
+        ajustar_cor_texto_por_valor(ws_gerais, df_stats_gerais, colunas_gerais)
+
+        # Formatação para cabeçalhos
+        for cell in ws_gerais[1]:
+            cell.font = Font(bold=True, color='000000')  # Cabeçalhos sempre pretos
+            cell.alignment = Alignment(horizontal='center')
+
+        # Formatação para Estatísticas por Portaria
+        marcar_etapa('formatacao_Estatisticas_por_Portaria', registros=len(df_stats_portaria))
+        ws_portaria = writer.sheets['Estatisticas_por_Portaria']
+
+        # Encontra as colunas de métricas para aplicar formatação condicional
+        portaria_precisao_col = None
+        portaria_cobertura_col = None  
+        portaria_eficiencia_col = None
+
+        for col_idx, cell in enumerate(ws_portaria[1], 1):
+            if cell.value == 'Precisao_Pct':
+                portaria_precisao_col = col_idx
+            elif cell.value == 'Cobertura_Pct':
+                portaria_cobertura_col = col_idx
+            elif cell.value == 'Eficiencia_F1':
+                portaria_eficiencia_col = col_idx
+
+        # Aplica formatação condicional nas colunas de métricas
+        if portaria_precisao_col:
+            precisao_range = f"{ws_portaria.cell(row=2, column=portaria_precisao_col).coordinate}:{ws_portaria.cell(row=len(df_stats_portaria)+1, column=portaria_precisao_col).coordinate}"
+            rule_precisao = ColorScaleRule(start_type='min', start_color='E8F5E8',
+                                         mid_type='percentile', mid_value=50, mid_color='A8D8A8',
+                                         end_type='max', end_color='2E7D32')
+            ws_portaria.conditional_formatting.add(precisao_range, rule_precisao)
+
+        if portaria_cobertura_col:
+            cobertura_range = f"{ws_portaria.cell(row=2, column=portaria_cobertura_col).coordinate}:{ws_portaria.cell(row=len(df_stats_portaria)+1, column=portaria_cobertura_col).coordinate}"
+            rule_cobertura = ColorScaleRule(start_type='min', start_color='E8F5E8',
+                                          mid_type='percentile', mid_value=50, mid_color='A8D8A8',
+                                          end_type='max', end_color='2E7D32')
+            ws_portaria.conditional_formatting.add(cobertura_range, rule_cobertura)
+
+        if portaria_eficiencia_col:
+            eficiencia_range = f"{ws_portaria.cell(row=2, column=portaria_eficiencia_col).coordinate}:{ws_portaria.cell(row=len(df_stats_portaria)+1, column=portaria_eficiencia_col).coordinate}"
+            rule_eficiencia = ColorScaleRule(start_type='min', start_color='F1F8E9',
+                                            mid_type='percentile', mid_value=50, mid_color='66BB6A',
+                                            end_type='max', end_color='1B5E20')
+            ws_portaria.conditional_formatting.add(eficiencia_range, rule_eficiencia)
+
+        # Aplica ajuste de cor do texto para estatísticas por portaria
+        colunas_portaria = [
+            {'col_idx': portaria_precisao_col, 'col_name': 'Precisao_Pct'},
+            {'col_idx': portaria_cobertura_col, 'col_name': 'Cobertura_Pct'},
+            {'col_idx': portaria_eficiencia_col, 'col_name': 'Eficiencia_F1'}
+        ]
+        # Remove entradas None
+        colunas_portaria = [col for col in colunas_portaria if col['col_idx'] is not None]
+
+        ajustar_cor_texto_por_valor(ws_portaria, df_stats_portaria, colunas_portaria)
+
+        # Formatação para cabeçalhos da aba de portarias
+        for cell in ws_portaria[1]:
+            cell.font = Font(bold=True, color='000000')  # Cabeçalhos sempre pretos
+            cell.alignment = Alignment(horizontal='center')
+
+        # Formatação para Análise e Sugestões
+        marcar_etapa('formatacao_Analise_e_Sugestoes', registros=len(df_analise))
+        ws_analise = writer.sheets['Analise_e_Sugestoes']
+
+        # Formatação especial por categoria
+        from openpyxl.styles import PatternFill
+
+        for row_idx, row in enumerate(ws_analise.iter_rows(min_row=2), 2):
+            categoria = row[0].value
+            tipo = row[1].value
+
+            # Cores de fundo baseadas na categoria
+            if categoria == 'ANÁLISE ATUAL':
+                fill_color = PatternFill(start_color='E3F2FD', end_color='E3F2FD', fill_type='solid')  # Azul claro
+            elif categoria == 'SUGESTÃO NOVA':
+                if '✅' in str(row[4].value):  # Observação com ✅
+                    fill_color = PatternFill(start_color='E8F5E8', end_color='E8F5E8', fill_type='solid')  # Verde claro
+                else:
+                    fill_color = PatternFill(start_color='FFF3E0', end_color='FFF3E0', fill_type='solid')  # Laranja claro
+            elif categoria == 'ESTRATÉGIA':
+                fill_color = PatternFill(start_color='F3E5F5', end_color='F3E5F5', fill_type='solid')  # Roxo claro
+            elif categoria == 'OTIMIZAÇÃO':
+                fill_color = PatternFill(start_color='FFFDE7', end_color='FFFDE7', fill_type='solid')  # Amarelo claro
+            elif categoria == 'RECOMENDAÇÃO':
+                fill_color = PatternFill(start_color='E0F2F1', end_color='E0F2F1', fill_type='solid')  # Verde água
+            else:
+                fill_color = None
+
+            if fill_color:
+                for cell in row:
+                    cell.fill = fill_color
+
+        # Formatação para cabeçalhos da aba de análise
+        for cell in ws_analise[1]:
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(horizontal='center')
+            cell.fill = PatternFill(start_color='2E7D32', end_color='2E7D32', fill_type='solid')  # Verde escuro
+            cell.font = Font(bold=True, color='FFFFFF')  # Texto branco
+
+        # Formatação para Sequências de Destinos
+        marcar_etapa('formatacao_Sequencias_Destinos', registros=len(df_sequencias))
+        ws_sequencias = writer.sheets['Sequencias_Destinos']
+
+        # Formatação para cabeçalhos da aba de sequências
+        for cell in ws_sequencias[1]:
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(horizontal='center')
+            cell.fill = PatternFill(start_color='1976D2', end_color='1976D2', fill_type='solid')  # Azul escuro
+            cell.font = Font(bold=True, color='FFFFFF')  # Texto branco
+
+        # Formatação alternada por portaria e simulação
+        if len(df_sequencias) > 0:
+            current_key = None
+            color_toggle = False
+
+            for row_idx, row in enumerate(ws_sequencias.iter_rows(min_row=2), 2):
+                portaria_value = row[0].value  # Coluna Portaria
+                simulacao_value = row[2].value  # Coluna Simulacao
+                key = f"{portaria_value}_{simulacao_value}"
+
+                # Alterna cor quando muda a combinação portaria+simulação
+                if current_key != key:
+                    current_key = key
+                    color_toggle = not color_toggle
+
+                # Aplica cor de fundo alternada
+                if color_toggle:
+                    fill_color = PatternFill(start_color='F5F5F5', end_color='F5F5F5', fill_type='solid')  # Cinza claro
+                else:
+                    fill_color = PatternFill(start_color='E8F4FD', end_color='E8F4FD', fill_type='solid')  # Azul muito claro
+
+                for cell in row:
+                    cell.fill = fill_color
+
+        # Formatação condicional para coluna de ordem
+        if len(df_sequencias) > 0:
+            # Encontra a coluna Ordem_Sugestao
+            ordem_col = None
+            for col_idx, cell in enumerate(ws_sequencias[1], 1):
+                if cell.value == 'Ordem_Sugestao':
+                    ordem_col = col_idx
+                    break
+
+            if ordem_col:
+                # Aplica formatação condicional na coluna de ordem
+                ordem_range = f"{ws_sequencias.cell(row=2, column=ordem_col).coordinate}:{ws_sequencias.cell(row=len(df_sequencias)+1, column=ordem_col).coordinate}"
+                rule_ordem = ColorScaleRule(start_type='min', start_color='E8F5E8',
+                                           mid_type='percentile', mid_value=50, mid_color='A8D8A8',
+                                           end_type='max', end_color='2E7D32')
+                ws_sequencias.conditional_formatting.add(ordem_range, rule_ordem)
+
+        # Formatação para Otimização de Parâmetros
+        marcar_etapa('formatacao_demais_abas')
+        planilhas_formatadas = [ws_gerais, ws_portaria, ws_analise, ws_sequencias]
+        if df_otimizacao is not None:
+            ws_otimizacao = writer.sheets['Otimizacao_Parametros']
+            for cell in ws_otimizacao[1]:
+                cell.alignment = Alignment(horizontal='center')
+                cell.fill = PatternFill(start_color='2E7D32', end_color='2E7D32', fill_type='solid')  # Verde escuro
+                cell.font = Font(bold=True, color='FFFFFF')  # Texto branco
+            planilhas_formatadas.append(ws_otimizacao)
+
+        # Formatação para Estatísticas detalhadas: mapa de calor nas métricas
+        for nome_aba, df_detalhe in (tabelas_detalhadas or {}).items():
+            ws_detalhe = writer.sheets[nome_aba]
+            for cell in ws_detalhe[1]:
+                cell.font = Font(bold=True, color='000000')  # Cabeçalhos sempre pretos
+                cell.alignment = Alignment(horizontal='center')
+            if len(df_detalhe) > 0:
+                for col_name, cores in (('Precisao_Pct', ('E8F5E8', 'A8D8A8', '2E7D32')),
+                                        ('Cobertura_Pct', ('E8F5E8', 'A8D8A8', '2E7D32')),
+                                        ('Eficiencia_F1', ('F1F8E9', '66BB6A', '1B5E20'))):
+                    col_idx = df_detalhe.columns.get_loc(col_name) + 1
+                    detalhe_range = f"{ws_detalhe.cell(row=2, column=col_idx).coordinate}:{ws_detalhe.cell(row=len(df_detalhe)+1, column=col_idx).coordinate}"
+                    ws_detalhe.conditional_formatting.add(detalhe_range, ColorScaleRule(
+                        start_type='min', start_color=cores[0],
+                        mid_type='percentile', mid_value=50, mid_color=cores[1],
+                        end_type='max', end_color=cores[2]))
+            planilhas_formatadas.append(ws_detalhe)
+
+        # Ajusta largura das colunas
+        marcar_etapa('largura_colunas')
+        for ws in planilhas_formatadas:
+            for column in ws.columns:
+                max_length = 0
+                column_letter = column[0].column_letter
+                for cell in column:
+                    try:
+                        if len(str(cell.value)) > max_length:
+                            max_length = len(str(cell.value))
+                    except:
+                        pass
+                adjusted_width = min(max_length + 2, 30)  # Aumentado para 30 para acomodar textos maiores
+                ws.column_dimensions[column_letter].width = adjusted_width
         
-        # Ordena os dados pelas colunas ide_portaria e tim_entrada
-        colunas_ordenacao = []
-        if 'ide_portaria' in df.columns:
-            colunas_ordenacao.append('ide_portaria')
-        if 'tim_entrada' in df.columns:
-            colunas_ordenacao.append('tim_entrada')
+        # Gravação do arquivo (ao fechar o ExcelWriter)
+        marcar_etapa('gravacao_arquivo')
+
+def _largura_colunas(df):
+    """
+    Largura de cada coluna como no ajuste da planilha padrão (maior texto + 2,
+    limitada a 30), calculada de forma vetorizada
+    """
+    larguras = []
+    for nome, serie in df.items():
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            # str(datetime) tem 26 caracteres com microssegundos e 19 sem
+            comprimentos = pd.Series(np.where(serie.dt.microsecond != 0, 26, 19), index=serie.index)
+        else:
+            comprimentos = serie.astype(str).str.len()
+        # Células vazias são contadas como 'None', como no ajuste padrão
+        comprimentos = comprimentos.where(serie.notna(), 4)
+        maior = max(len(str(nome)), int(comprimentos.max()) if len(comprimentos) else 0)
+        larguras.append(min(maior + 2, 30))
+    return larguras
+
+def _valores_celulas(df):
+    """Colunas do df como listas de valores Python (None nas células vazias)"""
+    return [serie.astype(object).where(serie.notna(), None).tolist() for _, serie in df.items()]
+
+def gravar_planilha_simulacoes_rapida(nome_excel, df_simulacoes, df_stats_gerais, df_stats_portaria,
+                                      df_analise, df_sequencias, df_otimizacao=None, tabelas_detalhadas=None):
+    """
+    Salva a mesma planilha de gravar_planilha_simulacoes em modo de escrita
+    contínua (openpyxl write_only), com memória constante
+
+    As linhas são gravadas uma única vez, em sequência; fontes e preenchimentos
+    são criados uma vez e reaproveitados, as cores de texto do mapa de calor são
+    calculadas por coluna e as larguras vêm de uma amostra vetorizada.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.formatting.rule import ColorScaleRule
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+    
+    # Estilos definidos uma única vez
+    alinhamento_centro = Alignment(horizontal='center')
+    fonte_cabecalho_preto = Font(bold=True, color='000000')
+    fonte_cabecalho_branco = Font(bold=True, color='FFFFFF')
+    fontes_intensidade = {cor: Font(color=cor, bold=False) for cor in ('FFFFFF', '2E2E2E', '000000')}
+    def preenchimento(cor):
+        return PatternFill(start_color=cor, end_color=cor, fill_type='solid')
+    preenchimentos_categoria = {
+        'ANÁLISE ATUAL': preenchimento('E3F2FD'),  # Azul claro
+        'OTIMIZAÇÃO': preenchimento('FFFDE7'),  # Amarelo claro
+        'ESTRATÉGIA': preenchimento('F3E5F5'),  # Roxo claro
+        'RECOMENDAÇÃO': preenchimento('E0F2F1'),  # Verde água
+    }
+    preenchimento_promissora = preenchimento('E8F5E8')  # Verde claro
+    preenchimento_revisar = preenchimento('FFF3E0')  # Laranja claro
+    preenchimentos_alternados = (preenchimento('E8F4FD'), preenchimento('F5F5F5'))  # Azul muito claro / cinza claro
+    
+    def regra_verde():
+        return ColorScaleRule(start_type='min', start_color='E8F5E8',
+                              mid_type='percentile', mid_value=50, mid_color='A8D8A8',
+                              end_type='max', end_color='2E7D32')
+    
+    def regra_eficiencia():
+        return ColorScaleRule(start_type='min', start_color='F1F8E9',
+                              mid_type='percentile', mid_value=50, mid_color='66BB6A',
+                              end_type='max', end_color='1B5E20')
+    
+    wb = Workbook(write_only=True)
+    
+    def cabecalho(ws, df, fonte=None, alinhamento=None, fill=None):
+        celulas = []
+        for nome in df.columns:
+            cell = WriteOnlyCell(ws, value=str(nome))
+            if fonte is not None:
+                cell.font = fonte
+            if alinhamento is not None:
+                cell.alignment = alinhamento
+            if fill is not None:
+                cell.fill = fill
+            celulas.append(cell)
+        ws.append(celulas)
+    
+    def ajustar_larguras(ws, df):
+        # No modo write_only as larguras precisam ser definidas antes das linhas
+        for col_idx, largura in enumerate(_largura_colunas(df), 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = largura
+    
+    def intervalo_coluna(df, nome):
+        letra = get_column_letter(df.columns.get_loc(nome) + 1)
+        return f"{letra}2:{letra}{len(df) + 1}"
+    
+    # Aba principal com dados e simulações
+    marcar_etapa('aba_Dados_e_Simulacoes', registros=len(df_simulacoes))
+    ws = wb.create_sheet('Dados_e_Simulacoes')
+    cabecalho(ws, df_simulacoes)
+    colunas_data_hora = [k for k, (_, serie) in enumerate(df_simulacoes.items())
+                         if pd.api.types.is_datetime64_any_dtype(serie)]
+    for linha in zip(*_valores_celulas(df_simulacoes)):
+        if colunas_data_hora:
+            linha = list(linha)
+            for k in colunas_data_hora:
+                if linha[k] is not None:
+                    cell = WriteOnlyCell(ws, value=linha[k])
+                    cell.number_format = formato_data_hora_excel
+                    linha[k] = cell
+        ws.append(linha)
+    
+    # Abas de estatísticas: mapa de calor e cor do texto por intensidade
+    for nome_aba, df in (('Estatisticas_Gerais', df_stats_gerais), ('Estatisticas_por_Portaria', df_stats_portaria)):
+        marcar_etapa(f'aba_{nome_aba}', registros=len(df))
+        ws = wb.create_sheet(nome_aba)
+        ajustar_larguras(ws, df)
+        colunas_metricas = {'Precisao_Pct': regra_verde, 'Cobertura_Pct': regra_verde, 'Eficiencia_F1': regra_eficiencia}
+        fontes_colunas = {}
+        for nome, regra in colunas_metricas.items():
+            if nome not in df.columns:
+                continue
+            ws.conditional_formatting.add(intervalo_coluna(df, nome), regra())
+            valores = df[nome].astype(float)
+            valor_min, valor_max = valores.min(), valores.max()
+            if valor_max > valor_min:
+                intensidade = ((valores - valor_min) / (valor_max - valor_min)).to_numpy()
+                cores = np.where(intensidade >= 0.7, 'FFFFFF', np.where(intensidade >= 0.4, '2E2E2E', '000000'))
+                cores = np.where(valores.notna().to_numpy(), cores, None)
+                fontes_colunas[df.columns.get_loc(nome)] = cores.tolist()
+        cabecalho(ws, df, fonte=fonte_cabecalho_preto, alinhamento=alinhamento_centro)
+        for r, linha in enumerate(zip(*_valores_celulas(df))):
+            linha = list(linha)
+            for k, cores in fontes_colunas.items():
+                if cores[r] is not None:
+                    cell = WriteOnlyCell(ws, value=linha[k])
+                    cell.font = fontes_intensidade[cores[r]]
+                    linha[k] = cell
+            ws.append(linha)
+    
+    # Aba com análise e sugestões: cor de fundo por categoria
+    marcar_etapa('aba_Analise_e_Sugestoes', registros=len(df_analise))
+    ws = wb.create_sheet('Analise_e_Sugestoes')
+    ajustar_larguras(ws, df_analise)
+    cabecalho(ws, df_analise, fonte=fonte_cabecalho_branco, alinhamento=alinhamento_centro,
+              fill=preenchimento('2E7D32'))
+    for linha in zip(*_valores_celulas(df_analise)):
+        categoria = linha[0]
+        if categoria == 'SUGESTÃO NOVA':
+            fill = preenchimento_promissora if '✅' in str(linha[4]) else preenchimento_revisar
+        else:
+            fill = preenchimentos_categoria.get(categoria)
+        if fill is not None:
+            celulas = []
+            for valor in linha:
+                cell = WriteOnlyCell(ws, value=valor)
+                cell.fill = fill
+                celulas.append(cell)
+            linha = celulas
+        ws.append(linha)
+    
+    # Aba de sequências: cor alternada por portaria + simulação
+    marcar_etapa('aba_Sequencias_Destinos', registros=len(df_sequencias))
+    ws = wb.create_sheet('Sequencias_Destinos')
+    ajustar_larguras(ws, df_sequencias)
+    if len(df_sequencias) > 0:
+        ws.conditional_formatting.add(intervalo_coluna(df_sequencias, 'Ordem_Sugestao'), regra_verde())
+    cabecalho(ws, df_sequencias, fonte=fonte_cabecalho_branco, alinhamento=alinhamento_centro,
+              fill=preenchimento('1976D2'))
+    if len(df_sequencias) > 0:
+        chaves = df_sequencias.iloc[:, 0].astype(str) + '_' + df_sequencias.iloc[:, 2].astype(str)
+        # Alterna a cor a cada mudança de combinação (a primeira linha usa o cinza claro)
+        alternancia = (chaves.ne(chaves.shift()).cumsum() % 2).tolist()
+        colunas_data_hora = [k for k, (_, serie) in enumerate(df_sequencias.items())
+                             if pd.api.types.is_datetime64_any_dtype(serie)]
+        for linha, toggle in zip(zip(*_valores_celulas(df_sequencias)), alternancia):
+            fill = preenchimentos_alternados[toggle]
+            celulas = []
+            for k, valor in enumerate(linha):
+                cell = WriteOnlyCell(ws, value=valor)
+                cell.fill = fill
+                if k in colunas_data_hora and valor is not None:
+                    cell.number_format = formato_data_hora_excel
+                celulas.append(cell)
+            ws.append(celulas)
+    
+    # Aba com a fronteira de Pareto medida no modo de otimização
+    if df_otimizacao is not None:
+        marcar_etapa('aba_Otimizacao_Parametros', registros=len(df_otimizacao))
+        ws = wb.create_sheet('Otimizacao_Parametros')
+        ajustar_larguras(ws, df_otimizacao)
+        cabecalho(ws, df_otimizacao, fonte=fonte_cabecalho_branco, alinhamento=alinhamento_centro,
+                  fill=preenchimento('2E7D32'))
+        for linha in zip(*_valores_celulas(df_otimizacao)):
+            ws.append(linha)
+    
+    # Abas de estatísticas detalhadas (--detalhar)
+    for nome_aba, df_detalhe in (tabelas_detalhadas or {}).items():
+        marcar_etapa(f'aba_{nome_aba}', registros=len(df_detalhe))
+        ws = wb.create_sheet(nome_aba)
+        ajustar_larguras(ws, df_detalhe)
+        if len(df_detalhe) > 0:
+            for nome, regra in (('Precisao_Pct', regra_verde), ('Cobertura_Pct', regra_verde),
+                                ('Eficiencia_F1', regra_eficiencia)):
+                ws.conditional_formatting.add(intervalo_coluna(df_detalhe, nome), regra())
+        cabecalho(ws, df_detalhe, fonte=fonte_cabecalho_preto, alinhamento=alinhamento_centro)
+        for linha in zip(*_valores_celulas(df_detalhe)):
+            ws.append(linha)
+    
+    marcar_etapa('gravacao_arquivo')
+    wb.save(nome_excel)
+
+def verificar_formatos_saida(formatos):
+    """
+    Valida a lista de formatos de saída antes do processamento
+
+    Raises:
+        ValueError: formato desconhecido
+        ImportError: parquet sem pyarrow/fastparquet instalado
+    """
+    desconhecidos = [f for f in formatos if f not in formatos_saida]
+    if desconhecidos:
+        raise ValueError(f"formato(s) de saída desconhecido(s): {', '.join(desconhecidos)} "
+                         f"(disponíveis: {', '.join(formatos_saida)})")
+    if 'parquet' in formatos:
+        import importlib.util
+        if importlib.util.find_spec('pyarrow') is None and importlib.util.find_spec('fastparquet') is None:
+            raise ImportError("o formato parquet requer o pacote pyarrow (pip install pyarrow)")
+
+def exportar_tabelas(caminho_base, tabelas, formatos):
+    """
+    Grava as tabelas de resultado nos formatos colunares/tabulares pedidos
+
+    Args:
+        caminho_base: Caminho de saída sem extensão (ex.: output/Entradas-28-10-2025)
+        tabelas: Dicionário nome da tabela -> DataFrame
+        formatos: Formatos entre 'parquet', 'csv' e 'sqlite' ('xlsx' é ignorado aqui)
+
+    Returns:
+        list: arquivos gerados
+    """
+    arquivos = []
+    for formato in formatos:
+        if formato == 'sqlite':
+            # Um único banco com uma tabela por aba
+            nome_banco = f"{caminho_base}.sqlite"
+            with sqlite3.connect(nome_banco) as conexao:
+                for nome, df in tabelas.items():
+                    df.to_sql(nome, conexao, if_exists='replace', index=False, chunksize=50000)
+            arquivos.append(nome_banco)
+        elif formato in ('parquet', 'csv'):
+            # Um arquivo por tabela
+            for nome, df in tabelas.items():
+                nome_arquivo = f"{caminho_base}_{nome}.{formato}"
+                if formato == 'parquet':
+                    df.to_parquet(nome_arquivo, index=False)
+                else:
+                    df.to_csv(nome_arquivo, index=False)
+                arquivos.append(nome_arquivo)
+    return arquivos
+
+class GravadorIncremental:
+    """
+    Grava uma tabela em partes, à medida que os blocos são processados
+
+    csv: acrescenta ao arquivo <base>_<Tabela>.csv (cabeçalho só na primeira parte);
+    sqlite: acrescenta à tabela de <base>.sqlite; parquet: um row group por
+    parte em <base>_<Tabela>.parquet (requer pyarrow).
+    """
+
+    def __init__(self, caminho_base, nome_tabela, formatos):
+        self.caminho_base = caminho_base
+        self.nome_tabela = nome_tabela
+        self.formatos = [formato for formato in formatos if formato != 'xlsx']
+        self.partes = 0
+        self._conexao = None
+        self._parquet = None
+        self.arquivos = []
+
+    def gravar(self, df):
+        if 'csv' in self.formatos:
+            arquivo = f"{self.caminho_base}_{self.nome_tabela}.csv"
+            df.to_csv(arquivo, mode='w' if self.partes == 0 else 'a', header=self.partes == 0, index=False)
+            if self.partes == 0:
+                self.arquivos.append(arquivo)
+        if 'sqlite' in self.formatos:
+            if self._conexao is None:
+                arquivo = f"{self.caminho_base}.sqlite"
+                self._conexao = sqlite3.connect(arquivo)
+                self.arquivos.append(f"{arquivo} (tabela {self.nome_tabela})")
+            df.to_sql(self.nome_tabela, self._conexao, if_exists='replace' if self.partes == 0 else 'append',
+                      index=False)
+        if 'parquet' in self.formatos:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._parquet is None:
+                arquivo = f"{self.caminho_base}_{self.nome_tabela}.parquet"
+                tabela = pa.Table.from_pandas(df, preserve_index=False)
+                self._parquet = pq.ParquetWriter(arquivo, tabela.schema)
+                self.arquivos.append(arquivo)
+            else:
+                tabela = pa.Table.from_pandas(df, schema=self._parquet.schema, preserve_index=False)
+            self._parquet.write_table(tabela)
+        self.partes += 1
+
+    def fechar(self):
+        if self._conexao is not None:
+            self._conexao.commit()
+            self._conexao.close()
+            self._conexao = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        return self.arquivos
+
+def csv_para_excel_simples(arquivo_csv, otimizar=False, workers=1, usar_cache=True, dividir_simulacoes=False,
+                           exportacao_inicial=False, escrita_rapida=False, formatos=('xlsx',), detalhar=(),
+                           mostrar_memoria=False, perfil=False, perfil_cprofile=False, top_k=0):
+    """
+    Converte arquivo CSV diretamente para Excel
+    
+    Args:
+        arquivo_csv: Caminho do arquivo CSV de entrada
+        otimizar: Avalia a grade_otimizacao e gera a aba Otimizacao_Parametros
+        workers: Quantidade de processos usados nas simulações e na otimização
+        usar_cache: Reaproveita resultados da otimização gravados em cache_dir
+        dividir_simulacoes: Além das portarias, divide as simulações entre os processos
+        exportacao_inicial: Grava também uma cópia simples dos dados antes das
+            simulações; por padrão a planilha é gravada uma única vez, ao final
+        escrita_rapida: Grava a planilha final em modo de escrita contínua
+            (gravar_planilha_simulacoes_rapida)
+        formatos: Formatos de saída (formatos_saida); sem 'xlsx' a planilha não é gravada
+        detalhar: Detalhamentos extras das estatísticas (chaves de detalhamentos_estatisticas)
+        mostrar_memoria: Imprime a memória ocupada por coluna das entradas carregadas
+        perfil: Mede cada etapa (tempo, CPU, registros e pico de memória) e grava
+            o relatório output/<arquivo>_perfil.json
+        perfil_cprofile: Com perfil, registra também as funções mais custosas do
+            cálculo das sugestões (cProfile)
+        top_k: Com valor maior que 0, gera também o ranking dos top_k destinos
+            (colunas Simulacao_N_TopK) e as métricas de top-K nas estatísticas
+    """
+    if perfil or perfil_cprofile:
+        iniciar_perfil(cprofile=perfil_cprofile)
+    try:
+        verificar_formatos_saida(formatos)
+        gravar_xlsx = 'xlsx' in formatos
         
-        if colunas_ordenacao:
-            df = df.sort_values(by=colunas_ordenacao)
-            print(f"📊 Dados ordenados por: {', '.join(colunas_ordenacao)}")
+        # Lê o CSV (ou o cache colunar de uma execução anterior)
+        with perfil_etapa('carga'):
+            df, _ = carregar_entradas(arquivo_csv, usar_cache=usar_cache)
+        if mostrar_memoria:
+            mostrar_relatorio_memoria(df)
+        
+        # Colunas de texto derivadas de tim_entrada, recriadas para a saída
+        df = adicionar_colunas_derivadas(df)
         
         # Criar pasta output se não existir
         output_dir = "output"
@@ -206,606 +3257,641 @@ def csv_para_excel_simples(arquivo_csv):
         nome_base = os.path.basename(arquivo_csv).replace('.csv', '.xlsx')
         nome_excel = os.path.join(output_dir, nome_base)
         
-        # Salva como Excel inicial
-        df.to_excel(nome_excel, index=False)
+        simulacoes_aplicaveis = 'ide_portaria' in df.columns and 'tim_entrada' in df.columns
         
-        print(f"✅ Conversão concluída!")
-        print(f"📁 Arquivo gerado: {nome_excel}")
+        # Salva como Excel inicial (sem simulações aplicáveis ele é o resultado final)
+        if gravar_xlsx and (exportacao_inicial or not simulacoes_aplicaveis):
+            with perfil_etapa('exportacao_inicial', registros=len(df)), \
+                    pd.ExcelWriter(nome_excel, engine='openpyxl') as writer:
+                df.to_excel(writer, index=False)
+                formatar_colunas_data_hora(writer.sheets['Sheet1'], df)
+            
+            print(f"✅ Conversão concluída!")
+            print(f"📁 Arquivo gerado: {nome_excel}")
         print(f"📊 Registros: {len(df):,}")
         print(f"📋 Colunas: {len(df.columns)}")
         
         # Aplica as simulações se as colunas necessárias existirem
-        if 'ide_portaria' in df.columns and 'tim_entrada' in df.columns:
+        if simulacoes_aplicaveis:
             print(f"\n🔄 Aplicando {len(simulacoes)} simulações...")
             
-            # Lê a planilha recém-criada para aplicar simulações
-            df_simulacoes = pd.read_excel(nome_excel)
+            # Trabalha sobre os dados em memória, mantendo os tipos (sem reler a planilha)
+            df_simulacoes = df.reset_index(drop=True)
             
-            # Para cada simulação, cria uma nova coluna com sugestões de destino
-            for i, simulacao in enumerate(simulacoes, 1):
-                nome_coluna = f"Simulacao_{i}_Destino"
-                nome_coluna_conferencia = f"Simulacao_{i}_Conferencia"
-                intervalo = simulacao['intervalo_minutos']
-                qtd_min = simulacao['quantidade_minima_entradas']
-                
-                # Verifica se existe coluna ide_destino
-                tem_ide_destino = 'ide_destino' in df_simulacoes.columns
-                
-                # Aplica a função obterSugestaoDestino para cada linha
-                if tem_ide_destino:
-                    df_simulacoes[nome_coluna] = df_simulacoes.apply(
-                        lambda row: obterSugestaoDestino(
-                            row['ide_portaria'], 
-                            row['tim_entrada'], 
-                            intervalo, 
-                            qtd_min,
-                            row['ide_destino']
-                        ), axis=1
-                    )
-                else:
-                    df_simulacoes[nome_coluna] = df_simulacoes.apply(
-                        lambda row: obterSugestaoDestino(
-                            row['ide_portaria'], 
-                            row['tim_entrada'], 
-                            intervalo, 
-                            qtd_min
-                        ), axis=1
-                    )
-                
-                # Cria coluna de conferência: 1 se simulação == ide_destino, 0 caso contrário
-                if tem_ide_destino:
-                    df_simulacoes[nome_coluna_conferencia] = df_simulacoes.apply(
-                        lambda row: 1 if (pd.notna(row[nome_coluna]) and 
-                                        pd.notna(row['ide_destino']) and 
-                                        row[nome_coluna] == row['ide_destino']) else 0, axis=1
-                    )
-                else:
-                    # Se não há coluna ide_destino, não é possível fazer conferência
-                    df_simulacoes[nome_coluna_conferencia] = 0
-                
-                print(f"   ✓ {simulacao.get('descricao', f'Simulação {i}')}: {intervalo}min, mín {qtd_min} entradas")
+            # Verifica se existe coluna ide_destino
+            tem_ide_destino = 'ide_destino' in df_simulacoes.columns
             
-            # Cria estatísticas detalhadas
+            # Calcula as sugestões de todas as simulações em uma única varredura
+            # (mesmo resultado de obterSugestaoDestino aplicada linha a linha;
+            # o índice do df preserva a ordem do arquivo para o desempate)
+            sugestoes_simulacoes = None
+            rankings_simulacoes = None
+            indice_historico = None
+            if tem_ide_destino and any(historico_simulacao(sim) for sim in simulacoes):
+                with perfil_etapa('indice_historico'):
+                    indice_historico = preparar_indice_historico(usar_cache=usar_cache)
+            cache_varreduras = CacheVarreduras() if usar_cache else None
             if tem_ide_destino:
-                # Obter informações das portarias
-                portarias = sorted(df_simulacoes['ide_portaria'].unique())
-                portarias_info = {}
-                for portaria in portarias:
-                    df_port = df_simulacoes[df_simulacoes['ide_portaria'] == portaria]
-                    desc_portaria = df_port['des_portaria'].iloc[0] if 'des_portaria' in df_port.columns else f'Portaria {portaria}'
-                    portarias_info[portaria] = {
-                        'descricao': desc_portaria,
-                        'total_registros': len(df_port)
-                    }
-                
-                # Cria DataFrame para estatísticas por portaria (cada linha = simulação + portaria)
-                estatisticas_portaria = []
-                
-                for i in range(1, len(simulacoes) + 1):
-                    simulacao_info = simulacoes[i-1]
-                    col_dest = f"Simulacao_{i}_Destino"
-                    col_conf = f"Simulacao_{i}_Conferencia"
-                    
-                    # Para cada portaria, cria uma linha separada com as estatísticas desta simulação
-                    for portaria in portarias:
-                        df_port = df_simulacoes[df_simulacoes['ide_portaria'] == portaria]
-                        desc_portaria = portarias_info[portaria]['descricao']
-                        
-                        total_sugestoes = df_port[col_dest].notna().sum()
-                        total_acertos = df_port[col_conf].sum()
-                        total_registros = len(df_port)
-                        
-                        if total_sugestoes > 0:
-                            precisao = (total_acertos / total_sugestoes) * 100
-                            cobertura = (total_sugestoes / total_registros) * 100
-                            # Calcula F1-Score (média harmônica entre precisão e cobertura)
-                            if precisao > 0 and cobertura > 0:
-                                eficiencia = 2 * (precisao * cobertura) / (precisao + cobertura)
-                            else:
-                                eficiencia = 0
-                        else:
-                            precisao = 0
-                            cobertura = 0
-                            eficiencia = 0
-                        
-                        # Linha individual para cada combinação simulação + portaria
-                        linha_stats = {
-                            'Simulacao': f"Simulação {i}",
-                            'Descricao': simulacao_info.get('descricao', f'Simulação {i}'),
-                            'Intervalo_Min': simulacao_info['intervalo_minutos'],
-                            'Qtd_Min_Entradas': simulacao_info['quantidade_minima_entradas'],
-                            'IDE_Portaria': portaria,
-                            'Descricao_Portaria': desc_portaria,
-                            'Total_Registros': total_registros,
-                            'Total_Sugestoes': total_sugestoes,
-                            'Total_Acertos': total_acertos,
-                            'Precisao_Pct': round(precisao, 1),
-                            'Cobertura_Pct': round(cobertura, 1),
-                            'Eficiencia_F1': round(eficiencia, 1)
-                        }
-                        
-                        estatisticas_portaria.append(linha_stats)
-                
-                df_stats_portaria = pd.DataFrame(estatisticas_portaria)
-                
-                # Cria estatísticas gerais
-                estatisticas_gerais = []
-                
-                for i in range(1, len(simulacoes) + 1):
-                    col_dest = f"Simulacao_{i}_Destino"
-                    col_conf = f"Simulacao_{i}_Conferencia"
-                    simulacao_info = simulacoes[i-1]
-                    
-                    total_sugestoes = df_simulacoes[col_dest].notna().sum()
-                    total_acertos = df_simulacoes[col_conf].sum()
-                    total_registros = len(df_simulacoes)
-                    
-                    if total_sugestoes > 0:
-                        precisao = (total_acertos / total_sugestoes) * 100
-                        cobertura = (total_sugestoes / total_registros) * 100
-                        # Calcula F1-Score (média harmônica entre precisão e cobertura)
-                        if precisao > 0 and cobertura > 0:
-                            eficiencia = 2 * (precisao * cobertura) / (precisao + cobertura)
-                        else:
-                            eficiencia = 0
-                    else:
-                        precisao = 0
-                        cobertura = 0
-                        eficiencia = 0
-                    
-                    linha_geral = {
-                        'Simulacao': f"Simulação {i}",
-                        'Descricao': simulacao_info.get('descricao', f'Simulação {i}'),
-                        'Intervalo_Minutos': simulacao_info['intervalo_minutos'],
-                        'Qtd_Min_Entradas': simulacao_info['quantidade_minima_entradas'],
-                        'Total_Registros': total_registros,
-                        'Total_Sugestoes': total_sugestoes,
-                        'Total_Acertos': total_acertos,
-                        'Precisao_Pct': round(precisao, 1),
-                        'Cobertura_Pct': round(cobertura, 1),
-                        'Eficiencia_F1': round(eficiencia, 1)
-                    }
-                    
-                    estatisticas_gerais.append(linha_geral)
-                
-                df_stats_gerais = pd.DataFrame(estatisticas_gerais)
-                
-                # Cria análise e sugestões de novas simulações
-                analise_sugestoes = []
-                
-                # Análise dos resultados atuais
-                melhor_eficiencia = df_stats_gerais['Eficiencia_F1'].max()
-                melhor_precisao = df_stats_gerais['Precisao_Pct'].max()
-                melhor_cobertura = df_stats_gerais['Cobertura_Pct'].max()
-                
-                # Análise de tendências
-                analise_sugestoes.append({
-                    'Categoria': 'ANÁLISE ATUAL',
-                    'Tipo': 'Melhor Eficiência Atual',
-                    'Valor': f"{melhor_eficiencia:.1f}",
-                    'Simulacao': df_stats_gerais.loc[df_stats_gerais['Eficiencia_F1'].idxmax(), 'Simulacao'],
-                    'Observacao': f"Intervalo: {df_stats_gerais.loc[df_stats_gerais['Eficiencia_F1'].idxmax(), 'Intervalo_Minutos']} min"
-                })
-                
-                analise_sugestoes.append({
-                    'Categoria': 'ANÁLISE ATUAL',
-                    'Tipo': 'Tendência Observada',
-                    'Valor': 'Intervalos maiores',
-                    'Simulacao': 'Padrão identificado',
-                    'Observacao': 'Intervalos maiores aumentam cobertura, mas reduzem precisão'
-                })
-                
-                # Sugestões de novas simulações para atingir F1 > 40
-                sugestoes_intervalos = [35, 40, 45, 60, 90]
-                sugestoes_qtd_min = [5, 7, 8, 12, 15]
-                
-                for i, (intervalo, qtd_min) in enumerate(zip(sugestoes_intervalos, sugestoes_qtd_min), 6):
-                    # Estimativa baseada na tendência atual
-                    # Fórmula empírica baseada nos dados atuais
-                    cobertura_estimada = min(95, 39.1 + (intervalo - 30) * 0.8)  # Baseado na tendência
-                    precisao_estimada = max(15, 36.9 - (intervalo - 30) * 0.3)   # Inversamente proporcional
-                    
-                    if cobertura_estimada > 0 and precisao_estimada > 0:
-                        eficiencia_estimada = 2 * (precisao_estimada * cobertura_estimada) / (precisao_estimada + cobertura_estimada)
+                with perfil_etapa('sugestoes', registros=len(df) * len(simulacoes), cprofile=True):
+                    if top_k:
+                        sugestoes_simulacoes, rankings_simulacoes = calcular_sugestoes_ranking(
+                            df, simulacoes, top_k, ordem=df.index, workers=workers,
+                            dividir_simulacoes=dividir_simulacoes, indice_historico=indice_historico,
+                            cache_varreduras=cache_varreduras
+                        )
                     else:
-                        eficiencia_estimada = 0
-                    
-                    status = "✅ PROMISSORA" if eficiencia_estimada > 40 else "⚠️ REVISAR"
-                    
-                    analise_sugestoes.append({
-                        'Categoria': 'SUGESTÃO NOVA',
-                        'Tipo': f'Simulação {i}',
-                        'Valor': f"{eficiencia_estimada:.1f} (estimado)",
-                        'Simulacao': f"{intervalo} min, mín {qtd_min} entradas",
-                        'Observacao': f"{status} - Precisão est: {precisao_estimada:.1f}%, Cobertura est: {cobertura_estimada:.1f}%"
-                    })
-                
-                # Sugestões estratégicas
-                analise_sugestoes.append({
-                    'Categoria': 'ESTRATÉGIA',
-                    'Tipo': 'Otimização Híbrida',
-                    'Valor': 'Combinação',
-                    'Simulacao': '25 min + 50 min, mín 6 entradas',
-                    'Observacao': 'Usar simulações complementares para diferentes horários/contextos'
-                })
-                
-                analise_sugestoes.append({
-                    'Categoria': 'ESTRATÉGIA',
-                    'Tipo': 'Ajuste Quantidade Mínima',
-                    'Valor': 'Reduzir limite',
-                    'Simulacao': 'Intervalos 20-40 min, mín 3-7 entradas',
-                    'Observacao': 'Reduzir quantidade mínima pode aumentar cobertura significativamente'
-                })
+                        sugestoes_simulacoes = calcular_sugestoes_multiplas(df, simulacoes, ordem=df.index, workers=workers,
+                                                                            dividir_simulacoes=dividir_simulacoes,
+                                                                            indice_historico=indice_historico,
+                                                                            cache_varreduras=cache_varreduras)
+                if cache_varreduras is not None and cache_varreduras.reaproveitadas:
+                    print(f"♻️ Varreduras: {cache_varreduras.reaproveitadas} reaproveitada(s) do cache, "
+                          f"{cache_varreduras.calculadas} calculada(s)")
+            
+            with perfil_etapa('conferencia', registros=len(df_simulacoes) * len(simulacoes)):
+                adicionar_colunas_simulacao(df_simulacoes, sugestoes_simulacoes, rankings_simulacoes)
+            
+            # Cria estatísticas detalhadas
+            if tem_ide_destino:
+                with perfil_etapa('estatisticas', registros=len(df_simulacoes) * len(simulacoes)):
+                    df_stats_gerais, df_stats_portaria = calcular_estatisticas_simulacoes(df_simulacoes)
+                    # Simulações aproximadas: memória e divergência em relação ao motor exato
+                    df_stats_gerais, df_stats_portaria = acrescentar_erros_aproximados(
+                        df_stats_gerais, df_stats_portaria,
+                        medir_simulacoes_aproximadas(df, simulacoes, ordem=df.index, workers=workers,
+                                                     cache_varreduras=cache_varreduras)
+                    )
+                    tabelas_detalhadas = calcular_estatisticas_detalhadas(df_simulacoes, detalhar)
                 
-                analise_sugestoes.append({
-                    'Categoria': 'RECOMENDAÇÃO',
-                    'Tipo': 'Próximo Teste',
-                    'Valor': 'Alta prioridade',
-                    'Simulacao': '35 min, mín 5 entradas',
-                    'Observacao': 'Maior potencial para F1-Score > 40 baseado na análise de tendências'
-                })
+                nome_grade = os.path.join(output_dir, nome_base.replace('.xlsx', '_grade_parametros.csv'))
+                with perfil_etapa('analise', registros=len(df)):
+                    df_analise, df_otimizacao = montar_analise_sugestoes(
+                        df_stats_gerais, df, ordem=df.index, otimizar=otimizar, workers=workers,
+                        usar_cache=usar_cache, nome_grade=nome_grade
+                    )
+                with perfil_etapa('sequencias', registros=len(df_simulacoes) * len(simulacoes)):
+                    df_sequencias = montar_sequencias_destinos(df_simulacoes)
                 
-                df_analise = pd.DataFrame(analise_sugestoes)
+                if gravar_xlsx:
+                    gravar_planilha = gravar_planilha_simulacoes_rapida if escrita_rapida else gravar_planilha_simulacoes
+                    with perfil_etapa('planilha', registros=len(df_simulacoes)):
+                        gravar_planilha(nome_excel, df_simulacoes, df_stats_gerais, df_stats_portaria,
+                                        df_analise, df_sequencias, df_otimizacao, tabelas_detalhadas)
                 
-                # Salva o arquivo Excel com múltiplas abas e formatação
-                with pd.ExcelWriter(nome_excel, engine='openpyxl') as writer:
-                    # Aba principal com dados e simulações
-                    df_simulacoes.to_excel(writer, sheet_name='Dados_e_Simulacoes', index=False)
-                    
-                    # Aba com estatísticas gerais
-                    df_stats_gerais.to_excel(writer, sheet_name='Estatisticas_Gerais', index=False)
-                    
-                    # Aba com estatísticas por portaria
-                    df_stats_portaria.to_excel(writer, sheet_name='Estatisticas_por_Portaria', index=False)
-                    
-                    # Aba com análise e sugestões
-                    df_analise.to_excel(writer, sheet_name='Analise_e_Sugestoes', index=False)
-                    
-                    # Criar aba de sequências de destinos por portaria
-                    sequencias_destinos = []
-                    
-                    # Para cada portaria, analisar as sequências de destinos sugeridos
-                    for portaria in df_simulacoes['ide_portaria'].unique():
-                        df_port = df_simulacoes[df_simulacoes['ide_portaria'] == portaria].copy()
-                        desc_portaria = df_port['des_portaria'].iloc[0] if 'des_portaria' in df_port.columns else f'Portaria_{portaria}'
-                        
-                        # Para cada simulação
-                        for i in range(1, len(simulacoes) + 1):
-                            col_dest = f"Simulacao_{i}_Destino"
-                            if col_dest in df_port.columns:
-                                # Ordenar por horário de entrada
-                                df_port_sorted = df_port.sort_values('tim_entrada')
-                                
-                                # Obter dados das sugestões (não nulas)
-                                df_sugestoes = df_port_sorted[df_port_sorted[col_dest].notna()][['tim_entrada', col_dest]].copy()
-                                
-                                if not df_sugestoes.empty:
-                                    # Para cada destino distinto sugerido, criar uma linha
-                                    destinos_processados = set()
-                                    ordem_destino = 1
-                                    
-                                    for _, row_sugestao in df_sugestoes.iterrows():
-                                        destino = row_sugestao[col_dest]
-                                        horario = row_sugestao['tim_entrada']
-                                        
-                                        # Se é a primeira vez que vemos este destino
-                                        if destino not in destinos_processados:
-                                            destinos_processados.add(destino)
-                                            
-                                            # Buscar descrição do destino nos dados originais
-                                            if 'desdestinoGenerico' in df_port.columns:
-                                                desc_rows = df_port[df_port['ide_destino'] == destino]['desdestinoGenerico']
-                                                if not desc_rows.empty:
-                                                    desc_destino = desc_rows.iloc[0]
-                                                else:
-                                                    desc_destino = f'Destino_{destino}'
-                                            else:
-                                                desc_destino = f'Destino_{destino}'
-                                            
-                                            # Contar quantas vezes este destino foi sugerido
-                                            count_destino = (df_sugestoes[col_dest] == destino).sum()
-                                            
-                                            sequencias_destinos.append({
-                                                'Portaria': portaria,
-                                                'Desc_Portaria': desc_portaria,
-                                                'Simulacao': f'Simulação {i}',
-                                                'Ordem_Sugestao': ordem_destino,
-                                                'Ide_Destino': destino,
-                                                'Desc_Destino': desc_destino,
-                                                'Horario_Primeira_Sugestao': horario,
-                                                'Total_Vezes_Sugerido': count_destino
-                                            })
-                                            
-                                            ordem_destino += 1
-                    
-                    # Criar DataFrame das sequências de destinos
-                    df_sequencias = pd.DataFrame(sequencias_destinos)
-                    
-                    # Salvar aba de sequências de destinos
-                    df_sequencias.to_excel(writer, sheet_name='Sequencias_Destinos', index=False)
-                    
-                    # Aplica formatação condicional nas abas de estatísticas
-                    from openpyxl.formatting.rule import ColorScaleRule
-                    from openpyxl.styles import Font, Alignment
-                    
-                    # Formatação para Estatísticas Gerais
-                    ws_gerais = writer.sheets['Estatisticas_Gerais']
-                    
-                    # Encontra as colunas de Precisão, Cobertura e Eficiência
-                    header_row = 1
-                    precisao_col = None
-                    cobertura_col = None
-                    eficiencia_col = None
-                    
-                    for col_idx, cell in enumerate(ws_gerais[header_row], 1):
-                        if cell.value == 'Precisao_Pct':
-                            precisao_col = col_idx
-                        elif cell.value == 'Cobertura_Pct':
-                            cobertura_col = col_idx
-                        elif cell.value == 'Eficiencia_F1':
-                            eficiencia_col = col_idx
-                    
-                    # Aplica formatação condicional verde para Precisão
-                    if precisao_col:
-                        precisao_range = f"{ws_gerais.cell(row=2, column=precisao_col).coordinate}:{ws_gerais.cell(row=len(df_stats_gerais)+1, column=precisao_col).coordinate}"
-                        rule_precisao = ColorScaleRule(start_type='min', start_color='E8F5E8',
-                                                     mid_type='percentile', mid_value=50, mid_color='A8D8A8',
-                                                     end_type='max', end_color='2E7D32')
-                        ws_gerais.conditional_formatting.add(precisao_range, rule_precisao)
-                    
-                    # Aplica formatação condicional verde para Cobertura
-                    if cobertura_col:
-                        cobertura_range = f"{ws_gerais.cell(row=2, column=cobertura_col).coordinate}:{ws_gerais.cell(row=len(df_stats_gerais)+1, column=cobertura_col).coordinate}"
-                        rule_cobertura = ColorScaleRule(start_type='min', start_color='E8F5E8',
-                                                      mid_type='percentile', mid_value=50, mid_color='A8D8A8',
-                                                      end_type='max', end_color='2E7D32')
-                        ws_gerais.conditional_formatting.add(cobertura_range, rule_cobertura)
-                    
-                    # Aplica formatação condicional especial para Eficiência (tons de verde mais intensos)
-                    if eficiencia_col:
-                        eficiencia_range = f"{ws_gerais.cell(row=2, column=eficiencia_col).coordinate}:{ws_gerais.cell(row=len(df_stats_gerais)+1, column=eficiencia_col).coordinate}"
-                        rule_eficiencia = ColorScaleRule(start_type='min', start_color='F1F8E9',
-                                                        mid_type='percentile', mid_value=50, mid_color='66BB6A',
-                                                        end_type='max', end_color='1B5E20')
-                        ws_gerais.conditional_formatting.add(eficiencia_range, rule_eficiencia)
-                    
-                    # Função para ajustar cor do texto baseada no valor (para mapa de calor)
-                    def ajustar_cor_texto_por_valor(ws, df, colunas_percentuais):
-                        """Ajusta a cor do texto baseada na intensidade do valor"""
-                        for col_info in colunas_percentuais:
-                            col_idx = col_info['col_idx']
-                            col_name = col_info['col_name']
-                            
-                            if col_idx and col_name in df.columns:
-                                valores = df[col_name]
-                                valor_min = valores.min()
-                                valor_max = valores.max()
-                                
-                                for row_idx in range(2, len(df) + 2):  # Pula cabeçalho
-                                    cell = ws.cell(row=row_idx, column=col_idx)
-                                    valor = valores.iloc[row_idx - 2]
-                                    
-                                    if pd.notna(valor) and valor_max > valor_min:
-                                        # Normaliza o valor (0 a 1)
-                                        intensidade = (valor - valor_min) / (valor_max - valor_min)
-                                        
-                                        # Define cor do texto baseada na intensidade
-                                        if intensidade >= 0.7:  # Valores altos = fundo escuro = texto claro
-                                            cor_texto = 'FFFFFF'  # Branco
-                                        elif intensidade >= 0.4:  # Valores médios = fundo médio = texto escuro
-                                            cor_texto = '2E2E2E'  # Cinza escuro
-                                        else:  # Valores baixos = fundo claro = texto escuro
-                                            cor_texto = '000000'  # Preto
-                                        
-                                        # Aplica a cor do texto mantendo outras formatações
-                                        cell.font = Font(color=cor_texto, bold=cell.font.bold if cell.font else False)
-                    
-                    # Aplica ajuste de cor do texto para estatísticas gerais
-                    colunas_gerais = [
-                        {'col_idx': precisao_col, 'col_name': 'Precisao_Pct'},
-                        {'col_idx': cobertura_col, 'col_name': 'Cobertura_Pct'},
-                        {'col_idx': eficiencia_col, 'col_name': 'Eficiencia_F1'}
-                    ]
-                    ajustar_cor_texto_por_valor(ws_gerais, df_stats_gerais, colunas_gerais)
-                    
-                    # Formatação para cabeçalhos
-                    for cell in ws_gerais[1]:
-                        cell.font = Font(bold=True, color='000000')  # Cabeçalhos sempre pretos
-                        cell.alignment = Alignment(horizontal='center')
-                    
-                    # Formatação para Estatísticas por Portaria
-                    ws_portaria = writer.sheets['Estatisticas_por_Portaria']
-                    
-                    # Encontra as colunas de métricas para aplicar formatação condicional
-                    portaria_precisao_col = None
-                    portaria_cobertura_col = None  
-                    portaria_eficiencia_col = None
-                    
-                    for col_idx, cell in enumerate(ws_portaria[1], 1):
-                        if cell.value == 'Precisao_Pct':
-                            portaria_precisao_col = col_idx
-                        elif cell.value == 'Cobertura_Pct':
-                            portaria_cobertura_col = col_idx
-                        elif cell.value == 'Eficiencia_F1':
-                            portaria_eficiencia_col = col_idx
-                    
-                    # Aplica formatação condicional nas colunas de métricas
-                    if portaria_precisao_col:
-                        precisao_range = f"{ws_portaria.cell(row=2, column=portaria_precisao_col).coordinate}:{ws_portaria.cell(row=len(df_stats_portaria)+1, column=portaria_precisao_col).coordinate}"
-                        rule_precisao = ColorScaleRule(start_type='min', start_color='E8F5E8',
-                                                     mid_type='percentile', mid_value=50, mid_color='A8D8A8',
-                                                     end_type='max', end_color='2E7D32')
-                        ws_portaria.conditional_formatting.add(precisao_range, rule_precisao)
-                    
-                    if portaria_cobertura_col:
-                        cobertura_range = f"{ws_portaria.cell(row=2, column=portaria_cobertura_col).coordinate}:{ws_portaria.cell(row=len(df_stats_portaria)+1, column=portaria_cobertura_col).coordinate}"
-                        rule_cobertura = ColorScaleRule(start_type='min', start_color='E8F5E8',
-                                                      mid_type='percentile', mid_value=50, mid_color='A8D8A8',
-                                                      end_type='max', end_color='2E7D32')
-                        ws_portaria.conditional_formatting.add(cobertura_range, rule_cobertura)
-                    
-                    if portaria_eficiencia_col:
-                        eficiencia_range = f"{ws_portaria.cell(row=2, column=portaria_eficiencia_col).coordinate}:{ws_portaria.cell(row=len(df_stats_portaria)+1, column=portaria_eficiencia_col).coordinate}"
-                        rule_eficiencia = ColorScaleRule(start_type='min', start_color='F1F8E9',
-                                                        mid_type='percentile', mid_value=50, mid_color='66BB6A',
-                                                        end_type='max', end_color='1B5E20')
-                        ws_portaria.conditional_formatting.add(eficiencia_range, rule_eficiencia)
-                    
-                    # Aplica ajuste de cor do texto para estatísticas por portaria
-                    colunas_portaria = [
-                        {'col_idx': portaria_precisao_col, 'col_name': 'Precisao_Pct'},
-                        {'col_idx': portaria_cobertura_col, 'col_name': 'Cobertura_Pct'},
-                        {'col_idx': portaria_eficiencia_col, 'col_name': 'Eficiencia_F1'}
-                    ]
-                    # Remove entradas None
-                    colunas_portaria = [col for col in colunas_portaria if col['col_idx'] is not None]
-                    
-                    ajustar_cor_texto_por_valor(ws_portaria, df_stats_portaria, colunas_portaria)
-                    
-                    # Formatação para cabeçalhos da aba de portarias
-                    for cell in ws_portaria[1]:
-                        cell.font = Font(bold=True, color='000000')  # Cabeçalhos sempre pretos
-                        cell.alignment = Alignment(horizontal='center')
-                    
-                    # Formatação para Análise e Sugestões
-                    ws_analise = writer.sheets['Analise_e_Sugestoes']
-                    
-                    # Formatação especial por categoria
-                    from openpyxl.styles import PatternFill
-                    
-                    for row_idx, row in enumerate(ws_analise.iter_rows(min_row=2), 2):
-                        categoria = row[0].value
-                        tipo = row[1].value
-                        
-                        # Cores de fundo baseadas na categoria
-                        if categoria == 'ANÁLISE ATUAL':
-                            fill_color = PatternFill(start_color='E3F2FD', end_color='E3F2FD', fill_type='solid')  # Azul claro
-                        elif categoria == 'SUGESTÃO NOVA':
-                            if '✅' in str(row[4].value):  # Observação com ✅
-                                fill_color = PatternFill(start_color='E8F5E8', end_color='E8F5E8', fill_type='solid')  # Verde claro
-                            else:
-                                fill_color = PatternFill(start_color='FFF3E0', end_color='FFF3E0', fill_type='solid')  # Laranja claro
-                        elif categoria == 'ESTRATÉGIA':
-                            fill_color = PatternFill(start_color='F3E5F5', end_color='F3E5F5', fill_type='solid')  # Roxo claro
-                        elif categoria == 'RECOMENDAÇÃO':
-                            fill_color = PatternFill(start_color='E0F2F1', end_color='E0F2F1', fill_type='solid')  # Verde água
-                        else:
-                            fill_color = None
-                        
-                        if fill_color:
-                            for cell in row:
-                                cell.fill = fill_color
-                    
-                    # Formatação para cabeçalhos da aba de análise
-                    for cell in ws_analise[1]:
-                        cell.font = Font(bold=True)
-                        cell.alignment = Alignment(horizontal='center')
-                        cell.fill = PatternFill(start_color='2E7D32', end_color='2E7D32', fill_type='solid')  # Verde escuro
-                        cell.font = Font(bold=True, color='FFFFFF')  # Texto branco
-                    
-                    # Formatação para Sequências de Destinos
-                    ws_sequencias = writer.sheets['Sequencias_Destinos']
-                    
-                    # Formatação para cabeçalhos da aba de sequências
-                    for cell in ws_sequencias[1]:
-                        cell.font = Font(bold=True)
-                        cell.alignment = Alignment(horizontal='center')
-                        cell.fill = PatternFill(start_color='1976D2', end_color='1976D2', fill_type='solid')  # Azul escuro
-                        cell.font = Font(bold=True, color='FFFFFF')  # Texto branco
-                    
-                    # Formatação alternada por portaria e simulação
-                    if len(df_sequencias) > 0:
-                        current_key = None
-                        color_toggle = False
-                        
-                        for row_idx, row in enumerate(ws_sequencias.iter_rows(min_row=2), 2):
-                            portaria_value = row[0].value  # Coluna Portaria
-                            simulacao_value = row[2].value  # Coluna Simulacao
-                            key = f"{portaria_value}_{simulacao_value}"
-                            
-                            # Alterna cor quando muda a combinação portaria+simulação
-                            if current_key != key:
-                                current_key = key
-                                color_toggle = not color_toggle
-                            
-                            # Aplica cor de fundo alternada
-                            if color_toggle:
-                                fill_color = PatternFill(start_color='F5F5F5', end_color='F5F5F5', fill_type='solid')  # Cinza claro
-                            else:
-                                fill_color = PatternFill(start_color='E8F4FD', end_color='E8F4FD', fill_type='solid')  # Azul muito claro
-                            
-                            for cell in row:
-                                cell.fill = fill_color
-                    
-                    # Formatação condicional para coluna de ordem
-                    if len(df_sequencias) > 0:
-                        # Encontra a coluna Ordem_Sugestao
-                        ordem_col = None
-                        for col_idx, cell in enumerate(ws_sequencias[1], 1):
-                            if cell.value == 'Ordem_Sugestao':
-                                ordem_col = col_idx
-                                break
-                        
-                        if ordem_col:
-                            # Aplica formatação condicional na coluna de ordem
-                            ordem_range = f"{ws_sequencias.cell(row=2, column=ordem_col).coordinate}:{ws_sequencias.cell(row=len(df_sequencias)+1, column=ordem_col).coordinate}"
-                            rule_ordem = ColorScaleRule(start_type='min', start_color='E8F5E8',
-                                                       mid_type='percentile', mid_value=50, mid_color='A8D8A8',
-                                                       end_type='max', end_color='2E7D32')
-                            ws_sequencias.conditional_formatting.add(ordem_range, rule_ordem)
-                    
-                    # Ajusta largura das colunas
-                    for ws in [ws_gerais, ws_portaria, ws_analise, ws_sequencias]:
-                        for column in ws.columns:
-                            max_length = 0
-                            column_letter = column[0].column_letter
-                            for cell in column:
-                                try:
-                                    if len(str(cell.value)) > max_length:
-                                        max_length = len(str(cell.value))
-                                except:
-                                    pass
-                            adjusted_width = min(max_length + 2, 30)  # Aumentado para 30 para acomodar textos maiores
-                            ws.column_dimensions[column_letter].width = adjusted_width
+                with perfil_etapa('exportacao_tabelas', registros=len(df_simulacoes)):
+                    arquivos_tabelas = exportar_tabelas(nome_excel[:-len('.xlsx')], {
+                        'Dados_e_Simulacoes': df_simulacoes,
+                        'Estatisticas_Gerais': df_stats_gerais,
+                        'Estatisticas_por_Portaria': df_stats_portaria,
+                        'Sequencias_Destinos': df_sequencias,
+                        **tabelas_detalhadas,
+                    }, formatos)
                 
                 print(f"\n✅ Simulações aplicadas com sucesso!")
                 print(f"📊 Novas colunas: {len(simulacoes)} simulações + {len(simulacoes)} conferências adicionadas")
-                print(f"📋 Criadas 5 abas: Dados_e_Simulacoes, Estatisticas_Gerais, Estatisticas_por_Portaria, Analise_e_Sugestoes, Sequencias_Destinos")
-                print(f"📈 Métrica de Eficiência F1-Score adicionada (combina precisão e cobertura)")
-                print(f"🎨 Formatação condicional aplicada: mapa de calor em tons de verde com ajuste automático da cor do texto")
-                print(f"🔍 Análise inteligente criada: sugestões para atingir F1-Score > 40")
-                print(f"🔄 Nova aba de Sequências de Destinos: mostra padrões de sugestões por portaria e simulação")
+                if rankings_simulacoes is not None:
+                    print(f"🏅 Modo top-{top_k}: colunas Simulacao_N_TopK e métricas Precisao_TopK_Pct/Cobertura_TopK_Pct")
+                if gravar_xlsx:
+                    print(f"📋 Criadas 5 abas: Dados_e_Simulacoes, Estatisticas_Gerais, Estatisticas_por_Portaria, Analise_e_Sugestoes, Sequencias_Destinos")
+                    print(f"📈 Métrica de Eficiência F1-Score adicionada (combina precisão e cobertura)")
+                    print(f"🎨 Formatação condicional aplicada: mapa de calor em tons de verde com ajuste automático da cor do texto")
+                    print(f"🔍 Análise inteligente criada: sugestões para atingir F1-Score > 40 (medidas nos dados)")
+                    if df_otimizacao is not None:
+                        print(f"🔎 Nova aba de Otimização de Parâmetros: fronteira de Pareto de precisão x cobertura")
+                    print(f"🔄 Nova aba de Sequências de Destinos: mostra padrões de sugestões por portaria e simulação")
+                for arquivo_tabela in arquivos_tabelas:
+                    print(f"📁 Tabela exportada: {arquivo_tabela}")
                 
                 # Mostra estatísticas de conferência
                 print(f"\n📈 Estatísticas de Acertos:")
                 for _, row in df_stats_gerais.iterrows():
                     print(f"   {row['Simulacao']}: {row['Total_Acertos']}/{row['Total_Sugestoes']} acertos ({row['Precisao_Pct']:.1f}% precisão, {row['Cobertura_Pct']:.1f}% cobertura, {row['Eficiencia_F1']:.1f} F1-Score)")
+                    if rankings_simulacoes is not None:
+                        print(f"      top-{top_k}: {row['Total_Acertos_TopK']} acertos ({row['Precisao_TopK_Pct']:.1f}% precisão, {row['Cobertura_TopK_Pct']:.1f}% cobertura)")
             
             else:
                 # Se não tem ide_destino, salva apenas os dados
-                df_simulacoes.to_excel(nome_excel, index=False)
+                if gravar_xlsx:
+                    with pd.ExcelWriter(nome_excel, engine='openpyxl') as writer:
+                        df_simulacoes.to_excel(writer, index=False)
+                        formatar_colunas_data_hora(writer.sheets['Sheet1'], df_simulacoes)
+                exportar_tabelas(nome_excel[:-len('.xlsx')], {'Dados_e_Simulacoes': df_simulacoes}, formatos)
                 print(f"\n✅ Simulações aplicadas com sucesso!")
                 print(f"📊 Novas colunas: {len(simulacoes)} simulações adicionadas")
         else:
             print(f"\n⚠️ Colunas 'ide_portaria' ou 'tim_entrada' não encontradas. Simulações não aplicadas.")
         
         print(f"🕐 Processado em: {datetime.now().strftime('%H:%M:%S')}")
+        encerrar_perfil(nome_excel[:-len('.xlsx')] + '_perfil.json', arquivo=arquivo_csv, registros=len(df),
+                        workers=workers, escrita_rapida=escrita_rapida, formatos=list(formatos), top_k=top_k)
         
         return nome_excel
         
     except Exception as e:
         print(f"❌ Erro: {e}")
         return None
+    finally:
+        # Perfil interrompido por erro não fica ativo para a próxima chamada
+        descartar_perfil()
+
+def gravar_planilha_resumo(nome_excel, abas):
+    """
+    Grava uma planilha de resumo (uma aba por tabela) com cabeçalho em negrito e colunas ajustadas
+
+    Args:
+        nome_excel: Caminho da planilha
+        abas: Dicionário nome da aba -> DataFrame
+    """
+    with pd.ExcelWriter(nome_excel, engine='openpyxl') as writer:
+        for nome, df in abas.items():
+            df.to_excel(writer, sheet_name=nome, index=False)
+        
+        from openpyxl.styles import Font, Alignment
+        for ws in writer.sheets.values():
+            for cell in ws[1]:
+                cell.font = Font(bold=True)
+                cell.alignment = Alignment(horizontal='center')
+            for column in ws.columns:
+                max_length = max(len(str(cell.value)) for cell in column)
+                ws.column_dimensions[column[0].column_letter].width = min(max_length + 2, 30)
+
+def processar_lote(arquivos_csv, otimizar=False, workers=1, usar_cache=True, dividir_simulacoes=False,
+                   escrita_rapida=False, formatos=('xlsx',), detalhar=(), mostrar_memoria=False, perfil=False,
+                   perfil_cprofile=False, top_k=0):
+    """
+    Processa vários arquivos CSV (um por dia) em uma única execução
+
+    Os arquivos são lidos uma única vez e concatenados em ordem cronológica,
+    formando um histórico contínuo: as janelas das entradas logo após a
+    meia-noite enxergam o final do dia anterior. Gera uma planilha por dia e
+    uma planilha consolidada com o resumo do período.
+
+    Args:
+        arquivos_csv: Caminhos dos arquivos CSV em ordem cronológica
+        otimizar: Avalia a grade_otimizacao em cada dia
+        workers: Quantidade de processos usados nas simulações e na otimização
+        usar_cache: Reaproveita resultados da otimização gravados em cache_dir
+        dividir_simulacoes: Além das portarias, divide as simulações entre os processos
+        escrita_rapida: Grava as planilhas diárias em modo de escrita contínua
+        formatos: Formatos de saída de cada dia (formatos_saida); o resumo
+            consolidado é sempre gravado em Excel
+        detalhar: Detalhamentos extras das estatísticas de cada dia
+        mostrar_memoria: Imprime a memória ocupada por coluna do histórico carregado
+        perfil: Mede cada etapa (carga, sugestões e cada dia) e grava o relatório
+            output/Resumo_Lote_<primeiro>_a_<ultimo>_perfil.json
+        perfil_cprofile: Com perfil, registra também as funções mais custosas do
+            cálculo das sugestões (cProfile)
+        top_k: Com valor maior que 0, gera também o ranking dos top_k destinos
+
+    Returns:
+        str ou None: caminho da planilha consolidada
+    """
+    if perfil or perfil_cprofile:
+        iniciar_perfil(cprofile=perfil_cprofile)
+    try:
+        verificar_formatos_saida(formatos)
+        if not arquivos_csv:
+            print("⚠️ Nenhum arquivo CSV encontrado para o lote.")
+            return None
+        
+        print(f"📚 Processando lote de {len(arquivos_csv)} arquivo(s)...")
+        
+        with perfil_etapa('carga'):
+            # Lê todos os arquivos uma única vez, preservando a ordem de leitura para o desempate
+            dfs = []
+            deslocamento = 0
+            for k, arquivo in enumerate(arquivos_csv):
+                df, total_registros_original = carregar_entradas(arquivo, usar_cache=usar_cache)
+                df = df.assign(_origem=k)
+                df.index = df.index + deslocamento
+                deslocamento += total_registros_original
+                dfs.append(df)
+            # Categorias unificadas entre os dias (senão a concatenação volta a texto por linha)
+            for coluna in dfs[0].columns:
+                if all(isinstance(df[coluna].dtype, pd.CategoricalDtype) for df in dfs):
+                    categorias = pd.api.types.union_categoricals([df[coluna] for df in dfs]).categories
+                    for df in dfs:
+                        df[coluna] = df[coluna].cat.set_categories(categorias)
+            historico = pd.concat(dfs).sort_values(['ide_portaria', 'tim_entrada'], kind='stable')
+            origem = historico.pop('_origem').to_numpy()
+        if mostrar_memoria:
+            mostrar_relatorio_memoria(historico)
+        
+        indice_historico = None
+        if any(historico_simulacao(sim) for sim in simulacoes):
+            arquivos_indice = [os.path.join("input", arquivo) for arquivo in sorted(listar_arquivos_input())]
+            arquivos_indice += [arquivo for arquivo in arquivos_csv
+                                if os.path.abspath(arquivo) not in map(os.path.abspath, arquivos_indice)]
+            with perfil_etapa('indice_historico'):
+                indice_historico = preparar_indice_historico(arquivos_indice, usar_cache=usar_cache)
+        
+        print(f"\n🔄 Aplicando {len(simulacoes)} simulações sobre o histórico completo...")
+        with perfil_etapa('sugestoes', registros=len(historico) * len(simulacoes), cprofile=True):
+            rankings_simulacoes = None
+            cache_varreduras = CacheVarreduras() if usar_cache else None
+            if top_k:
+                sugestoes_simulacoes, rankings_simulacoes = calcular_sugestoes_ranking(
+                    historico, simulacoes, top_k, ordem=historico.index, workers=workers,
+                    dividir_simulacoes=dividir_simulacoes, indice_historico=indice_historico,
+                    cache_varreduras=cache_varreduras
+                )
+            else:
+                sugestoes_simulacoes = calcular_sugestoes_multiplas(
+                    historico, simulacoes, ordem=historico.index, workers=workers,
+                    dividir_simulacoes=dividir_simulacoes, indice_historico=indice_historico,
+                    cache_varreduras=cache_varreduras
+                )
+            if cache_varreduras is not None and cache_varreduras.reaproveitadas:
+                print(f"♻️ Varreduras: {cache_varreduras.reaproveitadas} reaproveitada(s) do cache, "
+                      f"{cache_varreduras.calculadas} calculada(s)")
+            
+            medidas_aproximadas = medir_simulacoes_aproximadas(historico, simulacoes, ordem=historico.index,
+                                                               workers=workers, cache_varreduras=cache_varreduras)
+        
+        output_dir = "output"
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        
+        resumo_dias = []
+        dias_simulacoes = []
+        for k, arquivo_csv in enumerate(arquivos_csv):
+            mascara = origem == k
+            if not mascara.any():
+                continue
+            nome_base = os.path.basename(arquivo_csv).replace('.csv', '.xlsx')
+            nome_excel = os.path.join(output_dir, nome_base)
+            print(f"\n📅 {os.path.basename(arquivo_csv)}: {mascara.sum():,} registros")
+            
+            with perfil_etapa(f"dia_{nome_base[:-len('.xlsx')]}", registros=int(mascara.sum())):
+                with perfil_etapa('conferencia', registros=int(mascara.sum()) * len(simulacoes)):
+                    df_simulacoes = adicionar_colunas_derivadas(historico[mascara].reset_index(drop=True))
+                    adicionar_colunas_simulacao(
+                        df_simulacoes, [sugestoes[mascara] for sugestoes in sugestoes_simulacoes],
+                        None if rankings_simulacoes is None else [ranking[mascara] for ranking in rankings_simulacoes]
+                    )
+                
+                with perfil_etapa('estatisticas', registros=len(df_simulacoes) * len(simulacoes)):
+                    df_stats_gerais, df_stats_portaria = acrescentar_erros_aproximados(
+                        *calcular_estatisticas_simulacoes(df_simulacoes), medidas_aproximadas, mascara=mascara
+                    )
+                    tabelas_detalhadas = calcular_estatisticas_detalhadas(df_simulacoes, detalhar)
+                with perfil_etapa('analise', registros=len(df_simulacoes)):
+                    nome_grade = os.path.join(output_dir, nome_base.replace('.xlsx', '_grade_parametros.csv'))
+                    df_analise, df_otimizacao = montar_analise_sugestoes(
+                        df_stats_gerais, historico, ordem=historico.index, mascara=mascara, otimizar=otimizar,
+                        workers=workers, usar_cache=usar_cache, nome_grade=nome_grade
+                    )
+                with perfil_etapa('sequencias', registros=len(df_simulacoes) * len(simulacoes)):
+                    df_sequencias = montar_sequencias_destinos(df_simulacoes)
+                if 'xlsx' in formatos:
+                    gravar_planilha = gravar_planilha_simulacoes_rapida if escrita_rapida else gravar_planilha_simulacoes
+                    with perfil_etapa('planilha', registros=len(df_simulacoes)):
+                        gravar_planilha(nome_excel, df_simulacoes, df_stats_gerais, df_stats_portaria,
+                                        df_analise, df_sequencias, df_otimizacao, tabelas_detalhadas)
+                    print(f"📁 Arquivo gerado: {nome_excel}")
+                with perfil_etapa('exportacao_tabelas', registros=len(df_simulacoes)):
+                    for arquivo_tabela in exportar_tabelas(nome_excel[:-len('.xlsx')], {
+                        'Dados_e_Simulacoes': df_simulacoes,
+                        'Estatisticas_Gerais': df_stats_gerais,
+                        'Estatisticas_por_Portaria': df_stats_portaria,
+                        'Sequencias_Destinos': df_sequencias,
+                        **tabelas_detalhadas,
+                    }, formatos):
+                        print(f"📁 Tabela exportada: {arquivo_tabela}")
+            
+            data = data_do_arquivo(arquivo_csv)
+            df_stats_gerais.insert(0, 'Data', data.strftime('%d/%m/%Y') if data else os.path.basename(arquivo_csv))
+            resumo_dias.append(df_stats_gerais)
+            dias_simulacoes.append(df_simulacoes)
+        
+        # Planilha consolidada do período
+        with perfil_etapa('resumo', registros=len(historico)):
+            df_resumo_dias = pd.concat(resumo_dias, ignore_index=True)
+            df_periodo_gerais, df_periodo_portaria = acrescentar_erros_aproximados(
+                *calcular_estatisticas_simulacoes(pd.concat(dias_simulacoes, ignore_index=True)), medidas_aproximadas
+            )
+            primeiro = os.path.basename(arquivos_csv[0]).replace('.csv', '')
+            ultimo = os.path.basename(arquivos_csv[-1]).replace('.csv', '')
+            nome_resumo = os.path.join(output_dir, f"Resumo_Lote_{primeiro}_a_{ultimo}.xlsx")
+            
+            gravar_planilha_resumo(nome_resumo, {
+                'Estatisticas_Periodo': df_periodo_gerais,
+                'Estatisticas_por_Portaria': df_periodo_portaria,
+                'Resumo_por_Dia': df_resumo_dias,
+            })
+        
+        print(f"\n✅ Lote processado com sucesso!")
+        print(f"📁 Resumo consolidado: {nome_resumo}")
+        print(f"\n📈 Estatísticas do período:")
+        for _, row in df_periodo_gerais.iterrows():
+            print(f"   {row['Simulacao']}: {row['Total_Acertos']}/{row['Total_Sugestoes']} acertos ({row['Precisao_Pct']:.1f}% precisão, {row['Cobertura_Pct']:.1f}% cobertura, {row['Eficiencia_F1']:.1f} F1-Score)")
+        print(f"🕐 Processado em: {datetime.now().strftime('%H:%M:%S')}")
+        encerrar_perfil(nome_resumo[:-len('.xlsx')] + '_perfil.json', arquivos=list(arquivos_csv),
+                        registros=len(historico), workers=workers, escrita_rapida=escrita_rapida,
+                        formatos=list(formatos), top_k=top_k)
+        
+        return nome_resumo
+    
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+        return None
+    finally:
+        descartar_perfil()
+
+def _processar_parte_em_blocos(prontas, estado, gravador, top_k, indice_historico):
+    """
+    Simula as entradas liberadas pelo buffer de reordenação (processar_em_blocos)
+
+    As entradas são simuladas junto com a cauda de cada portaria (entradas já
+    processadas que ainda cabem na maior janela), grava o resultado apenas das
+    novas e acumula os totais das estatísticas. Retorna a quantidade de entradas.
+    """
+    if len(prontas) == 0:
+        return 0
+    prontas = prontas.sort_values(['ide_portaria', 'tim_entrada'], kind='stable')
+    
+    # Cada portaria precisa chegar em ordem cronológica (a cauda já foi simulada)
+    primeiras = prontas.groupby('ide_portaria', sort=False)['tim_entrada'].min()
+    anteriores = pd.to_datetime(primeiras.index.to_series().map(estado['ultimas']))
+    fora_de_ordem = primeiras[primeiras < anteriores]
+    if len(fora_de_ordem):
+        portaria = fora_de_ordem.index[0]
+        raise ValueError(f"entrada da portaria {portaria} em {fora_de_ordem.iloc[0]} chegou depois de "
+                         f"{estado['ultimas'][portaria]}, além do atraso máximo; ordene o arquivo por "
+                         f"tim_entrada ou aumente atraso_maximo_minutos")
+    
+    if indice_historico is not None:
+        # Dias fora do índice inicial passam a contar para os dias seguintes
+        for data, parte in prontas.groupby(prontas['tim_entrada'].dt.date, sort=True):
+            if data not in estado['dias_indice']:
+                indice_historico.somar_dia(data, parte)
+    
+    quadro = prontas if estado['cauda'] is None else pd.concat([estado['cauda'], prontas])
+    with perfil_etapa('sugestoes', registros=len(quadro) * len(simulacoes)):
+        rankings_simulacoes = None
+        if top_k:
+            sugestoes_simulacoes, rankings_simulacoes = calcular_sugestoes_ranking(
+                quadro, simulacoes, top_k, ordem=quadro.index, indice_historico=indice_historico
+            )
+        else:
+            sugestoes_simulacoes = calcular_sugestoes_multiplas(quadro, simulacoes, ordem=quadro.index,
+                                                                indice_historico=indice_historico)
+    novas = slice(len(quadro) - len(prontas), None)
+    
+    with perfil_etapa('conferencia', registros=len(prontas) * len(simulacoes)):
+        df_simulacoes = adicionar_colunas_derivadas(prontas.reset_index(drop=True))
+        adicionar_colunas_simulacao(
+            df_simulacoes, [np.asarray(sugestoes)[novas] for sugestoes in sugestoes_simulacoes],
+            None if rankings_simulacoes is None else [ranking[novas] for ranking in rankings_simulacoes],
+            mostrar=False
+        )
+        if pd.api.types.is_numeric_dtype(df_simulacoes['ide_destino']):
+            # Mesmo tipo em todas as partes, com ou sem sugestões vazias
+            for i in range(1, len(simulacoes) + 1):
+                df_simulacoes[f"Simulacao_{i}_Destino"] = df_simulacoes[f"Simulacao_{i}_Destino"].astype(np.float64)
+    with perfil_etapa('gravacao', registros=len(df_simulacoes)):
+        gravador.gravar(df_simulacoes)
+    
+    with perfil_etapa('estatisticas', registros=len(df_simulacoes) * len(simulacoes)):
+        df_longo = montar_resultados_longos(df_simulacoes)
+        for nome, chaves in (('totais_gerais', ['Simulacao_Idx']),
+                             ('totais_portaria', ['Simulacao_Idx', 'ide_portaria'])):
+            totais = totalizar_estatisticas(df_longo, chaves)
+            if estado[nome] is not None:
+                totais = pd.concat([estado[nome], totais], ignore_index=True) \
+                    .groupby(chaves, sort=True).sum().reset_index()
+            estado[nome] = totais
+    if 'des_portaria' in df_simulacoes.columns:
+        descricoes = df_simulacoes.drop_duplicates('ide_portaria').set_index('ide_portaria')['des_portaria']
+        for portaria, descricao in descricoes.items():
+            estado['descricoes'].setdefault(portaria, descricao)
+    
+    # Passa para a próxima parte apenas o que ainda cabe na maior janela de cada portaria
+    ultimas = quadro.groupby('ide_portaria', sort=False)['tim_entrada'].transform('max')
+    estado['cauda'] = quadro[quadro['tim_entrada'] >= ultimas - estado['maior_janela']]
+    estado['ultimas'].update(prontas.groupby('ide_portaria', sort=False)['tim_entrada'].max().to_dict())
+    return len(prontas)
+
+def processar_em_blocos(arquivo_csv, tamanho_bloco=200_000, atraso_maximo_minutos=24 * 60, formatos=('csv',),
+                        usar_cache=True, perfil=False, perfil_cprofile=False, top_k=0):
+    """
+    Processa um CSV longo (meses de entradas) em blocos, com memória limitada
+
+    O arquivo é lido em blocos de tamanho_bloco linhas. Cada entrada fica em
+    espera até o arquivo avançar atraso_maximo_minutos além do seu horário
+    (as exportações do SIVIS vêm em ordem decrescente dentro do dia); as
+    liberadas são simuladas junto com a cauda de cada portaria, e só essa
+    cauda passa de uma parte para a outra. O resultado de cada parte é gravado
+    logo em seguida (GravadorIncremental) e as estatísticas são acumuladas
+    como totais. As sugestões são as mesmas da execução em memória.
+
+    Não gera as abas que dependem do arquivo completo (Analise_e_Sugestoes,
+    Sequencias_Destinos); com 'xlsx' em formatos grava uma planilha apenas
+    com as estatísticas. Simulações com decaimento ou aproximadas não são suportadas.
+
+    Args:
+        arquivo_csv: Caminho do arquivo CSV de entrada
+        tamanho_bloco: Linhas lidas do CSV por vez
+        atraso_maximo_minutos: Quanto uma entrada pode aparecer no arquivo
+            depois de entradas mais recentes (0 para arquivos já ordenados)
+        formatos: Formatos de saída dos dados (csv, sqlite ou parquet)
+        usar_cache: Reaproveita o índice histórico gravado em cache_dir
+        perfil: Mede cada bloco (sugestões, gravação e estatísticas) e grava o
+            relatório output/<arquivo>_perfil.json
+        perfil_cprofile: Com perfil, registra também as funções mais custosas do
+            processamento dos blocos (cProfile)
+        top_k: Com valor maior que 0, gera também o ranking dos top_k destinos
+
+    Returns:
+        str ou None: caminho base dos arquivos gerados
+    """
+    if perfil or perfil_cprofile:
+        iniciar_perfil(cprofile=perfil_cprofile)
+    try:
+        verificar_formatos_saida(formatos)
+        if not [formato for formato in formatos if formato != 'xlsx']:
+            raise ValueError("o modo em blocos grava os dados em csv, sqlite ou parquet (xlsx só recebe as estatísticas)")
+        if any(modo_simulacao(sim) != 'janela' for sim in simulacoes):
+            raise ValueError("o modo em blocos só suporta simulações no modo janela (sem decaimento ou aproximado)")
+        
+        indice_historico = None
+        if any(historico_simulacao(sim) for sim in simulacoes):
+            with perfil_etapa('indice_historico'):
+                indice_historico = preparar_indice_historico(usar_cache=usar_cache)
+        
+        output_dir = "output"
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        caminho_base = os.path.join(output_dir, os.path.basename(arquivo_csv).replace('.csv', ''))
+        gravador = GravadorIncremental(caminho_base, 'Dados_e_Simulacoes', formatos)
+        
+        estado = {
+            'cauda': None,
+            'ultimas': {},  # ide_portaria -> última entrada simulada
+            'maior_janela': pd.Timedelta(minutes=max(sim['intervalo_minutos'] for sim in simulacoes)),
+            'totais_gerais': None,
+            'totais_portaria': None,
+            'descricoes': {},
+            'dias_indice': set(indice_historico.dias) if indice_historico is not None else set(),
+        }
+        atraso = pd.Timedelta(minutes=atraso_maximo_minutos)
+        
+        print(f"🧱 Processando {arquivo_csv} em blocos de {tamanho_bloco:,} linhas "
+              f"(atraso máximo de {atraso_maximo_minutos} min)...")
+        pendentes = None
+        total_lidas = 0
+        total_simuladas = 0
+        # A leitura de cada bloco fica na etapa 'blocos'; o processamento, em 'bloco_N'
+        with perfil_etapa('blocos', cprofile=True):
+            for numero, (bloco, lidas) in enumerate(ler_entradas_em_blocos(arquivo_csv, tamanho_bloco), 1):
+                total_lidas += lidas
+                with perfil_etapa(f"bloco_{numero}", registros=lidas):
+                    pendentes = bloco if pendentes is None else pd.concat([pendentes, bloco])
+                    liberadas = pendentes['tim_entrada'] <= pendentes['tim_entrada'].max() - atraso
+                    total_simuladas += _processar_parte_em_blocos(pendentes[liberadas], estado, gravador, top_k,
+                                                                  indice_historico)
+                    pendentes = pendentes[~liberadas]
+                print(f"   Bloco {numero}: {total_lidas:,} linhas lidas, {total_simuladas:,} entradas simuladas, "
+                      f"{len(pendentes):,} em espera")
+            if pendentes is not None:
+                with perfil_etapa('bloco_final', registros=len(pendentes)):
+                    total_simuladas += _processar_parte_em_blocos(pendentes, estado, gravador, top_k,
+                                                                  indice_historico)
+            arquivos = gravador.fechar()
+        if estado['totais_gerais'] is None:
+            print("⚠️ Nenhuma entrada com ide_destino encontrada.")
+            return None
+        
+        with perfil_etapa('exportacao_tabelas'):
+            df_stats_gerais, df_stats_portaria = montar_estatisticas(
+                estado['totais_gerais'], estado['totais_portaria'],
+                pd.Series(estado['descricoes']) if estado['descricoes'] else None
+            )
+            tabelas_estatisticas = {
+                'Estatisticas_Gerais': df_stats_gerais,
+                'Estatisticas_por_Portaria': df_stats_portaria,
+            }
+            arquivos += exportar_tabelas(caminho_base, tabelas_estatisticas, formatos)
+            if 'xlsx' in formatos:
+                nome_excel = f"{caminho_base}_Estatisticas.xlsx"
+                gravar_planilha_resumo(nome_excel, tabelas_estatisticas)
+                arquivos.append(nome_excel)
+        
+        print(f"\n✅ {total_simuladas:,} entradas simuladas em blocos!")
+        for arquivo in arquivos:
+            print(f"📁 Tabela exportada: {arquivo}")
+        print(f"\n📈 Estatísticas de Acertos:")
+        for _, row in df_stats_gerais.iterrows():
+            print(f"   {row['Simulacao']}: {row['Total_Acertos']}/{row['Total_Sugestoes']} acertos ({row['Precisao_Pct']:.1f}% precisão, {row['Cobertura_Pct']:.1f}% cobertura, {row['Eficiencia_F1']:.1f} F1-Score)")
+            if top_k:
+                print(f"      top-{top_k}: {row['Total_Acertos_TopK']} acertos ({row['Precisao_TopK_Pct']:.1f}% precisão, {row['Cobertura_TopK_Pct']:.1f}% cobertura)")
+        print(f"🕐 Processado em: {datetime.now().strftime('%H:%M:%S')}")
+        encerrar_perfil(caminho_base + '_perfil.json', arquivo=arquivo_csv, registros=total_simuladas,
+                        linhas_lidas=total_lidas, tamanho_bloco=tamanho_bloco,
+                        atraso_maximo_minutos=atraso_maximo_minutos, formatos=list(formatos), top_k=top_k)
+        
+        return caminho_base
+    
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+        return None
+    finally:
+        descartar_perfil()
 
 if __name__ == "__main__":
-    # Usar arquivo como argumento ou padrão
-    if len(sys.argv) > 1:
-        arquivo = sys.argv[1]
-    else:
-        arquivo = os.path.join("input", "Entradas-28-10-2025.csv")
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Simulador de sugestões de destinos por portaria")
+    parser.add_argument("arquivo", nargs="?", default=os.path.join("input", "Entradas-28-10-2025.csv"),
+                        help="Arquivo CSV de entrada (padrão: input/Entradas-28-10-2025.csv)")
+    parser.add_argument("--otimizar", action="store_true",
+                        help="Avalia a grade de parâmetros e mede a fronteira de Pareto de precisão x cobertura")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Quantidade de processos usados em paralelo, divididos por portaria (padrão: 1)")
+    parser.add_argument("--dividir-simulacoes", action="store_true",
+                        help="Com --workers, divide também as simulações entre os processos")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Não reaproveita nem grava resultados em cache")
+    parser.add_argument("--exportacao-inicial", action="store_true",
+                        help="Grava uma cópia simples dos dados antes das simulações (a planilha é gravada duas vezes)")
+    parser.add_argument("--escrita-rapida", action="store_true",
+                        help="Grava a planilha final em modo de escrita contínua (menos memória e tempo)")
+    parser.add_argument("--formato",
+                        help="Formatos de saída separados por vírgula: xlsx, parquet, csv, sqlite "
+                             "(padrão: xlsx; csv com --blocos)")
+    parser.add_argument("--detalhar", default="",
+                        help="Estatísticas extras separadas por vírgula: hora, destino (abas Estatisticas_por_Hora/_Destino)")
+    parser.add_argument("--memoria", action="store_true",
+                        help="Mostra a memória ocupada por coluna das entradas carregadas")
+    parser.add_argument("--perfil", action="store_true",
+                        help="Mede cada etapa e grava o relatório output/<arquivo>_perfil.json")
+    parser.add_argument("--perfil-cprofile", action="store_true",
+                        help="Com --perfil, registra as funções mais custosas do cálculo das sugestões (cProfile)")
+    parser.add_argument("--top-k", type=int, default=0, metavar="K",
+                        help="Gera também o ranking dos K destinos mais frequentes (colunas Simulacao_N_TopK)")
+    parser.add_argument("--decaimento", metavar="MEIA_VIDA:PONTUACAO",
+                        help="Acrescenta simulações com pontuação de decaimento exponencial, "
+                             "'meia_vida_minutos:pontuacao_minima' separados por vírgula (ex.: 10:3,20:5)")
+    parser.add_argument("--aproximado", metavar="INTERVALO:QTD",
+                        help="Acrescenta simulações no modo aproximado (memória fixa por portaria), "
+                             "'intervalo_minutos:quantidade_minima' separados por vírgula (ex.: 120:20,240:30)")
+    parser.add_argument("--contadores", type=int, metavar="M",
+                        help=f"Com --aproximado, contadores por fatia (padrão: {contadores_aproximado})")
+    parser.add_argument("--fatias", type=int, metavar="N",
+                        help=f"Com --aproximado, fatias de tempo por intervalo (padrão: {fatias_aproximado})")
+    parser.add_argument("--historico", choices=["reserva", "mistura"],
+                        help="Usa o índice histórico dos dias anteriores em todas as simulações: 'reserva' quando a "
+                             "janela não sugere nada, 'mistura' somando as entradas esperadas pelo histórico")
+    parser.add_argument("--peso-historico", type=float, default=1.0,
+                        help="Com --historico mistura, peso das entradas esperadas pelo histórico (padrão: 1.0)")
+    parser.add_argument("--lote", action="store_true",
+                        help="Processa todos os CSV da pasta input em uma única execução (histórico contínuo entre os dias)")
+    parser.add_argument("--de", metavar="DD-MM-AAAA",
+                        help="Com --lote, primeira data do período")
+    parser.add_argument("--ate", metavar="DD-MM-AAAA",
+                        help="Com --lote, última data do período")
+    parser.add_argument("--blocos", type=int, default=0, metavar="LINHAS",
+                        help="Processa o arquivo em blocos de LINHAS linhas, com memória limitada "
+                             "(grava só os dados e as estatísticas)")
+    parser.add_argument("--atraso-maximo", type=float, default=24 * 60, metavar="MINUTOS",
+                        help="Com --blocos, quanto uma entrada pode aparecer no arquivo depois de entradas "
+                             "mais recentes (padrão: 1440; 0 para arquivos ordenados por tim_entrada)")
+    args = parser.parse_args()
+    arquivo = args.arquivo
+    formato = args.formato or ("csv" if args.blocos else "xlsx")
+    formatos = [f.strip().lower() for f in formato.split(',') if f.strip()]
+    detalhar = [d.strip().lower() for d in args.detalhar.split(',') if d.strip()]
+    if args.decaimento:
+        simulacoes.extend(parse_simulacoes_decaimento(args.decaimento))
+    if args.aproximado:
+        simulacoes.extend(parse_simulacoes_aproximadas(args.aproximado, args.contadores, args.fatias))
+    if args.historico:
+        for simulacao in simulacoes:
+            if args.historico == 'mistura' and modo_simulacao(simulacao) != 'janela':
+                simulacao['historico'] = 'reserva'
+                continue
+            simulacao['historico'] = args.historico
+            simulacao['peso_historico'] = args.peso_historico
     
-    if os.path.exists(arquivo):
-        csv_para_excel_simples(arquivo)
+    if args.lote:
+        data_inicio = datetime.strptime(args.de, '%d-%m-%Y').date() if args.de else None
+        data_fim = datetime.strptime(args.ate, '%d-%m-%Y').date() if args.ate else None
+        processar_lote(listar_arquivos_lote(data_inicio, data_fim), otimizar=args.otimizar,
+                       workers=args.workers, usar_cache=not args.sem_cache,
+                       dividir_simulacoes=args.dividir_simulacoes, escrita_rapida=args.escrita_rapida,
+                       formatos=formatos, detalhar=detalhar, mostrar_memoria=args.memoria, perfil=args.perfil,
+                       perfil_cprofile=args.perfil_cprofile, top_k=args.top_k)
+    elif args.blocos and os.path.exists(arquivo):
+        processar_em_blocos(arquivo, tamanho_bloco=args.blocos, atraso_maximo_minutos=args.atraso_maximo,
+                            formatos=formatos, usar_cache=not args.sem_cache, perfil=args.perfil,
+                            perfil_cprofile=args.perfil_cprofile, top_k=args.top_k)
+    elif os.path.exists(arquivo):
+        csv_para_excel_simples(arquivo, otimizar=args.otimizar, workers=args.workers,
+                               usar_cache=not args.sem_cache, dividir_simulacoes=args.dividir_simulacoes,
+                               exportacao_inicial=args.exportacao_inicial,
+                               escrita_rapida=args.escrita_rapida, formatos=formatos, detalhar=detalhar,
+                               mostrar_memoria=args.memoria, perfil=args.perfil,
+                               perfil_cprofile=args.perfil_cprofile, top_k=args.top_k)
     else:
         print(f"❌ Arquivo '{arquivo}' não encontrado.")
         print("\n📁 Arquivos disponíveis na pasta 'input':")